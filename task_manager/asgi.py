@@ -2,6 +2,8 @@
 ASGI config for task_manager project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it (e.g. ``uvicorn task_manager.asgi:application``) to get the native
+async endpoints and the push channel's SSE stream, /api/events/stream/.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
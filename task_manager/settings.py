@@ -10,10 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 import logging.config
 
+from .sqlite import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,16 +48,31 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'tasks.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
+    # orjson-backed JSON (identical output, falls back to DRF's encoder without
+    # orjson); MessagePack for "Accept: application/msgpack" when msgpack is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'tasks.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ] + (['tasks.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'tasks.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['tasks.renderers.MessagePackParser'] if find_spec('msgpack') else []),
 }
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack; inert unless TASK_PROFILING['ENABLED']
+    'tasks.profiling.RequestProfilingMiddleware',
+    # Inside profiling, so the recorded response sizes are the bytes on the wire
+    'tasks.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,11 +105,29 @@ WSGI_APPLICATION = 'task_manager.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite runs in WAL mode with tuned pragmas, BEGIN IMMEDIATE transactions
+# and persistent connections (see task_manager/sqlite.py). Set SQLITE_TUNED=0
+# to fall back to Django's stock SQLite configuration.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': sqlite_database(
+        BASE_DIR / 'db.sqlite3',
+        tuned=os.environ.get('SQLITE_TUNED', '1') == '1',
+    ),
+}
+
+# Read replica (tasks.routers). When DATABASE_REPLICA names a second SQLite
+# file, list, history, notification and stats reads go there unless the user
+# wrote in the last STICKY_SECONDS; refresh it with `manage.py sync_replica`.
+# Tests mirror it onto the test database.
+if os.environ.get('DATABASE_REPLICA'):
+    DATABASES['replica'] = sqlite_database(os.environ['DATABASE_REPLICA'])
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['tasks.routers.ReplicaRouter']
+
+TASK_DATABASE_ROUTING = {
+    'REPLICA': 'replica',
+    'STICKY_SECONDS': 10,
 }
 
 # Password validation
@@ -139,6 +175,112 @@ MEDIA_ROOT = BASE_DIR / 'mediafiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caches
+# The `responses` alias backs the per-user API response cache
+# (tasks.response_cache). LocMemCache is per process and culls least recently
+# used entries past MAX_ENTRIES; when running several worker processes switch
+# it to django.core.cache.backends.filebased.FileBasedCache with a LOCATION
+# directory so invalidations are seen by every worker. The same goes for
+# `default`, which holds the unread notification counts (tasks.notifications)
+# and replica pins: with LocMemCache a worker only sees the invalidations made
+# in its own process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'task-responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+TASK_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'responses',
+    'MAX_ENTRY_BYTES': 512 * 1024,  # Larger responses are not cached
+}
+
+# Background jobs (tasks.jobs). Every deployment must run `manage.py run_jobs`
+# next to the web processes (its own service or container): without a worker,
+# history rows and reminders for new tasks are queued and never written.
+# Alert on tasks_jobs_oldest_due_seconds from /metrics to catch a missing or
+# stuck worker. When TASK_JOBS_EAGER is True, side effects run inline instead;
+# meant for tests and local debugging.
+TASK_JOBS_EAGER = False
+# Jobs that failed for good are kept this long for inspection, then purged by
+# run_jobs; None keeps them forever.
+TASK_JOBS_FAILED_RETENTION_DAYS = 30
+
+# Token authentication cache (tasks.authentication): per-process LRU of
+# token -> user lookups. Logout, user saves and user deletes evict entries in
+# the process that made the change; other processes notice within TTL
+# seconds. TTL = 0 turns the cache off.
+TASK_TOKEN_CACHE = {
+    'TTL': 60,
+    'MAX_ENTRIES': 10000,
+}
+
+# Request profiling (tasks.profiling). When ENABLED, every request records
+# wall time, query count, database time and response size per URL name,
+# exposed in Prometheus text format at /metrics to staff users or to
+# "Authorization: Bearer <METRICS_TOKEN>". SERVER_TIMING adds a Server-Timing
+# header; requests slower than SLOW_REQUEST_MS are logged to slow_requests.log
+# with their slowest SQL statements.
+TASK_PROFILING = {
+    'ENABLED': os.environ.get('TASK_PROFILING', '') == '1',
+    'SERVER_TIMING': False,
+    'SLOW_REQUEST_MS': 500,
+    'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+# Task history retention (tasks.retention), enforced by `prune_task_history`.
+# Rows older than MAX_AGE_DAYS or beyond the newest MAX_ENTRIES_PER_TASK of a
+# task are deleted, or squashed into one summary row per task with COMPACT.
+# Set either limit to None to disable it.
+TASK_HISTORY_RETENTION = {
+    'MAX_AGE_DAYS': 365,
+    'MAX_ENTRIES_PER_TASK': 200,
+    'COMPACT': False,
+}
+
+# Due-date reminders (tasks.reminders), sent by `manage.py scan_due_tasks`
+# run from cron: open tasks due within DUE_SOON_DAYS, or overdue by at most
+# OVERDUE_DAYS, get one notification per kind and due date.
+TASK_REMINDERS = {
+    'DUE_SOON_DAYS': 2,
+    'OVERDUE_DAYS': 7,
+    'CHUNK_SIZE': 1000,
+}
+
+# Response compression (tasks.compression): brotli (with the brotli package)
+# or gzip, as Accept-Encoding prefers, for non-streaming responses of at least
+# MIN_SIZE bytes whose Content-Type starts with one of CONTENT_TYPES.
+TASK_COMPRESSION = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    # No text/html: pages with CSRF tokens must not be compressed (BREACH)
+    'CONTENT_TYPES': ('application/json', 'application/msgpack'),
+}
+
+# Push channel (tasks.push): /api/events/stream/ (SSE, ASGI only) and
+# /api/events/ (long-poll). Streams send a heartbeat comment every
+# HEARTBEAT_SECONDS and re-check the database every RESYNC_SECONDS for writes
+# made by other processes (None when one process serves every write).
+TASK_PUSH = {
+    'HEARTBEAT_SECONDS': 15,
+    'RESYNC_SECONDS': 60,
+    'LONG_POLL_TIMEOUT': 25,
+    'RETRY_MILLISECONDS': 3000,
+    'BATCH_SIZE': 100,
+}
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -149,6 +291,12 @@ LOGGING = {
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'error.log',
         },
+        'slow_requests': {
+            'level': 'WARNING',
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'slow_requests.log',
+            'delay': True,
+        },
     },
     'loggers': {
         'django': {
@@ -156,6 +304,11 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'tasks.profiling': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
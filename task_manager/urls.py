@@ -4,6 +4,7 @@ from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.documentation import include_docs_urls
+from tasks.profiling import metrics_view
 
 urlpatterns = [
     # Admin interface
@@ -21,6 +22,9 @@ urlpatterns = [
     # Authentication endpoints
     path('api/auth/', include('rest_framework.urls', namespace='rest_framework')),
 
+    # Prometheus scrape endpoint (see TASK_PROFILING in settings)
+    path('metrics', metrics_view, name='metrics'),
+
     # Redirect root URL to API documentation for better UX
     path('', RedirectView.as_view(url='/docs/', permanent=False)),
 ]
@@ -0,0 +1,94 @@
+"""
+Agenda: every task occurrence in a [start, end) date range, in date order.
+
+Task rows due in the range come from one range query on (user, due_date).
+Future occurrences of recurring series are not rows yet: each live series
+head yields them lazily from ``recurrence.occurrences``, exactly as
+``roll_over`` will spawn them (from the head's next_due_date, on the series'
+day of month, skipping past dates), and ``heapq.merge`` interleaves those
+generators with the rows.
+
+Entries are ordered by (date, task id, virtual), so a page ends at a key the
+next page resumes after. Each page reads at most ``limit`` rows plus one
+date per series head, whatever the length of the range.
+"""
+import heapq
+import itertools
+import json
+from base64 import b64decode, b64encode
+from datetime import date
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .fast_list import get_values_serializer
+from .models import Task
+from .recurrence import occurrences
+from .serializers import TaskSerializer
+
+RECURRENCES = ('daily', 'weekly', 'monthly')
+
+
+def encode_position(key):
+    day, task_id, virtual = key
+    data = json.dumps([day.isoformat(), task_id, virtual], separators=(',', ':'))
+    return b64encode(data.encode('ascii')).decode('ascii')
+
+
+def decode_position(value):
+    """The key an ``encode_position`` cursor stands for; ValueError for anything else"""
+    try:
+        day, task_id, virtual = json.loads(b64decode(value.encode('ascii')).decode('ascii'))
+        return date.fromisoformat(day), int(task_id), int(bool(virtual))
+    except (TypeError, ValueError, UnicodeError) as exc:
+        raise ValueError(value) from exc
+
+
+def _rows(tasks, start, end, after, limit):
+    rows = tasks.filter(due_date__gte=start, due_date__lt=end)
+    if after is not None:
+        # A range on the (user, due_date) index plus a filter, rather than an OR
+        rows = rows.filter(due_date__gte=after[0]).exclude(due_date=after[0], id__lte=after[1])
+    values_serializer = get_values_serializer(TaskSerializer)
+    rows = rows.order_by('due_date', 'id').values(*values_serializer.columns)[:limit]
+    for row in rows:
+        yield (row['due_date'], row['id'], 0), row
+
+
+def _series(head_id, first, recurrence, day_of_month, since, end, after):
+    for day in occurrences(first, recurrence, since, end, day_of_month):
+        key = (day, head_id, 1)
+        if after is None or key > after:
+            yield key, None
+
+
+def page(user_id, start, end, after=None, limit=50, today=None):
+    """
+    Up to ``limit`` ``(key, task data, virtual)`` entries of the user's
+    agenda after the ``after`` key, and whether more follow.
+    """
+    today = today or timezone.localdate()
+    tasks = Task.objects.filter(user_id=user_id)
+    since = max(start, today, after[0] if after else start)
+    heads = tasks.filter(
+        next_due_date__isnull=False, recurrence__in=RECURRENCES, due_date__lt=end, next_due_date__lt=end
+    ).values_list('id', 'next_due_date', 'recurrence', 'recurrence_day', 'due_date')
+    streams = [_rows(tasks, start, end, after, limit + 1)]
+    streams += [
+        _series(head_id, first, recurrence, day_of_month or due_date.day, since, end, after)
+        for head_id, first, recurrence, day_of_month, due_date in heads
+    ]
+
+    entries = list(itertools.islice(heapq.merge(*streams, key=lambda entry: entry[0]), limit + 1))
+    has_next = len(entries) > limit
+    entries = entries[:limit]
+
+    values_serializer = get_values_serializer(TaskSerializer)
+    head_ids = {key[1] for key, row in entries if row is None}
+    heads = {
+        row['id']: row
+        for row in tasks.filter(id__in=head_ids).values(*values_serializer.columns)
+    } if head_ids else {}
+    rows = [row if row is not None else heads[key[1]] for key, row in entries]
+    data = values_serializer.many(rows)
+    return [(key, task, bool(key[2])) for (key, _), task in zip(entries, data)], has_next
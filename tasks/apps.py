@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        from . import authentication  # noqa: F401  connects the token cache invalidation signals
+        from . import notifications  # noqa: F401  connects the unread-count signals
+        from . import push  # noqa: F401  connects the push channel wake-up signals
+        from . import response_cache  # noqa: F401  connects the cache invalidation signals
+        from .search import restore_search_triggers
+        post_migrate.connect(restore_search_triggers, sender=self)
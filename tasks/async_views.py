@@ -0,0 +1,191 @@
+"""
+Native async versions of the read-heavy endpoints, mounted under /api/async/.
+
+Under ASGI every DRF view runs through sync_to_async, so each in-flight
+request holds a worker thread for its whole duration. These views are plain
+Django coroutines instead: they authenticate with
+``CachedTokenAuthentication.aauthenticate`` (or the session through
+``request.auser()``), query with the async ORM and reuse the sync views'
+querysets, filters, keyset pagination and ValuesSerializers, so they return
+the same JSON as their sync counterparts. They only serve GET and HEAD and
+skip the response cache and ETags of the sync endpoints; writes stay there.
+
+The push channel (tasks.push) lives here too: ``event_stream`` for
+Server-Sent Events and ``event_poll`` for long-polling. Waiting on an event
+loop costs a coroutine per client rather than a thread.
+
+Under WSGI Django runs them through async_to_sync: they work, but gain
+nothing, and a long poll holds a worker thread. The SSE stream would hold one
+forever, so it refuses to run there.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from . import push
+from .authentication import CachedTokenAuthentication
+from .fast_list import get_values_serializer, values_rows
+from .models import Task
+from .notifications import aunread_count
+from .renderers import FastJSONRenderer
+from .routers import areplica_reads
+from .search import FullTextSearchFilter
+from .views import NotificationView, TaskHistoryView, TaskViewSet
+
+_renderer = FastJSONRenderer()
+_token_authentication = CachedTokenAuthentication()
+
+
+class StreamingUnavailable(exceptions.APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'Event streams are only served by the ASGI application; long-poll instead.'
+    default_code = 'streaming_unavailable'
+
+
+def _json_response(data, status=200):
+    return HttpResponse(_renderer.render(data), status=status, content_type='application/json')
+
+
+def _error_response(exc):
+    """The response DRF's exception handler gives for ``exc``"""
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = _json_response(detail, exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = _token_authentication.authenticate_header(None)
+    return response
+
+
+async def _authenticate(request):
+    credentials = await _token_authentication.aauthenticate(request)
+    if credentials is not None:
+        return credentials[0]
+    user = await request.auser()
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return user
+
+
+def async_api_view(view):
+    """
+    Turn ``view(request, **kwargs)``, a coroutine returning response data (or a
+    response of its own), into an authenticated GET endpoint. ``request`` is a DRF Request whose ``user``
+    is already set; reads go to the replica unless the user wrote recently.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            response = _error_response(exceptions.MethodNotAllowed(request.method))
+            response['Allow'] = 'GET, HEAD'
+            return response
+        try:
+            user = await _authenticate(request)
+            request = Request(request)
+            request.user = user
+            async with areplica_reads(user.id):
+                data = await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return _error_response(exc)
+        if isinstance(data, HttpResponseBase):
+            return data
+        return _json_response(data)
+
+    return wrapper
+
+
+async def _list(view_class, request, **kwargs):
+    """``ValuesListMixin.list`` for ``view_class``, with the page fetched by the async ORM"""
+    view = view_class(request=request, args=(), kwargs=kwargs, format_kwarg=None, action='list')
+    queryset = view.get_queryset()
+    if FullTextSearchFilter in view.filter_backends and request.query_params.get(FullTextSearchFilter.search_param):
+        # The search backend may look up its FTS table the first time round
+        queryset = await sync_to_async(view.filter_queryset)(queryset)
+    else:
+        queryset = view.filter_queryset(queryset)
+
+    values_serializer = get_values_serializer(view.get_serializer_class())
+    rows = values_rows(view, queryset, values_serializer)
+    page = await view.paginator.apaginate_queryset(rows, request, view)
+    if page is None:
+        return values_serializer.many([row async for row in rows])
+    return view.paginator.get_paginated_response(values_serializer.many(page)).data
+
+
+@async_api_view
+async def task_list(request):
+    return await _list(TaskViewSet, request)
+
+
+@async_api_view
+async def task_detail(request, pk):
+    view = TaskViewSet(request=request, args=(), kwargs={'pk': pk}, format_kwarg=None, action='retrieve')
+    values_serializer = get_values_serializer(view.get_serializer_class())
+    row = await Task.objects.filter(user=request.user, pk=pk).values(*values_serializer.columns).afirst()
+    if row is None:
+        raise exceptions.NotFound('No Task matches the given query.')
+    return values_serializer.many([row])[0]
+
+
+@async_api_view
+async def task_history(request, task_id):
+    return await _list(TaskHistoryView, request, task_id=task_id)
+
+
+@async_api_view
+async def notification_list(request):
+    return await _list(NotificationView, request)
+
+
+@async_api_view
+async def notification_unread_count(request):
+    return {'unread': await aunread_count(request.user.id)}
+
+
+def _cursor(value, param):
+    try:
+        return push.decode_cursor(value)
+    except ValueError:
+        raise exceptions.ValidationError({param: ['Invalid cursor.']})
+
+
+@async_api_view
+async def event_stream(request):
+    """
+    Server-Sent Events for new notifications and task changes. Starts from
+    now, or after the ``Last-Event-ID`` header (or ``last_event_id`` param).
+    """
+    if not isinstance(request._request, ASGIRequest):
+        raise StreamingUnavailable()
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    if last_event_id:
+        cursor = _cursor(last_event_id, 'last_event_id')
+    else:
+        cursor = await push.current_cursor(request.user.id)
+    response = StreamingHttpResponse(push.stream(request.user.id, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stops nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@async_api_view
+async def event_poll(request):
+    """
+    Long-poll for the events after ``?since=<cursor>``, waiting up to
+    ``?timeout=`` seconds for one. Without ``since``, returns the current cursor.
+    """
+    since = request.query_params.get('since')
+    if not since:
+        return {'events': [], 'cursor': push.encode_cursor(await push.current_cursor(request.user.id))}
+    cursor = _cursor(since, 'since')
+    longest = push.push_setting('LONG_POLL_TIMEOUT')
+    try:
+        timeout = min(max(float(request.query_params.get('timeout', longest)), 0), longest)
+    except ValueError:
+        raise exceptions.ValidationError({'timeout': ['A number of seconds is required.']})
+    events, cursor = await push.poll(request.user.id, cursor, timeout)
+    return {'events': events, 'cursor': push.encode_cursor(cursor)}
@@ -0,0 +1,160 @@
+"""
+Token authentication with an in-process token -> user cache.
+
+DRF's TokenAuthentication looks up the Token and its User on every request.
+``CachedTokenAuthentication`` keeps recent lookups in a per-process LRU with
+a short TTL. Deleting a token (logout) and saving or deleting its user
+(deactivation, password change) drop the entries at once. Other processes
+only see such a change when their own entry expires, so keep TTL short.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    'TTL': 60,
+    'MAX_ENTRIES': 10000,
+}
+
+
+def _config(name):
+    return getattr(settings, 'TASK_TOKEN_CACHE', {}).get(name, DEFAULTS[name])
+
+
+class TokenCache:
+    """Thread-safe LRU of token key -> (user, token, expiry)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], entry[1]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, user, token):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (user, token, time.monotonic() + _config('TTL'))
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > _config('MAX_ENTRIES'):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        user, _, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user.pk]
+
+    def forget_key(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def forget_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that consults ``token_cache`` before the database"""
+
+    def authenticate_credentials(self, key):
+        if _config('TTL') <= 0:
+            return super().authenticate_credentials(key)
+        cached = token_cache.get(key)
+        if cached is not None:
+            user, token = cached
+            # Each request gets its own copy, so nothing it sets on the user leaks into the next
+            return copy.copy(user), token
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, copy.copy(user), token)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for native async views, which DRF does not cover"""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        if len(auth) > 2:
+            raise AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        caching = _config('TTL') > 0
+        cached = token_cache.get(key) if caching else None
+        if cached is not None:
+            user, token = cached
+            return copy.copy(user), token
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        if caching:
+            token_cache.set(key, copy.copy(token.user), token)
+        return token.user, token
+
+
+def _token_deleted(sender, instance, **kwargs):
+    token_cache.forget_key(instance.key)
+
+
+def _user_changed(sender, instance, **kwargs):
+    # Covers deactivation and password changes, which both save the user
+    token_cache.forget_user(instance.pk)
+
+
+post_delete.connect(_token_deleted, sender=Token, dispatch_uid='token_cache_token_delete')
+post_save.connect(_user_changed, sender=User, dispatch_uid='token_cache_user_save')
+post_delete.connect(_user_changed, sender=User, dispatch_uid='token_cache_user_delete')
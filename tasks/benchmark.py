@@ -0,0 +1,357 @@
+"""
+Load generation and latency measurement for the tasks API.
+
+``seed`` bulk-inserts users with categories, tasks (a mix of priorities,
+statuses and recurrences), history and notifications. ``run`` then drives the
+main endpoints through the test client, one scenario at a time, and
+``summarize`` reduces the samples to p50/p95/p99 latency, mean query count and
+throughput per endpoint. Used by the ``benchmark_api`` management command,
+which runs everything inside a transaction that is rolled back.
+
+``compare_servers`` load-tests the read endpoints concurrently through the
+real WSGI and ASGI handlers, for the ``benchmark_async`` command.
+"""
+import asyncio
+import io
+import itertools
+import math
+import sys
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.cache import caches
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import Notification, Task, TaskCategory, TaskHistory
+from .recurrence import next_occurrence
+from .views import TaskFilter, TaskViewSet
+
+Sample = namedtuple('Sample', ['seconds', 'queries', 'status'])
+
+SEARCH_TERMS = ('report', 'review', 'plan')
+TITLE_WORDS = ('Write report', 'Review budget', 'Plan release', 'Call supplier', 'Fix bug')
+
+
+def seed(users=10, categories=5, tasks=1000, history=3, notifications=20, batch_size=1000):
+    """Bulk-insert a data set; ``tasks``, ``categories``, ... are per user. Returns the users"""
+    today = timezone.localdate()
+    created_users = [
+        User.objects.create_user(f'benchmark-{index}', f'benchmark-{index}@example.com', 'benchmark')
+        for index in range(users)
+    ]
+    all_categories = TaskCategory.objects.bulk_create([
+        TaskCategory(name=f'Category {index}', user=user)
+        for user in created_users for index in range(categories)
+    ], batch_size=batch_size)
+    by_user = {}
+    for category in all_categories:
+        by_user.setdefault(category.user_id, []).append(category)
+
+    statuses = [value for value, _ in Task.STATUS_CHOICES]
+    priorities = [value for value, _ in Task.PRIORITY_CHOICES]
+    recurrences = ['none', 'none', 'daily', 'weekly', 'monthly']
+    instances = []
+    for user in created_users:
+        user_categories = by_user.get(user.id, [])
+        for index in range(tasks):
+            recurrence = recurrences[index % len(recurrences)]
+            due_date = today + timedelta(days=index % 120 - 30)
+            instances.append(Task(
+                title=f'{TITLE_WORDS[index % len(TITLE_WORDS)]} {index}',
+                description=f'Benchmark task {index} for {user.username}',
+                due_date=due_date,
+                priority=priorities[index % len(priorities)],
+                status=statuses[index % len(statuses)],
+                recurrence=recurrence,
+                next_due_date=next_occurrence(due_date, recurrence),
+                category=user_categories[index % len(user_categories)] if user_categories else None,
+                user=user,
+            ))
+    created_tasks = Task.objects.bulk_create(instances, batch_size=batch_size)
+
+    TaskHistory.objects.bulk_create([
+        TaskHistory(task=task, action='updated', details=f'Benchmark change {index}')
+        for task in created_tasks for index in range(history)
+    ], batch_size=batch_size)
+    first_tasks = {}
+    for task in created_tasks:
+        first_tasks.setdefault(task.user_id, []).append(task)
+    Notification.objects.bulk_create([
+        Notification(user=user, task=first_tasks[user.id][index % len(first_tasks[user.id])],
+                     message=f'Benchmark notification {index}', is_read=bool(index % 3))
+        for user in created_users if first_tasks.get(user.id) for index in range(notifications)
+    ], batch_size=batch_size)
+
+    # Seeding bypasses the write paths, so rebuild the derived data they maintain
+    from .stats import rebuild
+    rebuild([user.id for user in created_users])
+    return created_users
+
+
+def list_variants(categories):
+    """Every TaskFilter combination, crossed with each ordering and with/without search"""
+    category = categories[0].name if categories else 'Category'
+    values = {
+        'status': 'pending',
+        'priority': 'high',
+        'due_date': (timezone.localdate() + timedelta(days=30)).isoformat(),
+        'category': category,
+    }
+    names = list(TaskFilter.base_filters)
+    orderings = [None] + [
+        prefix + field for field in TaskViewSet.ordering_fields if field != 'rank' for prefix in ('', '-')
+    ]
+    variants = []
+    for size in range(len(names) + 1):
+        for subset in itertools.combinations(names, size):
+            for ordering in orderings:
+                for search in (None,) + SEARCH_TERMS[:1]:
+                    params = {name: values[name] for name in subset}
+                    if ordering:
+                        params['ordering'] = ordering
+                    if search:
+                        params['search'] = search
+                    variants.append(params)
+    return variants
+
+
+class Runner:
+    """Issue requests for one user and collect a Sample per request"""
+
+    def __init__(self, user, warm_cache=False):
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.user = user
+        self.warm_cache = warm_cache
+        self.samples = {}
+
+    def request(self, name, method, path, data=None, **extra):
+        if not self.warm_cache:
+            for cache in caches.all():
+                cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, data, secure=True, **extra)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        self.samples.setdefault(name, []).append(Sample(elapsed, len(queries), response.status_code))
+        return response
+
+
+def run(users, requests=50, warm_cache=False):
+    """Drive every scenario ``requests`` times (list: once per variant at least)"""
+    samples = {}
+    today = timezone.localdate()
+    for user in users:
+        runner = Runner(user, warm_cache)
+        categories = list(TaskCategory.objects.filter(user=user))
+        task_ids = list(Task.objects.filter(user=user).values_list('id', flat=True)[:max(requests, 1)])
+
+        variants = list_variants(categories)
+        for params in itertools.islice(itertools.cycle(variants), max(requests, len(variants))):
+            name = 'tasks.list.search' if 'search' in params else 'tasks.list'
+            runner.request(name, 'get', '/api/tasks/', params)
+        for index in range(requests):
+            runner.request('tasks.create', 'post', '/api/tasks/', {
+                'title': f'Benchmark create {index}',
+                'due_date': (today + timedelta(days=index % 30)).isoformat(),
+                'priority': 'medium',
+            }, format='json')
+            if task_ids:
+                task_id = task_ids[index % len(task_ids)]
+                runner.request('tasks.retrieve', 'get', f'/api/tasks/{task_id}/')
+                runner.request('tasks.toggle_complete', 'post', f'/api/tasks/{task_id}/toggle_complete/')
+                runner.request('tasks.history', 'get', f'/api/tasks/{task_id}/history/')
+            runner.request('tasks.stats', 'get', '/api/tasks/stats/')
+            runner.request('recurring_tasks.list', 'get', '/api/recurring-tasks/')
+            runner.request('notifications.list', 'get', '/api/notifications/',
+                           {'is_read': 'false'} if index % 2 else None)
+            runner.request('notifications.unread_count', 'get', '/api/notifications/unread-count/')
+
+        for name, values in runner.samples.items():
+            samples.setdefault(name, []).extend(values)
+    return samples
+
+
+READ_SCENARIOS = (
+    '/api/tasks/',
+    '/api/tasks/{task_id}/',
+    '/api/tasks/{task_id}/history/',
+    '/api/notifications/',
+    '/api/notifications/unread-count/',
+)
+
+
+def read_targets(users, native_async):
+    """``(path, token key)`` for every read scenario and user; ``native_async`` picks the /api/async/ views"""
+    targets = []
+    for user in users:
+        token, _ = Token.objects.get_or_create(user=user)
+        task_id = Task.objects.filter(user=user).values_list('id', flat=True).first()
+        for path in READ_SCENARIOS:
+            path = path.format(task_id=task_id)
+            targets.append((path.replace('/api/', '/api/async/', 1) if native_async else path, token.key))
+    return targets
+
+
+def _wsgi_get(application, path, token):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '443', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'HTTP_AUTHORIZATION': f'Token {token}',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'https', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    response = application(environ, lambda line, headers, exc_info=None: status.append(int(line[:3])))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return status[0]
+
+
+async def _asgi_get(application, path, token):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'https', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 443),
+    }
+    body = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    finished = asyncio.Event()
+    status = []
+
+    async def receive():
+        if body:
+            return body.pop()
+        # Like a server, only report the disconnect once the response is out
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif not message.get('more_body'):
+            finished.set()
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def load_test(server, targets, concurrency, requests):
+    """
+    Issue ``requests`` GETs over ``targets`` with ``concurrency`` in flight,
+    through the WSGI handler on a thread per connection (``server='wsgi'``,
+    like a threaded WSGI server) or the ASGI handler on one event loop
+    (``server='asgi'``, like uvicorn). Returns the samples, the wall time and
+    the most threads seen alive.
+    """
+    shares = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+    samples = []
+    threads = [threading.active_count()]
+
+    def record(started, status):
+        samples.append(Sample(time.perf_counter() - started, 0, status))
+        threads[0] = max(threads[0], threading.active_count())
+
+    started = time.perf_counter()
+    if server == 'wsgi':
+        application = get_wsgi_application()
+
+        def worker(offset, count):
+            for index in range(count):
+                path, token = targets[(offset + index) % len(targets)]
+                began = time.perf_counter()
+                record(began, _wsgi_get(application, path, token))
+            connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(worker, offset, count) for offset, count in enumerate(shares)]:
+                future.result()
+    elif server == 'asgi':
+        application = get_asgi_application()
+
+        async def worker(offset, count):
+            for index in range(count):
+                path, token = targets[(offset + index) % len(targets)]
+                began = time.perf_counter()
+                record(began, await _asgi_get(application, path, token))
+
+        async def main():
+            await asyncio.gather(*(worker(offset, count) for offset, count in enumerate(shares)))
+
+        asyncio.run(main())
+    else:
+        raise ValueError(f'Unknown server {server!r}')
+    return samples, time.perf_counter() - started, threads[0]
+
+
+def compare_servers(users, concurrency, requests):
+    """
+    Sync views under WSGI, the same views under ASGI and the native async
+    views under ASGI, at each concurrency level. Memory per connection is the
+    Python heap peak of a second, traced pass divided by the concurrency;
+    it does not include the native stack each WSGI thread reserves.
+    """
+    setups = (
+        ('wsgi', 'wsgi', read_targets(users, native_async=False)),
+        ('asgi-sync-views', 'asgi', read_targets(users, native_async=False)),
+        ('asgi-async-views', 'asgi', read_targets(users, native_async=True)),
+    )
+    report = {}
+    for level in concurrency:
+        for name, server, targets in setups:
+            samples, seconds, threads = load_test(server, targets, level, requests)
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            load_test(server, targets, level, min(requests, level * 4))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            row = summarize({name: samples})[name]
+            del row['mean_queries'], row['max_queries']
+            row['throughput_rps'] = round(len(samples) / seconds, 1)
+            row['threads'] = threads
+            row['memory_per_connection_kib'] = round((peak - baseline) / level / 1024, 1)
+            report.setdefault(str(level), {})[name] = row
+    return report
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples):
+    report = {}
+    for name, values in sorted(samples.items()):
+        latencies = sorted(sample.seconds for sample in values)
+        total = sum(latencies)
+        statuses = {}
+        for sample in values:
+            statuses[str(sample.status)] = statuses.get(str(sample.status), 0) + 1
+        report[name] = {
+            'requests': len(values),
+            'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3),
+            'mean_queries': round(sum(sample.queries for sample in values) / len(values), 2),
+            'max_queries': max(sample.queries for sample in values),
+            'throughput_rps': round(len(values) / total, 1) if total else None,
+            'statuses': statuses,
+        }
+    return report
@@ -0,0 +1,151 @@
+"""
+Response compression with a size threshold.
+
+Bodies of at least ``MIN_SIZE`` bytes in one of ``CONTENT_TYPES`` are
+compressed with brotli (when the brotli package is installed) or gzip,
+whichever the client's Accept-Encoding prefers. Streaming responses pass
+through: exports compress themselves and event streams must not be buffered.
+
+Only API payloads are compressed. HTML pages (the browsable API, the admin)
+carry CSRF tokens next to reflected input, which compression would expose
+to BREACH.
+
+A compressed body is a different representation, so its strong ETag gets
+the coding appended ("tag-gzip"). Incoming If-Match / If-None-Match have the
+suffix taken off again before the views compare them with the identity tag,
+and a 304 answering a coded tag gets it back.
+"""
+import re
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'CONTENT_TYPES': ('application/json', 'application/msgpack'),
+}
+
+_coding_re = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+_etag_coding_re = re.compile(r'-(br|gzip)"')
+
+
+def _config(name):
+    return getattr(settings, 'TASK_COMPRESSION', {}).get(name, DEFAULTS[name])
+
+
+def accepted_encodings(header):
+    """{coding: quality} from an Accept-Encoding header; quality 0 means refused"""
+    accepted = {}
+    for part in header.split(','):
+        match = _coding_re.match(part)
+        if match is None:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        accepted[match.group(1).lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """'br', 'gzip' or None for an Accept-Encoding header; ties go to brotli"""
+    accepted = accepted_encodings(header)
+    best_quality, best = 0, None
+    for coding in (('br',) if brotli is not None else ()) + ('gzip',):
+        quality = accepted.get(coding, accepted.get('*', 0))
+        if quality > best_quality:
+            best_quality, best = quality, coding
+    return best
+
+
+def compress(body, coding):
+    if coding == 'br':
+        return brotli.compress(body, quality=_config('BROTLI_QUALITY'))
+    compressor = zlib.compressobj(_config('GZIP_LEVEL'), zlib.DEFLATED, 31)  # 31: gzip container
+    return compressor.compress(body) + compressor.flush()
+
+
+def coded_etag(etag, coding):
+    """The strong ETag of ``coding``'s representation: the coding inside the quotes"""
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+class CompressionMiddleware:
+    """Compress large API responses; configured by TASK_COMPRESSION"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _config('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        # Compressing is CPU work; it stays on the event loop rather than hop to a thread
+        return self.process_response(request, await self.get_response(request))
+
+    def process_request(self, request):
+        """Strip coding suffixes from the request's ETags so views match them against the identity tag"""
+        request.etag_coding = None
+        for header in ('HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH'):
+            value = request.META.get(header)
+            if not value:
+                continue
+            for match in _etag_coding_re.finditer(value):
+                request.etag_coding = match.group(1)
+            request.META[header] = _etag_coding_re.sub('"', value)
+
+    def process_response(self, request, response):
+        if response.status_code == 304:
+            coding = getattr(request, 'etag_coding', None)
+            if coding and response.has_header('ETag'):
+                response['ETag'] = coded_etag(response['ETag'], coding)
+            return response
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(tuple(_config('CONTENT_TYPES'))):
+            return response
+        if len(response.content) < _config('MIN_SIZE'):
+            return response
+        # From here on the encoding depends on Accept-Encoding, so caches must key on it
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return response
+
+        coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+        body = compress(response.content, coding)
+        if len(body) >= len(response.content):
+            return response
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = coding
+        if response.has_header('ETag'):
+            response['ETag'] = coded_etag(response['ETag'], coding)
+        return response
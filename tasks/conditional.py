@@ -0,0 +1,112 @@
+"""
+ETag / Last-Modified support for the task and category endpoints.
+
+List validators come from one aggregate over the filtered queryset
+(MAX(updated_at) and COUNT(*)), detail validators from the row's updated_at.
+Both are memoized until the user's next write, so a revalidation that ends in
+304 Not Modified usually costs no query and never serializes a row.
+"""
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .response_cache import memoize_for_user
+
+
+def _timestamp(value):
+    return int(value.timestamp()) if value else None
+
+
+def _etag(request, *parts):
+    # Representations differ per renderer, so the format is part of the tag
+    raw = repr((request.accepted_renderer.format, request.path) + parts)
+    return '"%s"' % hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+class ConditionalRequestMixin:
+    """
+    Answer If-None-Match / If-Modified-Since on GET with 304 and honour
+    If-Match / If-Unmodified-Since on PUT and PATCH for optimistic concurrency.
+    """
+
+    def get_etag_parts(self):
+        """Anything besides the rows themselves that changes the representation"""
+        return ()
+
+    def _list_validators(self, request, queryset):
+        totals = queryset.order_by().aggregate(last=Max('updated_at'), count=Count('id'))
+        params = sorted((name, tuple(values)) for name, values in request.query_params.lists())
+        return _etag(request, params, totals['last'], totals['count']), _timestamp(totals['last'])
+
+    def _detail_etag(self, request, pk, updated_at):
+        # Shared by reads and writes, so a write's ETag matches the next GET or If-Match
+        return _etag(request, str(pk), updated_at, *self.get_etag_parts())
+
+    def _detail_validators(self, request, pk):
+        updated_at = self.get_queryset().filter(pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None, None
+        return self._detail_etag(request, pk, updated_at), _timestamp(updated_at)
+
+    @staticmethod
+    def _set_validators(response, etag, last_modified):
+        if etag and 'ETag' not in response:
+            response['ETag'] = etag
+        if last_modified and 'Last-Modified' not in response:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = memoize_for_user(
+            request, f'{self.basename}:list:validators', kwargs,
+            lambda: self._list_validators(request, self.filter_queryset(self.get_queryset()))
+        )
+        # Last-Modified cannot see deletions, so lists only revalidate on the ETag
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self._set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        etag, last_modified = memoize_for_user(
+            request, f'{self.basename}:retrieve:validators', kwargs,
+            lambda: self._detail_validators(request, pk)
+        )
+        response = None
+        if etag:
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return self._set_validators(response, etag, last_modified)
+
+    def update(self, request, *args, **kwargs):
+        conditional = 'HTTP_IF_MATCH' in request.META or 'HTTP_IF_UNMODIFIED_SINCE' in request.META
+        if not conditional:
+            response = super().update(request, *args, **kwargs)
+        else:
+            pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+            with transaction.atomic():
+                # Always read fresh validators here; a stale one would defeat the check
+                etag, last_modified = self._detail_validators(request, pk)
+                if etag:
+                    precondition = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                    if precondition is not None:
+                        return precondition
+                response = super().update(request, *args, **kwargs)
+
+        instance = getattr(self, '_updated_instance', None)
+        if response.status_code == 200 and instance is not None:
+            self._set_validators(
+                response,
+                self._detail_etag(request, instance.pk, instance.updated_at),
+                _timestamp(instance.updated_at)
+            )
+        return response
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self._updated_instance = serializer.instance
@@ -0,0 +1,144 @@
+"""
+Streaming CSV / NDJSON export of tasks and task history.
+
+Rows are read with ``values_list().iterator(chunk_size=...)`` and encoded
+into ~64 KB chunks as they are produced, so memory use does not depend on
+how many rows are exported. The same generators back the export endpoints
+and the ``export_tasks`` management command.
+"""
+import csv
+import json
+import zlib
+from datetime import date, datetime
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 2000
+BUFFER_BYTES = 64 * 1024
+
+# (column name in the export, field passed to values_list)
+TASK_COLUMNS = [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('description', 'description'),
+    ('due_date', 'due_date'),
+    ('priority', 'priority'),
+    ('status', 'status'),
+    ('user', 'user_id'),
+    ('completed_at', 'completed_at'),
+    ('category', 'category_id'),
+    ('recurrence', 'recurrence'),
+    ('next_due_date', 'next_due_date'),
+    ('created_at', 'created_at'),
+]
+HISTORY_COLUMNS = [
+    ('id', 'id'),
+    ('task', 'task_id'),
+    ('change_time', 'change_time'),
+    ('action', 'action'),
+    ('details', 'details'),
+]
+
+
+def _format_value(value):
+    """Render values the way the API does: ISO dates, 'Z' for UTC datetimes"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(queryset, columns, chunk_size=CHUNK_SIZE):
+    fields = [field for _, field in columns]
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield [_format_value(value) for value in row]
+
+
+class _Echo:
+    """File-like object whose write() hands back what it was given"""
+
+    def write(self, value):
+        return value
+
+
+def _buffered(pieces):
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= BUFFER_BYTES:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def encode_csv(rows, columns):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow([name for name, _ in columns])
+        for row in rows:
+            yield writer.writerow(['' if value is None else value for value in row])
+
+    return _buffered(lines())
+
+
+def encode_ndjson(rows, columns):
+    names = [name for name, _ in columns]
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    return _buffered(dumps(dict(zip(names, row))) + '\n' for row in rows)
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(queryset, columns, export_format, chunk_size=CHUNK_SIZE, gzip=False):
+    encode = encode_csv if export_format == 'csv' else encode_ndjson
+    chunks = encode(iter_rows(queryset, columns, chunk_size), columns)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+def accepts_gzip(request):
+    encodings = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    return any(part.split(';')[0].strip() == 'gzip' for part in encodings.split(','))
+
+
+def streaming_export_response(request, queryset, columns, export_format, filename):
+    gzip = accepts_gzip(request)
+    # The body is produced after the view returns, so fix the database now
+    queryset = queryset.using(queryset.db)
+    response = StreamingHttpResponse(
+        export_chunks(queryset, columns, export_format, gzip=gzip),
+        content_type=EXPORT_FORMATS[export_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    response['Vary'] = 'Accept-Encoding'
+    if gzip:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+class PassthroughRenderer(BaseRenderer):
+    """Lets export views pass content negotiation for text/csv and friends"""
+    media_type = '*/*'
+    format = 'export'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only error responses are rendered here; exports stream their own body
+        if isinstance(data, (bytes, str)):
+            return data
+        return json.dumps(data)
@@ -0,0 +1,167 @@
+"""
+Read-only list serialization straight from ``values()`` rows.
+
+``ValuesSerializer`` looks at a ModelSerializer's fields once and compiles a
+converter per column, so listing a page costs one dict comprehension per row
+instead of a model instance plus a ``to_representation`` call per field. Its
+output is identical to the ModelSerializer's (see the parity test); fields it
+cannot reproduce exactly make it raise TypeError on first use rather than
+drift silently.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def _date_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None:
+        return None
+    if output_format.lower() == ISO_8601:
+        return lambda value: value.isoformat()
+    if output_format == '%Y-%m-%d':
+        # isoformat() is several times faster and only differs for years before 1000
+        return lambda value: value.isoformat() if value.year >= 1000 else value.strftime(output_format)
+    return lambda value: value.strftime(output_format)
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None:
+        return None
+
+    def bind():
+        # Mirrors DateTimeField.enforce_timezone; the active timezone can
+        # change per request, so it is looked up each time rows are rendered
+        if hasattr(field, 'timezone'):
+            field_timezone = field.timezone
+        else:
+            field_timezone = field.default_timezone()
+        if field_timezone is None:
+            to_local = field.enforce_timezone
+        else:
+            def to_local(value):
+                return value.astimezone(field_timezone) if value.tzinfo is not None else field.enforce_timezone(value)
+
+        if output_format.lower() == ISO_8601:
+            def convert(value):
+                value = to_local(value).isoformat()
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return convert
+        return lambda value: to_local(value).strftime(output_format)
+
+    bind.per_request = True
+    return bind
+
+
+# Model columns that values() already returns as str (or None)
+TEXT_COLUMNS = ('CharField', 'TextField', 'SlugField', 'EmailField', 'URLField')
+
+
+def _column_and_converter(name, field, model):
+    """``(values() column, converter or None)`` reproducing ``field.to_representation``"""
+    source = field.source
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return f'{source}_id', None
+    if isinstance(field, serializers.DateTimeField):
+        return source, _datetime_converter(field)
+    if isinstance(field, serializers.DateField):
+        return source, _date_converter(field)
+    if type(field) in (serializers.CharField, serializers.ChoiceField, serializers.EmailField):
+        try:
+            text_column = model._meta.get_field(source).get_internal_type() in TEXT_COLUMNS
+        except FieldDoesNotExist:
+            # An annotation the view's queryset adds, e.g. the notification's task_title
+            text_column = False
+        return source, None if text_column else str
+    if type(field) in (serializers.IntegerField, serializers.BooleanField, serializers.FloatField):
+        return source, None
+    raise TypeError(f'Field {name!r} ({type(field).__name__}) is not supported by ValuesSerializer')
+
+
+def _compile_row(names, columns, converters):
+    """``build(values) -> dict`` closed over the ``(name, column, converter)`` of every field"""
+    spec = tuple(zip(names, columns, converters))
+
+    def build(values):
+        data = {}
+        for name, column, convert in spec:
+            value = values[column]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+    return build
+
+
+class ValuesSerializer:
+    """Compiled, read-only counterpart of a ModelSerializer for values() rows"""
+
+    def __init__(self, serializer_class):
+        fields = [
+            (name, field) for name, field in serializer_class().fields.items() if not field.write_only
+        ]
+        model = serializer_class.Meta.model
+        self.names = [name for name, _ in fields]
+        compiled = [_column_and_converter(name, field, model) for name, field in fields]
+        self.columns = [column for column, _ in compiled]
+        self.converters = [converter for _, converter in compiled]
+        self._per_request = any(getattr(convert, 'per_request', False) for convert in self.converters)
+        self._build = None if self._per_request else self._compile()
+
+    def _compile(self):
+        converters = [
+            convert() if getattr(convert, 'per_request', False) else convert for convert in self.converters
+        ]
+        return _compile_row(self.names, self.columns, converters)
+
+    def many(self, rows):
+        build = self._compile() if self._per_request else self._build
+        return [build(values) for values in rows]
+
+
+_values_serializers = {}
+
+
+def get_values_serializer(serializer_class):
+    """The ValuesSerializer for ``serializer_class``, compiled on first use"""
+    if serializer_class not in _values_serializers:
+        _values_serializers[serializer_class] = ValuesSerializer(serializer_class)
+    return _values_serializers[serializer_class]
+
+
+def values_rows(view, queryset, values_serializer):
+    """
+    ``queryset.values()`` with the serializer's columns, the queryset's
+    annotations and the columns ``view``'s keyset pagination reads
+    """
+    columns = [*values_serializer.columns, *queryset.query.annotations]
+    get_ordering = getattr(view.paginator, 'get_ordering', None)
+    if get_ordering is not None:
+        # A sparse fieldset can leave out the columns the cursor is made of
+        columns += [
+            field.lstrip('-') for field in get_ordering(view.request, queryset, view)
+            if field.lstrip('-') not in columns
+        ]
+    return queryset.values(*columns)
+
+
+class ValuesListMixin:
+    """
+    Serve ``list`` through a ValuesSerializer compiled from ``serializer_class``.
+
+    Annotations on the queryset (e.g. the search rank) are fetched as well so
+    that ordering and keyset pagination can still read them from the rows.
+    """
+
+    def get_values_serializer(self):
+        return get_values_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = self.get_values_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = values_rows(self, queryset, values_serializer)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.many(page))
+        return Response(values_serializer.many(rows))
@@ -0,0 +1,83 @@
+"""
+Sparse fieldsets: ``?fields=id,title`` and ``?exclude=description`` on GET.
+
+The view's serializer class is swapped for a subclass that only has the
+chosen fields, so the response shrinks, and the query loads only their
+columns: lists already select just the ValuesSerializer's columns, and the
+detail view passes them to ``only()``. Writes always use the full serializer.
+Goes before ConditionalRequestMixin, so detail ETags differ per fieldset.
+"""
+from rest_framework import exceptions
+
+_sparse_serializers = {}
+
+
+def sparse_serializer(serializer_class, names):
+    """A subclass of ``serializer_class`` with only the fields in ``names``, created once per fieldset"""
+    key = (serializer_class, names)
+    if key not in _sparse_serializers:
+        def get_fields(self):
+            return {name: field for name, field in super(sparse, self).get_fields().items() if name in names}
+
+        sparse = type(f'Sparse{serializer_class.__name__}', (serializer_class,), {
+            '__module__': serializer_class.__module__,
+            'get_fields': get_fields,
+            'sparse_fields': names,
+        })
+        _sparse_serializers[key] = sparse
+    return _sparse_serializers[key]
+
+
+class SparseFieldsetMixin:
+    """Trim the serializer, and the columns read, to ``?fields=`` minus ``?exclude=`` on safe requests"""
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+    def _requested(self, param, available):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names - set(available)
+        if unknown:
+            raise exceptions.ValidationError({param: [
+                f"Unknown field(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(available)}."
+            ]})
+        return names
+
+    def get_fieldset(self):
+        """The field names to render, in declaration order, or None for all of them"""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = None
+            if self.request is not None and self.request.method in ('GET', 'HEAD'):
+                available = [
+                    name for name, field in super().get_serializer_class()().fields.items() if not field.write_only
+                ]
+                fields = self._requested(self.fields_query_param, available)
+                exclude = self._requested(self.exclude_query_param, available)
+                if fields is not None or exclude is not None:
+                    names = tuple(
+                        name for name in available
+                        if (fields is None or name in fields) and (exclude is None or name not in exclude)
+                    )
+                    if not names:
+                        raise exceptions.ValidationError({self.fields_query_param: ['No fields left to return.']})
+                    self._fieldset = names
+        return self._fieldset
+
+    def get_serializer_class(self):
+        serializer_class = super().get_serializer_class()
+        names = self.get_fieldset()
+        return serializer_class if names is None else sparse_serializer(serializer_class, names)
+
+    def get_etag_parts(self):
+        names = self.get_fieldset()
+        parts = super().get_etag_parts()
+        return parts if names is None else (*parts, names)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'retrieve' and self.get_fieldset() is not None:
+            fields = self.get_serializer_class()().fields.values()
+            queryset = queryset.only(*{field.source for field in fields})
+        return queryset
@@ -0,0 +1,159 @@
+"""
+Streaming CSV / NDJSON import of tasks.
+
+The upload is decoded and parsed one record at a time, validated with the
+``TaskSerializer`` field rules and written ``batch_size`` rows per
+transaction with ``bulk_create``. Every task gets its own "imported" history
+row, written by one more ``bulk_create`` per batch, so the record survives
+whichever tasks are deleted later. Rows that fail validation are reported
+back by line number instead of aborting the import.
+Accepts the files written by ``tasks.export``, past due dates included;
+read-only columns such as ``id`` and ``created_at`` are ignored.
+"""
+import csv
+import io
+import json
+from collections import namedtuple
+
+from django.db import transaction
+from rest_framework import serializers
+from task_manager.sqlite import retry_on_lock
+
+from .models import Task, TaskCategory, TaskHistory
+from . import stats
+from .recurrence import next_occurrence
+from .pubsub import broker
+from .response_cache import bump_generation_on_commit
+from .serializers import TaskSerializer
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 1000
+# The error report is returned in one response, so it is capped
+MAX_REPORTED_ERRORS = 1000
+
+ImportResult = namedtuple('ImportResult', ['created', 'failed', 'errors'])
+
+
+class ImportFileError(Exception):
+    """The upload itself is unreadable (bad encoding, not a CSV header, ...)"""
+    # What ``import_tasks`` had written before the upload broke off
+    result = None
+
+
+class _ImportSerializer(TaskSerializer):
+    """TaskSerializer's rules, less the ones that only make sense for new tasks"""
+
+    def validate_due_date(self, value):
+        # Exported tasks keep their due dates, which may well be past by now
+        return value
+
+
+def iter_records(stream, import_format):
+    """Yield ``(line, record)`` pairs from a binary stream; ``record`` is None for unparsable lines"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if import_format == 'csv':
+            reader = csv.DictReader(text)
+            for record in reader:
+                # Empty cells mean "not given", so model defaults apply
+                yield reader.line_num, {
+                    key: value for key, value in record.items() if key and value not in ('', None)
+                }
+        else:
+            for line, raw in enumerate(text, 1):
+                if not raw.strip():
+                    continue
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    record = None
+                yield line, record if isinstance(record, dict) else None
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise ImportFileError(f'Could not read the upload: {exc}')
+    finally:
+        text.detach()
+
+
+class _RowValidator:
+    """Run TaskSerializer's field rules on plain dicts, resolving categories from one lookup"""
+
+    def __init__(self, user):
+        # One serializer instance is reused; building its fields per row is most of the cost
+        self.serializer = _ImportSerializer()
+        categories = list(TaskCategory.objects.filter(user=user).values_list('name', 'id'))
+        self.category_ids = dict(categories)
+        self.own_category_ids = {pk for _, pk in categories}
+
+    def resolve_category(self, value):
+        if value in (None, ''):
+            return None
+        if str(value) in self.category_ids:
+            return self.category_ids[str(value)]
+        # Exports write the category id, so accept the user's own ids as well
+        if str(value).isdigit() and int(value) in self.own_category_ids:
+            return int(value)
+        raise serializers.ValidationError({'category': [f'Unknown category {value!r}.']})
+
+    def __call__(self, record):
+        if record is None:
+            raise serializers.ValidationError({'non_field_errors': ['Line is not a JSON object.']})
+        record = dict(record)
+        # Resolved here rather than by the serializer's per-row primary key lookup
+        category_id = self.resolve_category(record.pop('category', None))
+        record.pop('next_due_date', None)
+        data = self.serializer.run_validation(record)
+        data['category_id'] = category_id
+        data['next_due_date'] = next_occurrence(data['due_date'], data.get('recurrence'))
+        return data
+
+
+@retry_on_lock
+def _write_batch(user, rows, lines):
+    with transaction.atomic():
+        created = Task.objects.bulk_create([Task(user=user, **data) for data in rows])
+        stats.record(after=[stats.snapshot(task) for task in created])
+        TaskHistory.objects.bulk_create([
+            TaskHistory(task=task, action='imported', details=f'Imported from line {line} of an upload.')
+            for task, line in zip(created, lines)
+        ])
+    # bulk_create skips the signals that expire the user's cached responses and wake their streams
+    bump_generation_on_commit(user.id)
+    broker.publish_on_commit([user.id])
+    return len(created)
+
+
+def import_tasks(user, records, batch_size=BATCH_SIZE):
+    """
+    Validate and insert ``(line, record)`` pairs for ``user``; returns an
+    ImportResult. When the upload turns unreadable partway, the valid rows
+    before that point are still written and the ImportFileError carries
+    their result.
+    """
+    validate = _RowValidator(user)
+    created = failed = 0
+    errors = []
+    batch, lines = [], []
+
+    try:
+        for line, record in records:
+            try:
+                data = validate(record)
+            except serializers.ValidationError as exc:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': line, 'errors': exc.detail})
+                continue
+            batch.append(data)
+            lines.append(line)
+            if len(batch) >= batch_size:
+                created += _write_batch(user, batch, lines)
+                batch, lines = [], []
+    except ImportFileError as exc:
+        if batch:
+            created += _write_batch(user, batch, lines)
+        exc.result = ImportResult(created=created, failed=failed, errors=errors)
+        raise
+
+    if batch:
+        created += _write_batch(user, batch, lines)
+    return ImportResult(created=created, failed=failed, errors=errors)
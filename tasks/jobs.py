@@ -0,0 +1,194 @@
+"""
+Small durable job queue for side effects that do not belong on the request path.
+
+Write paths call ``enqueue`` inside their own transaction, so the job row
+commits (or rolls back) together with the data it refers to. Workers started
+by the ``run_jobs`` management command claim jobs in batches, hand every
+payload of one kind to its handler in a single call, and retry failures with
+exponential backoff. With ``TASK_JOBS_EAGER = True`` handlers run inline,
+which is what the test suite uses.
+
+Nothing runs jobs unless a ``run_jobs`` worker is deployed next to the web
+processes. ``queue_health`` (exported on /metrics) shows how long the oldest
+due job has been waiting, so a missing or stuck worker can be alerted on.
+Jobs that failed for good are kept for TASK_JOBS_FAILED_RETENTION_DAYS for
+inspection, then ``purge_failed`` (run by ``run_jobs``) deletes them.
+"""
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Count, Min, Subquery
+from django.utils import timezone
+
+from . import reminders
+from .models import BackgroundJob, Task, TaskHistory
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = timedelta(minutes=5)
+# A claimed job whose worker died becomes claimable again after this long
+LEASE = timedelta(minutes=5)
+
+_handlers = {}
+
+
+def handler(kind):
+    """Register ``func(payloads)`` as the batch handler for a job kind"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload):
+    if kind not in _handlers:
+        raise ValueError(f'No handler registered for job kind {kind!r}')
+    if getattr(settings, 'TASK_JOBS_EAGER', False):
+        _handlers[kind]([payload])
+        return None
+    return BackgroundJob.objects.create(kind=kind, payload=payload)
+
+
+def _claim(batch_size):
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    due = BackgroundJob.objects.filter(
+        status__in=[BackgroundJob.PENDING, BackgroundJob.RUNNING],
+        run_after__lte=now
+    ).order_by('run_after', 'id')
+    # One UPDATE ... WHERE id IN (SELECT ... LIMIT n): no read-then-write
+    # transaction for concurrent workers to deadlock on, and the run_after
+    # guard makes it a no-op for rows another worker has just taken
+    BackgroundJob.objects.filter(
+        id__in=Subquery(due.values('id')[:batch_size]),
+        run_after__lte=now
+    ).update(
+        status=BackgroundJob.RUNNING,
+        claimed_by=token,
+        run_after=now + LEASE
+    )
+    return list(BackgroundJob.objects.filter(claimed_by=token, status=BackgroundJob.RUNNING))
+
+
+def _fail(job, error):
+    job.attempts += 1
+    job.last_error = error
+    job.claimed_by = ''
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = BackgroundJob.FAILED
+        logger.error('Job %s (%s) failed permanently: %s', job.pk, job.kind, error)
+    else:
+        job.status = BackgroundJob.PENDING
+        job.run_after = timezone.now() + min(timedelta(seconds=2 ** job.attempts), MAX_BACKOFF)
+    job.save(update_fields=['attempts', 'last_error', 'claimed_by', 'status', 'run_after'])
+
+
+def _run(kind, jobs):
+    func = _handlers.get(kind)
+    if func is None:
+        for job in jobs:
+            _fail(job, f'No handler registered for job kind {kind!r}')
+        return 0
+
+    try:
+        with transaction.atomic():
+            func([job.payload for job in jobs])
+            BackgroundJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+        return len(jobs)
+    except Exception as exc:
+        if len(jobs) == 1:
+            logger.exception('Job %s (%s) failed', jobs[0].pk, kind)
+            _fail(jobs[0], repr(exc))
+            return 0
+
+    # Retry one by one so a single bad payload does not hold back the batch
+    return sum(_run(kind, [job]) for job in jobs)
+
+
+def run_pending(batch_size=100):
+    """
+    Claim and run one batch. Returns the number of jobs claimed; failed ones
+    are rescheduled with backoff, so an empty queue is the only way to get 0.
+    """
+    jobs = _claim(batch_size)
+    by_kind = defaultdict(list)
+    for job in jobs:
+        by_kind[job.kind].append(job)
+    for kind, batch in by_kind.items():
+        _run(kind, batch)
+    return len(jobs)
+
+
+def purge_failed(now=None):
+    """Delete jobs that failed for good longer ago than the retention period; returns how many"""
+    days = getattr(settings, 'TASK_JOBS_FAILED_RETENTION_DAYS', 30)
+    if days is None:
+        return 0
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    # A failed job's run_after is when its last attempt was due
+    deleted, _ = BackgroundJob.objects.filter(status=BackgroundJob.FAILED, run_after__lt=cutoff).delete()
+    return deleted
+
+
+def queue_health(now=None):
+    """
+    Jobs per status, and how many seconds the oldest due job has waited past
+    its run_after (0 when none is due). Running jobs count once their lease
+    has expired, which is what a dead worker leaves behind.
+    """
+    now = now or timezone.now()
+    counts = dict(BackgroundJob.objects.order_by().values_list('status').annotate(count=Count('id')))
+    oldest = BackgroundJob.objects.filter(
+        status__in=[BackgroundJob.PENDING, BackgroundJob.RUNNING]
+    ).aggregate(oldest=Min('run_after'))['oldest']
+    health = {status: counts.get(status, 0) for status, _ in BackgroundJob.STATUS_CHOICES}
+    health['oldest_due_seconds'] = max((now - oldest).total_seconds(), 0) if oldest else 0
+    return health
+
+
+class Worker(threading.Thread):
+    """Polls the queue until stopped, sleeping only when a batch comes back empty"""
+
+    def __init__(self, stop_event, batch_size=100, poll_interval=1.0, name=None):
+        super().__init__(name=name, daemon=True)
+        self.stop_event = stop_event
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                try:
+                    claimed = run_pending(self.batch_size)
+                except Exception:
+                    logger.exception('Job worker %s crashed while claiming work', self.name)
+                    claimed = 0
+                if not claimed:
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+
+# Side effects of the task write paths
+
+@handler('task_created')
+def task_created(payloads):
+    """History rows and due-soon notifications for newly created tasks"""
+    tasks = list(
+        Task.objects.filter(id__in=[payload['task_id'] for payload in payloads])
+        .only('id', 'title', 'due_date', 'user_id')
+    )
+    TaskHistory.objects.bulk_create([
+        TaskHistory(task_id=task.id, action='created', details=f'Task "{task.title}" created.')
+        for task in tasks
+    ])
+
+    # Same reminders as the scheduled scan, which will then skip these tasks
+    reminders.notify([(task.id, task.user_id, task.title, task.due_date) for task in tasks], timezone.localdate())
@@ -0,0 +1,85 @@
+import json
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from tasks.benchmark import run, seed, summarize
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Seed throwaway data, drive the main API endpoints and report latency percentiles, '
+            'query counts and throughput (nothing is kept in the database)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--categories', type=int, default=5, help='Categories per user (default: 5).')
+        parser.add_argument('--tasks', type=int, default=1000, help='Tasks per user (default: 1000).')
+        parser.add_argument('--history', type=int, default=3, help='History entries per task (default: 3).')
+        parser.add_argument('--notifications', type=int, default=20, help='Notifications per user (default: 20).')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Requests per endpoint and user; the list endpoint also runs '
+                                 'every filter/ordering/search combination once (default: 50).')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep caches between requests instead of clearing them before each one.')
+        parser.add_argument('--output', '-o', help='Write the JSON report to this file as well.')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'tasks', 'requests'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be at least 1.')
+
+        report = None
+        try:
+            # The test client needs 'testserver' to be an allowed host
+            with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+                started = time.perf_counter()
+                users = seed(
+                    users=options['users'], categories=options['categories'], tasks=options['tasks'],
+                    history=options['history'], notifications=options['notifications'],
+                )
+                seed_seconds = time.perf_counter() - started
+                endpoints = summarize(run(users, options['requests'], options['warm_cache']))
+                report = {
+                    'meta': {
+                        'started_at': timezone.now().isoformat(),
+                        'django': django.get_version(),
+                        'python': platform.python_version(),
+                        'database': connection.vendor,
+                        'seed_seconds': round(seed_seconds, 3),
+                        'options': {
+                            name: options[name] for name in (
+                                'users', 'categories', 'tasks', 'history', 'notifications',
+                                'requests', 'warm_cache',
+                            )
+                        },
+                    },
+                    'endpoints': endpoints,
+                }
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{'endpoint':<28} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+                          f"{'queries':>8} {'req/s':>8}")
+        for name, row in report['endpoints'].items():
+            self.stdout.write(
+                f"{name:<28} {row['requests']:>6} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['p99_ms']:>9.2f} {row['mean_queries']:>8.1f} {row['throughput_rps'] or 0:>8.1f}"
+            )
+            failures = {status: count for status, count in row['statuses'].items() if not status.startswith('2')}
+            if failures:
+                self.stderr.write(f'  {name}: non-2xx responses {failures}')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
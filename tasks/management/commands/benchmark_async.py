@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from tasks.benchmark import compare_servers, seed
+
+
+class Command(BaseCommand):
+    help = ('Load-test the read endpoints through the WSGI handler (sync views) and the ASGI handler '
+            '(sync and native async views) and report requests/s, latency, threads and memory per '
+            'connection; runs on a throwaway database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--tasks', type=int, default=500, help='Tasks per user (default: 500).')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50],
+                            help='Requests in flight; one run per level (default: 1 10 50).')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per server and concurrency level (default: 500).')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        if min(options['concurrency']) < 1 or options['requests'] < 1 or options['users'] < 1:
+            raise CommandError('--users, --requests and every --concurrency level must be at least 1.')
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_async builds its throwaway database with SQLite.')
+
+        # Threads and the event loop need committed rows, so rather than roll
+        # back a transaction like benchmark_api, work on a migrated copy of the schema
+        original_name = connection.settings_dict['NAME']
+        original_test = connection.settings_dict.get('TEST', {})
+        with tempfile.TemporaryDirectory() as directory, override_settings(ALLOWED_HOSTS=['*']):
+            connection.settings_dict['TEST'] = {**original_test, 'NAME': os.path.join(directory, 'benchmark.sqlite3')}
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                users = seed(users=options['users'], tasks=options['tasks'])
+                report = compare_servers(users, options['concurrency'], options['requests'])
+            finally:
+                connection.creation.destroy_test_db(original_name, verbosity=0)
+                connection.settings_dict['TEST'] = original_test
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+            return
+        self.stdout.write(f"{'concurrency':>11} {'server':<18} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+                          f"{'threads':>7} {'KiB/conn':>9}")
+        for level, rows in report.items():
+            for name, row in rows.items():
+                self.stdout.write(
+                    f"{level:>11} {name:<18} {row['throughput_rps']:>8.1f} {row['p50_ms']:>8.2f} "
+                    f"{row['p99_ms']:>8.2f} {row['threads']:>7} {row['memory_per_connection_kib']:>9.1f}"
+                )
+                failures = {status: count for status, count in row['statuses'].items() if status != '200'}
+                if failures:
+                    self.stderr.write(f'  {name}: non-200 responses {failures}')
@@ -0,0 +1,70 @@
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from tasks.fast_list import ValuesSerializer
+from tasks.models import Task, TaskCategory
+from tasks.serializers import TaskSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of TaskSerializer and the values() list path on throwaway data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Tasks to serialize (default: 5000).')
+        parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs (default: 5).')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be at least 1.')
+        try:
+            # Everything is seeded inside a transaction that is always rolled back
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, repeat):
+        user = User.objects.create_user('benchmark-list-serialization')
+        category = TaskCategory.objects.create(name='Benchmark', user=user)
+        start = date.today() + timedelta(days=1)
+        Task.objects.bulk_create([
+            Task(
+                title=f'Task {i}', description='Benchmark task' if i % 2 else None,
+                due_date=start + timedelta(days=i % 90), priority=('low', 'medium', 'high')[i % 3],
+                recurrence=('none', 'daily', 'weekly', 'monthly')[i % 4],
+                category=category if i % 3 else None, user=user,
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+        queryset = Task.objects.filter(user=user).order_by('due_date', 'id')
+        fast = ValuesSerializer(TaskSerializer)
+        render = JSONRenderer().render
+
+        def best(func):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+
+        paths = [
+            ('TaskSerializer', lambda: render(TaskSerializer(queryset, many=True).data)),
+            ('values() rows', lambda: render(fast.many(queryset.values(*fast.columns)))),
+        ]
+        results = [(name, best(func)) for name, func in paths]
+        baseline = results[0][1]
+        for name, seconds in results:
+            self.stdout.write(
+                f'{name:<16} {rows / seconds:>12,.0f} rows/s  ({seconds * 1000:.1f} ms, {baseline / seconds:.1f}x)'
+            )
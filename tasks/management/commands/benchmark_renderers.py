@@ -0,0 +1,87 @@
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from tasks import compression, renderers
+from tasks.fast_list import ValuesSerializer
+from tasks.models import Task, TaskCategory
+from tasks.serializers import TaskSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Compare encode time and bytes on the wire (plain, gzip, brotli) of the JSON, orjson and '
+            'MessagePack renderers for a task list, on throwaway data')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Tasks in the list (default: 10000).')
+        parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs (default: 5).')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be at least 1.')
+        try:
+            # Everything is seeded inside a transaction that is always rolled back
+            with transaction.atomic():
+                data = self.seed(options['rows'])
+                raise Rollback
+        except Rollback:
+            pass
+        self.run(data, options['repeat'])
+
+    def seed(self, rows):
+        user = User.objects.create_user('benchmark-renderers')
+        category = TaskCategory.objects.create(name='Benchmark', user=user)
+        start = date.today() + timedelta(days=1)
+        Task.objects.bulk_create([
+            Task(
+                title=f'Task {i}', description='Benchmark task with a few words of description' if i % 2 else None,
+                due_date=start + timedelta(days=i % 90), priority=('low', 'medium', 'high')[i % 3],
+                recurrence=('none', 'daily', 'weekly', 'monthly')[i % 4],
+                category=category if i % 3 else None, user=user,
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+        fast = ValuesSerializer(TaskSerializer)
+        return fast.many(Task.objects.filter(user=user).order_by('due_date', 'id').values(*fast.columns))
+
+    def run(self, data, repeat):
+        def best(func):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = func()
+                timings.append(time.perf_counter() - started)
+            return result, min(timings)
+
+        encoders = [('JSONRenderer', JSONRenderer().render)]
+        if renderers.orjson is not None:
+            encoders.append(('FastJSONRenderer', renderers.FastJSONRenderer().render))
+        else:
+            self.stderr.write('orjson is not installed; FastJSONRenderer would fall back to JSONRenderer.')
+        if renderers.msgpack is not None:
+            encoders.append(('MessagePackRenderer', renderers.MessagePackRenderer().render))
+        else:
+            self.stderr.write('msgpack is not installed; skipping MessagePackRenderer.')
+        codings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+
+        self.stdout.write(f'{len(data)} tasks')
+        self.stdout.write(f"{'renderer':<20} {'encode ms':>10} {'bytes':>11}" + ''.join(
+            f' {coding + " bytes":>11} {coding + " ms":>9}' for coding in codings
+        ))
+        baseline = None
+        for name, render in encoders:
+            body, seconds = best(lambda: render(data))
+            baseline = baseline or seconds
+            line = f'{name:<20} {seconds * 1000:>10.1f} {len(body):>11,}'
+            for coding in codings:
+                compressed, compress_seconds = best(lambda: compression.compress(body, coding))
+                line += f' {len(compressed):>11,} {compress_seconds * 1000:>9.1f}'
+            self.stdout.write(f'{line}  ({baseline / seconds:.1f}x)')
@@ -0,0 +1,62 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.export import CHUNK_SIZE, HISTORY_COLUMNS, TASK_COLUMNS, export_chunks
+from tasks.models import Task, TaskHistory
+from tasks.views import TaskFilter
+
+
+class Command(BaseCommand):
+    help = "Stream a user's tasks (or task history) to a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', nargs='?',
+                            help='Export only this user (default: every user).')
+        parser.add_argument('--format', dest='export_format', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout).')
+        parser.add_argument('--history', action='store_true', help='Export task history instead of tasks.')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f'Rows fetched per database round trip (default: {CHUNK_SIZE}).')
+        # The same filters the task list endpoint accepts
+        parser.add_argument('--status')
+        parser.add_argument('--priority')
+        parser.add_argument('--due-date', help='Only tasks due on or before this date.')
+        parser.add_argument('--category', help='Category name contains this text.')
+
+    def handle(self, *args, **options):
+        tasks = Task.objects.all()
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['username']!r} does not exist.")
+            tasks = tasks.filter(user=user)
+
+        data = {
+            name: options[name] for name in ('status', 'priority', 'due_date', 'category')
+            if options[name] is not None
+        }
+        task_filter = TaskFilter(data=data, queryset=tasks)
+        if not task_filter.is_valid():
+            raise CommandError(task_filter.errors.as_text())
+        tasks = task_filter.qs
+
+        if options['history']:
+            queryset, columns = TaskHistory.objects.filter(task__in=tasks).order_by('id'), HISTORY_COLUMNS
+        else:
+            queryset, columns = tasks.order_by('id'), TASK_COLUMNS
+
+        chunks = export_chunks(
+            queryset, columns, options['export_format'],
+            chunk_size=options['chunk_size'], gzip=options['gzip']
+        )
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,49 @@
+import os
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.importer import BATCH_SIZE, IMPORT_FORMATS, ImportFileError, import_tasks, iter_records
+
+
+class Command(BaseCommand):
+    help = 'Import tasks for a user from a CSV or NDJSON file, reporting rows that fail validation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path', help="File to read, or '-' for stdin.")
+        parser.add_argument('--format', dest='import_format', choices=IMPORT_FORMATS,
+                            help='Input format (default: taken from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Rows inserted per transaction (default: {BATCH_SIZE}).')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist.")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        path = options['path']
+        import_format = options['import_format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError('Cannot tell the input format; pass --format csv or --format ndjson.')
+
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            result = import_tasks(user, iter_records(stream, import_format), options['batch_size'])
+        except ImportFileError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if path != '-':
+                stream.close()
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f'... and {result.failed - len(result.errors)} more invalid row(s).')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} task(s); {result.failed} row(s) failed validation.'
+        ))
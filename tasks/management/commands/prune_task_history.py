@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from tasks.retention import prune_history, retention_setting
+
+
+class Command(BaseCommand):
+    help = 'Delete or compact task history outside the retention policy (safe to re-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int,
+                            help=f"Expire entries older than this (default: {retention_setting('MAX_AGE_DAYS')}; 0 disables).")
+        parser.add_argument('--max-entries', type=int,
+                            help='Keep at most this many entries per task '
+                                 f"(default: {retention_setting('MAX_ENTRIES_PER_TASK')}; 0 disables).")
+        parser.add_argument('--compact', action='store_true', default=None,
+                            help='Squash expired entries into one summary entry per task instead of deleting them.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of tasks processed per transaction (default: 500).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be pruned without writing anything.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        for name in ('max_age_days', 'max_entries'):
+            if options[name] is not None and options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+
+        result = prune_history(
+            max_age_days=options['max_age_days'],
+            max_entries=options['max_entries'],
+            compact=options['compact'],
+            chunk_size=options['chunk_size'],
+            using=options['database'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would prune' if options['dry_run'] else 'Pruned'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} history of {result.tasks} task(s): '
+            f'{result.deleted} deleted, {result.compacted} compacted.'
+        ))
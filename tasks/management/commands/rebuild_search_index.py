@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from tasks.search import get_search_backend, install_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for tasks in one bulk pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias to rebuild (default: "default").')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        install_search_backend(using=alias)
+        backend = get_search_backend(alias)
+        indexed = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {type(backend).__name__} index ({indexed} tasks).'
+        ))
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.stats import rebuild, rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user task counters from the tasks table and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only these users (default: everyone).')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of users reconciled per transaction (default: 500).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many counters are wrong without fixing them.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        if options['usernames']:
+            user_ids = list(User.objects.filter(username__in=options['usernames']).values_list('id', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError('Some of the given users do not exist.')
+            drift = rebuild(user_ids, dry_run=options['dry_run'])
+        else:
+            drift = rebuild_all(options['chunk_size'], dry_run=options['dry_run'])
+
+        verb = 'Found' if options['dry_run'] else 'Corrected'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {drift} drifted counter(s).'))
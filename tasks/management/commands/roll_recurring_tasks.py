@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from tasks.recurrence import roll_over
+
+
+class Command(BaseCommand):
+    help = 'Spawn the next instance of every completed or overdue recurring task (safe to re-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Treat this ISO date as today (default: the current date).')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of users processed per transaction (default: 500).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be spawned without writing anything.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError(f"Invalid --date {options['date']!r}; expected YYYY-MM-DD.")
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        result = roll_over(
+            today=today,
+            chunk_size=options['chunk_size'],
+            using=options['database'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would spawn' if options['dry_run'] else 'Spawned'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.spawned} recurring task(s) for {result.users} user(s).'
+        ))
@@ -0,0 +1,64 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from tasks.jobs import Worker, purge_failed, run_pending
+
+# How often a running pool deletes failed jobs past their retention
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = ('Drain the background job queue with a pool of worker threads. Must run alongside the web '
+            'processes in every deployment; failed jobs past their retention are purged hourly')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Number of worker threads (default: 2).')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Jobs claimed per batch (default: 100).')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty (default: 1).')
+        parser.add_argument('--once', action='store_true',
+                            help='Process everything currently due, then exit.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be at least 1.')
+
+        self.purge()
+        if options['once']:
+            total = 0
+            while True:
+                claimed = run_pending(options['batch_size'])
+                if not claimed:
+                    break
+                total += claimed
+            self.stdout.write(self.style.SUCCESS(f'Processed {total} job(s).'))
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        workers = [
+            Worker(stop, options['batch_size'], options['poll_interval'], name=f'job-worker-{i}')
+            for i in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Started {len(workers)} job worker(s); press Ctrl+C to stop.')
+
+        while not stop.wait(PURGE_INTERVAL):
+            self.purge()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS('Job workers stopped.'))
+
+    def purge(self):
+        close_old_connections()
+        purged = purge_failed()
+        if purged:
+            self.stdout.write(f'Purged {purged} failed job(s) past their retention.')
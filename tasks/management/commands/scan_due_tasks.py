@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from tasks.reminders import reminder_setting, scan
+
+
+class Command(BaseCommand):
+    help = 'Send "due soon" and "overdue" notifications for tasks that entered the window since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--due-soon-days', type=int,
+                            help=f"Remind about tasks due within this many days "
+                                 f"(default: {reminder_setting('DUE_SOON_DAYS')}).")
+        parser.add_argument('--overdue-days', type=int,
+                            help=f"Remind about tasks overdue by at most this many days "
+                                 f"(default: {reminder_setting('OVERDUE_DAYS')}).")
+        parser.add_argument('--chunk-size', type=int,
+                            help=f"Notifications inserted per statement (default: {reminder_setting('CHUNK_SIZE')}).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be sent without writing anything or moving the high-water mark.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        for name in ('due_soon_days', 'overdue_days'):
+            if options[name] is not None and options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        result = scan(
+            due_soon_days=options['due_soon_days'],
+            overdue_days=options['overdue_days'],
+            chunk_size=options['chunk_size'],
+            using=options['database'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would send' if options['dry_run'] else 'Sent'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} reminder(s) for {result.candidates} candidate task(s).'
+        ))
@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+from task_manager.sqlite import is_lock_error, retry_on_lock, sqlite_database
+
+# Scratch aliases, one per mode, registered in DATABASES for the length of a run
+ALIASES = {'stock': 'stress_stock', 'tuned': 'stress_tuned'}
+
+SCHEMA = (
+    'CREATE TABLE stress_task (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, title TEXT NOT NULL)',
+    'CREATE INDEX stress_task_user ON stress_task (user_id)',
+    'CREATE TABLE stress_stat (user_id INTEGER PRIMARY KEY, count INTEGER NOT NULL)',
+)
+
+
+@contextmanager
+def scratch_database(alias, tuned):
+    """A fresh database file under ``alias``, configured by ``sqlite_database`` like the real one"""
+    with tempfile.TemporaryDirectory() as directory:
+        connections.settings[alias] = sqlite_database(os.path.join(directory, 'stress.sqlite3'), tuned=tuned)
+        # Fill in the defaults Django gives every DATABASES entry
+        connections.configure_settings(connections.settings)
+        try:
+            with connections[alias].cursor() as cursor:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+            yield alias
+        finally:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+
+def _worker(alias, user_id, deadline, results, lock):
+    attempts = committed = lock_errors = 0
+
+    # The app's retry policy and the shape of its write paths: read, then
+    # write, in one transaction
+    @retry_on_lock(using=alias)
+    def write():
+        nonlocal attempts
+        attempts += 1
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM stress_task WHERE user_id = %s', [user_id])
+            cursor.fetchone()
+            cursor.execute('INSERT INTO stress_task (user_id, title) VALUES (%s, %s)', [user_id, 'stress'])
+            cursor.execute(
+                'INSERT INTO stress_stat (user_id, count) VALUES (%s, 1) '
+                'ON CONFLICT (user_id) DO UPDATE SET count = count + 1', [user_id]
+            )
+
+    try:
+        while time.monotonic() < deadline:
+            try:
+                write()
+                committed += 1
+            except OperationalError as exc:
+                if not is_lock_error(exc):
+                    raise
+                lock_errors += 1
+    finally:
+        # Each thread has its own connection to the alias
+        connections[alias].close()
+    with lock:
+        results['committed'] += committed
+        results['lock_errors'] += lock_errors
+        results['retries'] += attempts - committed - lock_errors
+
+
+def stress(tuned, workers, seconds):
+    """Hammer a fresh database from ``workers`` threads; returns counts and throughput"""
+    mode = 'tuned' if tuned else 'stock'
+    with scratch_database(ALIASES[mode], tuned) as alias:
+        results = {'committed': 0, 'lock_errors': 0, 'retries': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+        threads = [
+            threading.Thread(target=_worker, args=(alias, index % 4, deadline, results, lock))
+            for index in range(workers)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+    results['transactions_per_second'] = round(results['committed'] / elapsed, 1)
+    return results
+
+
+class Command(BaseCommand):
+    help = ('Compare write throughput and "database is locked" errors of the stock and the '
+            'tuned SQLite configuration under concurrent read-then-write transactions, '
+            'both through Django connections with the same retry_on_lock policy')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent writers (default: 8).')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run (default: 5).')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['seconds'] <= 0:
+            raise CommandError('--workers and --seconds must be positive.')
+        results = {
+            mode: stress(mode == 'tuned', options['workers'], options['seconds'])
+            for mode in ALIASES
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for mode, row in results.items():
+            self.stdout.write(
+                f"{mode:<6} {row['transactions_per_second']:>10,.1f} tx/s  "
+                f"{row['lock_errors']:>6} lock errors  {row['retries']:>6} retries"
+            )
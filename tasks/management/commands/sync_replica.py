@@ -0,0 +1,28 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from tasks.routers import replica_alias
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto the local replica file (online backup, safe while serving)'
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError('No replica is configured; set DATABASE_REPLICA to a SQLite file path.')
+        primary, replica = settings.DATABASES[DEFAULT_DB_ALIAS], settings.DATABASES[alias]
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError('sync_replica only handles SQLite; use the database\'s own replication otherwise.')
+
+        source = sqlite3.connect(primary['NAME'])
+        target = sqlite3.connect(replica['NAME'])
+        try:
+            source.backup(target, pages=1024)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {primary['NAME']} to {replica['NAME']}."))
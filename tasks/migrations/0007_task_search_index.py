@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from tasks.search import install_search_backend
+    install_search_backend(using=schema_editor.connection.alias)
+
+
+def uninstall(apps, schema_editor):
+    from tasks.search import SQLiteFTSBackend
+    if schema_editor.connection.vendor == 'sqlite':
+        SQLiteFTSBackend(schema_editor.connection.alias).uninstall()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_notification_read_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('next_due_date__isnull', False)), fields=['user', 'due_date'], name='tasks_task_series_head_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill(apps, schema_editor):
+    # The counters as tasks.stats computes them, frozen here against the
+    # historical models and the database being migrated
+    Task = apps.get_model('tasks', 'Task')
+    TaskStat = apps.get_model('tasks', 'TaskStat')
+    db_alias = schema_editor.connection.alias
+    tasks = Task.objects.using(db_alias).order_by()
+    counters = []
+    for field, dimension in (('status', 'status'), ('priority', 'priority'), ('category_id', 'category')):
+        for user_id, value, count in tasks.values_list('user_id', field).annotate(count=Count('id')):
+            counters.append(TaskStat(user_id=user_id, dimension=dimension, key=str(value or ''), count=count))
+    open_tasks = tasks.filter(status__in=('pending', 'in_progress'))
+    for user_id, due_date, count in open_tasks.values_list('user_id', 'due_date').annotate(count=Count('id')):
+        counters.append(TaskStat(user_id=user_id, dimension='due', key=due_date.isoformat(), count=count))
+    TaskStat.objects.using(db_alias).bulk_create(counters, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_updated_at_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('status', 'Status'), ('priority', 'Priority'), ('category', 'Category'), ('due', 'Due date')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'dimension', 'key'), name='tasks_taskstat_unique_counter')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
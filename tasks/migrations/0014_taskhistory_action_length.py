@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_due_date_reminders'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskhistory',
+            name='action',
+            field=models.CharField(max_length=20),
+        ),
+    ]
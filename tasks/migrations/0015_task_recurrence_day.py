@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_taskhistory_action_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='recurrence_day',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
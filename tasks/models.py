@@ -1,9 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class TaskCategory(models.Model):
     name = models.CharField(max_length=100)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_categories')
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -37,34 +39,158 @@ class Task(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     recurrence = models.CharField(max_length=50, choices=RECURRENCE_CHOICES, default='none')
     next_due_date = models.DateField(null=True, blank=True)
+    # Day of month a monthly series steps to; null means due_date's day (see tasks.recurrence)
+    recurrence_day = models.PositiveSmallIntegerField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     category = models.ForeignKey(TaskCategory, on_delete=models.SET_NULL, null=True, blank=True)  # Updated to ForeignKey
     created_at = models.DateTimeField(auto_now_add=True)  # New field to track when the task was created
+    updated_at = models.DateTimeField(auto_now=True)  # Drives ETag/Last-Modified; set it by hand in update() calls
 
     def __str__(self):
         return self.title
 
+    class Meta:
+        # Every list query filters on user first, then on the TaskFilter
+        # equality fields, and orders by one of TaskViewSet.ordering_fields
+        indexes = [
+            models.Index(fields=['user', 'due_date']),
+            models.Index(fields=['user', 'status', 'due_date']),
+            models.Index(fields=['user', 'priority', 'due_date']),
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['user', 'priority']),
+            models.Index(fields=['user', 'updated_at']),  # MAX(updated_at) for list ETags
+            # Only live recurring series heads carry a next_due_date
+            models.Index(
+                fields=['user', 'due_date'],
+                name='tasks_task_series_head_idx',
+                condition=models.Q(next_due_date__isnull=False),
+            ),
+            # The reminder scanner's range scans across all users (see tasks.reminders)
+            models.Index(
+                fields=['due_date'],
+                name='tasks_task_open_due_idx',
+                condition=models.Q(status__in=['pending', 'in_progress']),
+            ),
+            models.Index(
+                fields=['updated_at'],
+                name='tasks_task_open_updated_idx',
+                condition=models.Q(status__in=['pending', 'in_progress']),
+            ),
+        ]
+
 class TaskHistory(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
     change_time = models.DateTimeField(auto_now_add=True)
-    action = models.CharField(max_length=10)
+    action = models.CharField(max_length=20)
     details = models.TextField()
 
     def __str__(self):
         return f"{self.action} on {self.change_time} for {self.task.title}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', 'change_time']),  # History is read per task, newest first
+        ]
+
 class Notification(models.Model):
+    DUE_SOON = 'due_soon'
+    OVERDUE = 'overdue'
+    KIND_CHOICES = [
+        (DUE_SOON, 'Due soon'),
+        (OVERDUE, 'Overdue'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    is_read = models.BooleanField(default=False)
+    # Due-date reminders (see tasks.reminders) record what they were about,
+    # so each (task, kind, due date) is notified once however often it is found
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, blank=True, default='')
+    due_date = models.DateField(null=True, blank=True)
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message}"
 
     class Meta:
         indexes = [
-            models.Index(fields=['user']),  # Adding index for user
+            models.Index(fields=['user', 'created_at']),  # Newest-first list per user
+            models.Index(fields=['user', 'is_read', 'created_at']),  # Unread list and count
             models.Index(fields=['task']),   # Adding index for task
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['task', 'kind', 'due_date'],
+                name='tasks_notification_unique_reminder',
+                condition=models.Q(due_date__isnull=False),
+            ),
+        ]
+
 
+class BackgroundJob(models.Model):
+    """Durable queue entry for work moved off the request path (see tasks.jobs)"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} job {self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),  # Claim query
+            models.Index(fields=['claimed_by']),
+        ]
+
+
+class TaskStat(models.Model):
+    """Incrementally maintained per-user task counter (see tasks.stats)"""
+    STATUS = 'status'
+    PRIORITY = 'priority'
+    CATEGORY = 'category'
+    DUE = 'due'  # Open tasks per due date; key is the ISO date
+    DIMENSION_CHOICES = [
+        (STATUS, 'Status'),
+        (PRIORITY, 'Priority'),
+        (CATEGORY, 'Category'),
+        (DUE, 'Due date'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_stats')
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} {self.dimension}={self.key}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'dimension', 'key'], name='tasks_taskstat_unique_counter'),
+        ]
+
+
+class ReminderScan(models.Model):
+    """High-water mark of a due-date reminder scan (see tasks.reminders)"""
+    name = models.CharField(max_length=50, unique=True)
+    today = models.DateField()  # Due dates before this were overdue at the last run
+    horizon = models.DateField()  # Latest due date the last run considered
+    scanned_at = models.DateTimeField()  # Tasks edited after this are looked at again
+
+    def __str__(self):
+        return f"{self.name} scanned through {self.horizon} at {self.scanned_at}"
@@ -0,0 +1,62 @@
+"""
+Unread notification counters.
+
+Mobile clients poll the unread count every few seconds, so it is served from
+the cache and only recounted (an index-only COUNT over user, is_read) after a
+write invalidates it. Invalidation waits for the write to commit, or a count
+taken in between would be cached with the old value for UNREAD_COUNT_TIMEOUT.
+Bulk writers that bypass model signals must call
+``invalidate_unread_count_on_commit`` themselves.
+
+Counts live in the ``default`` cache. With the LocMemCache configured in
+settings that is per process and invalidation only reaches the writing
+worker, so the timeout is kept to a few seconds: other workers recount at
+most that long after a write, and a client polling one worker still gets
+most of its reads from the cache.
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Notification
+
+# Bounds how stale another worker's count can be (see above)
+UNREAD_COUNT_TIMEOUT = 5
+
+
+def _unread_count_key(user_id):
+    return f'tasks:notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    key = _unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+async def aunread_count(user_id):
+    key = _unread_count_key(user_id)
+    count = await cache.aget(key)
+    if count is None:
+        count = await Notification.objects.filter(user_id=user_id, is_read=False).acount()
+        await cache.aset(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_unread_count(*user_ids):
+    cache.delete_many([_unread_count_key(user_id) for user_id in user_ids])
+
+
+def invalidate_unread_count_on_commit(*user_ids, using=DEFAULT_DB_ALIAS):
+    """``invalidate_unread_count`` once the current transaction on ``using`` commits (at once outside one)"""
+    transaction.on_commit(lambda: invalidate_unread_count(*user_ids), using=using)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def _notification_changed(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    invalidate_unread_count_on_commit(instance.user_id, using=using)
@@ -0,0 +1,196 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.lookups import Exact
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, replace_query_param
+
+
+def _position_value(item, field):
+    """Read an ordering column from a model instance or a values() dict"""
+    value = item[field] if isinstance(item, dict) else getattr(item, field)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _pinned_fields(queryset):
+    """Names of columns the queryset fixes to a single value with an exact filter"""
+    pinned = set()
+    for child in queryset.query.where.children:
+        if not isinstance(child, Exact) or hasattr(child.rhs, 'resolve_expression'):
+            continue
+        target = getattr(child.lhs, 'target', None)
+        if target is not None and child.lhs.alias == queryset.query.base_table:
+            pinned.add(target.name)
+    return pinned
+
+
+def _ordering_field(queryset, name):
+    """The model field or annotation output field behind an ordering column"""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    if name == 'pk':
+        return queryset.model._meta.pk
+    return queryset.model._meta.get_field(name)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on every column of the ordering.
+
+    DRF's CursorPagination only seeks on the first ordering field and falls
+    back to an OFFSET for ties, which degrades on columns like due_date where
+    thousands of rows share a value. Here the cursor stores the full ordering
+    tuple (always ending in the primary key) and each page is fetched with a
+    row-value comparison, so every page costs the same no matter how deep.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('id',)
+
+    def get_ordering(self, request, queryset, view):
+        # A column pinned by an equality filter adds nothing to the order and
+        # only leads SQLite to pick a range scan plus a temp B-tree sort
+        pinned = _pinned_fields(queryset)
+        ordering = [
+            field for field in super().get_ordering(request, queryset, view)
+            if field.lstrip('-') not in pinned
+        ]
+        # The primary key makes the ordering total so the cursor is unambiguous
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering and ordering[0].startswith('-') else 'id')
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, fetching the page with the async ORM"""
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([item async for item in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+
+        if self.cursor and len(self.cursor.position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            position = self._parse_position(queryset, self.cursor.position)
+            queryset = queryset.filter(self._seek(ordering, position))
+
+        # Fetch one extra row to learn whether another page follows
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        reverse = self.cursor.reverse if self.cursor else False
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = self.cursor is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = [_position_value(self.page[-1], field.lstrip('-')) for field in self.ordering]
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = [_position_value(self.page[0], field.lstrip('-')) for field in self.ordering]
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('ascii'))
+            reverse = bool(data['r'])
+            position = list(data['p'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def _parse_position(self, queryset, position):
+        """Cursor values converted by their column's field; a tampered cursor is NotFound, not a 500"""
+        parsed = []
+        for field, value in zip(self.ordering, position):
+            output = _ordering_field(queryset, field.lstrip('-'))
+            try:
+                value = output.to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            # Ordering columns are never null, and a None bound cannot be queried
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            parsed.append(value)
+        return parsed
+
+    def encode_cursor(self, cursor):
+        data = json.dumps({'r': int(cursor.reverse), 'p': cursor.position}, separators=(',', ':'))
+        encoded = b64encode(data.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+    @staticmethod
+    def _seek(ordering, position):
+        """
+        Build the row-value comparison (a, b, c) > (x, y, z) as
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        honouring the direction of each column.
+        """
+        seek = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return seek
+
+
+class TaskCursorPagination(KeysetPagination):
+    ordering = ('due_date', 'id')
+
+
+class NotificationCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class TaskHistoryCursorPagination(KeysetPagination):
+    ordering = ('-change_time', '-id')
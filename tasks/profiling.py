@@ -0,0 +1,253 @@
+"""
+Opt-in request profiling and a Prometheus text-format metrics endpoint.
+
+``RequestProfilingMiddleware`` times every request and, through
+``connection.execute_wrapper``, counts its queries and the time spent in
+them. Results go into in-process histograms keyed by the resolved URL name
+and method, which ``metrics_view`` renders for Prometheus to scrape. The
+middleware can also add a ``Server-Timing`` header and log slow requests
+together with their slowest SQL statements. Streaming responses (exports,
+event streams) are only counted: their body is produced after the middleware
+returns, and an event stream lasts as long as the client stays connected, so
+their timings would say nothing about the request.
+
+Everything is per process: scrape each worker, or aggregate downstream.
+"""
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+
+from . import jobs
+from .authentication import token_cache
+from .models import BackgroundJob
+from .pubsub import broker
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SERVER_TIMING': False,
+    'SLOW_REQUEST_MS': None,
+    'SLOW_REQUEST_SQL': 5,  # How many of the slowest statements a slow-request log entry shows
+    'METRICS_TOKEN': None,
+}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _config(name):
+    return getattr(settings, 'TASK_PROFILING', {}).get(name, DEFAULTS[name])
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and two additions"""
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Histograms per (route, method), plus request counts per status"""
+
+    METRICS = (
+        ('request_duration_seconds', 'Wall time of the request', DURATION_BUCKETS),
+        ('db_queries', 'Database queries issued by the request', QUERY_BUCKETS),
+        ('db_duration_seconds', 'Time spent executing database queries', DURATION_BUCKETS),
+        ('response_size_bytes', 'Size of the response body', SIZE_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._histograms = {}
+            self._requests = {}
+
+    def observe(self, route, method, status, duration=None, queries=None, db_duration=None, size=None):
+        """Count the request; without a ``duration`` it stays out of the histograms"""
+        with self._lock:
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if duration is None:
+                return
+            histograms = self._histograms.get((route, method))
+            if histograms is None:
+                histograms = self._histograms[(route, method)] = [
+                    Histogram(buckets) for _, _, buckets in self.METRICS
+                ]
+            for histogram, value in zip(histograms, (duration, queries, db_duration, size)):
+                histogram.observe(value)
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)"""
+        lines = [
+            '# HELP tasks_http_requests_total Requests handled, by route, method and status',
+            '# TYPE tasks_http_requests_total counter',
+        ]
+        with self._lock:
+            for (route, method, status), count in sorted(self._requests.items()):
+                lines.append(f'tasks_http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+            for index, (name, help_text, buckets) in enumerate(self.METRICS):
+                lines.append(f'# HELP tasks_http_{name} {help_text}')
+                lines.append(f'# TYPE tasks_http_{name} histogram')
+                for (route, method), histograms in sorted(self._histograms.items()):
+                    histogram = histograms[index]
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        labels = _labels(route=route, method=method, le=bound)
+                        lines.append(f'tasks_http_{name}_bucket{labels} {cumulative}')
+                    labels = _labels(route=route, method=method)
+                    lines.append(f'tasks_http_{name}_sum{labels} {histogram.total:.6g}')
+                    lines.append(f'tasks_http_{name}_count{labels} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+registry = Registry()
+
+
+class _QueryRecorder:
+    """execute_wrapper callback that counts queries and keeps the slowest few"""
+
+    def __init__(self, keep):
+        self.count = 0
+        self.duration = 0.0
+        self.keep = keep
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.keep:
+                self.slowest.append((elapsed, sql))
+                if len(self.slowest) > self.keep:
+                    self.slowest.remove(min(self.slowest))
+
+
+def _install_recorder(stack, recorder):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+
+
+class RequestProfilingMiddleware:
+    """Record timing, query and size metrics per URL name; enable with TASK_PROFILING['ENABLED']"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _config('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = self._recorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            _install_recorder(stack, recorder)
+            response = self.get_response(request)
+        return self._observe(request, response, recorder, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        recorder = self._recorder()
+        started = time.perf_counter()
+        # Connections are per thread, and the async ORM runs its queries in
+        # the request's thread-sensitive worker, so hook them there
+        stack = ExitStack()
+        await sync_to_async(_install_recorder)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._observe(request, response, recorder, time.perf_counter() - started)
+
+    @staticmethod
+    def _recorder():
+        slow = _config('SLOW_REQUEST_MS') is not None
+        return _QueryRecorder(_config('SLOW_REQUEST_SQL') if slow else 0)
+
+    def _observe(self, request, response, recorder, duration):
+        slow_ms = _config('SLOW_REQUEST_MS')
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else '<unresolved>'
+        if response.streaming:
+            registry.observe(route, request.method, response.status_code)
+            return response
+        registry.observe(route, request.method, response.status_code, duration,
+                         recorder.count, recorder.duration, len(response.content))
+
+        if _config('SERVER_TIMING'):
+            response['Server-Timing'] = (
+                f'app;dur={duration * 1000:.1f}, '
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+            )
+        if slow_ms is not None and duration * 1000 >= slow_ms:
+            statements = ''.join(
+                f'\n  {elapsed * 1000:.1f} ms: {sql}'
+                for elapsed, sql in sorted(recorder.slowest, reverse=True)
+            )
+            logger.warning('Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in the database%s',
+                           request.method, request.get_full_path(), route, duration * 1000,
+                           recorder.count, recorder.duration * 1000, statements)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint: staff users, or ``Authorization: Bearer <METRICS_TOKEN>``"""
+    token = _config('METRICS_TOKEN')
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        authorized = True
+    if not authorized:
+        raise PermissionDenied
+    lines = []
+    for name, value in token_cache.stats().items():
+        kind = 'gauge' if name == 'entries' else 'counter'
+        suffix = '' if kind == 'gauge' else '_total'
+        lines += [f'# TYPE tasks_token_cache_{name}{suffix} {kind}', f'tasks_token_cache_{name}{suffix} {value}']
+    lines += ['# TYPE tasks_push_subscriptions gauge', f'tasks_push_subscriptions {len(broker)}']
+    health = jobs.queue_health()
+    lines.append('# TYPE tasks_jobs gauge')
+    lines += [f'tasks_jobs{_labels(status=status)} {health[status]}' for status, _ in BackgroundJob.STATUS_CHOICES]
+    lines += ['# TYPE tasks_jobs_oldest_due_seconds gauge',
+              f"tasks_jobs_oldest_due_seconds {health['oldest_due_seconds']:.6g}"]
+    body = registry.render() + '\n'.join(lines) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
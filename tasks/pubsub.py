@@ -0,0 +1,89 @@
+"""
+In-process pub/sub that wakes a user's push streams (see tasks.push).
+
+A wake carries no data: the woken stream reads whatever changed from the
+database after its own cursor, so wakes can be coalesced or missed without
+losing anything. Task deletions, which leave nothing to read, are the only
+payload. ``publish`` is thread-safe and can be called from sync code;
+subscriptions belong to the event loop that created them.
+"""
+import asyncio
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+class Subscription:
+    __slots__ = ('user_id', 'loop', 'event', 'deleted')
+
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.deleted = []
+
+    def _wake(self, deleted):
+        self.deleted.extend(deleted)
+        self.event.set()
+
+    async def wait(self, timeout):
+        """Sleep until woken or ``timeout`` seconds pass (None waits forever); True if woken"""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def take_deleted(self):
+        deleted, self.deleted = self.deleted, []
+        return deleted
+
+
+class Broker:
+    """Subscriptions per user id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_ids, deleted_tasks=()):
+        with self._lock:
+            subscriptions = [
+                subscription for user_id in set(user_ids) for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._wake, list(deleted_tasks))
+            except RuntimeError:
+                # The loop has closed; its stream is gone too
+                pass
+
+    def publish_on_commit(self, user_ids, deleted_tasks=(), using=DEFAULT_DB_ALIAS):
+        """``publish`` once the current transaction commits, when the change becomes readable"""
+        if not self._subscriptions:
+            # Nobody is listening in this process; streams elsewhere re-check on their own
+            return
+        user_ids = list(user_ids)
+        transaction.on_commit(lambda: self.publish(user_ids, deleted_tasks), using=using)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+broker = Broker()
@@ -0,0 +1,194 @@
+"""
+Push channel for notifications and task changes: an SSE stream and a
+long-poll fallback, served by the ASGI app.
+
+Events are read from the database after a cursor, which is the last
+notification id plus the last task (updated_at, id) seen. The cursor is the
+SSE event id and the long-poll ``since``, so a client that reconnects with
+``Last-Event-ID`` (or polls again with the cursor it got) resumes where it
+left off. Connected streams sleep on ``pubsub.broker`` until a write for
+their user commits in this process, and re-check the database every
+``RESYNC_SECONDS`` to pick up writes made by other processes.
+
+Delivery is best effort, not a change log:
+- Task deletions leave nothing to read back, so they are only pushed live,
+  without an id.
+- updated_at is stamped before a write commits. A task write that commits
+  after a later-stamped one was already streamed falls behind the cursor and
+  is skipped until that task changes again.
+Clients that must not lose a change should refetch their task list after a
+reconnect.
+
+Saves and deletes are caught by model signals; bulk writers that bypass
+signals must call ``broker.publish_on_commit`` themselves.
+"""
+import asyncio
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Max, Q
+from django.db.models.signals import post_delete, post_save
+
+from .fast_list import get_values_serializer
+from .models import Notification, Task
+from .pubsub import broker
+from .renderers import FastJSONRenderer
+from .serializers import NotificationSerializer, TaskSerializer
+
+DEFAULTS = {
+    'HEARTBEAT_SECONDS': 15,
+    'RESYNC_SECONDS': 60,
+    'LONG_POLL_TIMEOUT': 25,
+    'RETRY_MILLISECONDS': 3000,
+    'BATCH_SIZE': 100,
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+Cursor = namedtuple('Cursor', ['notification', 'task_time', 'task'])
+
+Event = namedtuple('Event', ['type', 'data', 'cursor'])
+
+_renderer = FastJSONRenderer()
+
+
+def push_setting(name):
+    return getattr(settings, 'TASK_PUSH', {}).get(name, DEFAULTS[name])
+
+
+def _microseconds(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def encode_cursor(cursor):
+    return f'{cursor.notification}.{_microseconds(cursor.task_time)}.{cursor.task}'
+
+
+def decode_cursor(value):
+    """Parse a cursor from ``encode_cursor``; raises ValueError for anything else"""
+    notification, task_time, task = (int(part) for part in value.split('.'))
+    if min(notification, task) < 0:
+        raise ValueError(value)
+    return Cursor(notification, EPOCH + timedelta(microseconds=task_time), task)
+
+
+# Wakes follow commits on the primary, so the reads that answer them go there too
+def _notifications():
+    return Notification.objects.using(DEFAULT_DB_ALIAS)
+
+
+def _tasks():
+    return Task.objects.using(DEFAULT_DB_ALIAS)
+
+
+async def current_cursor(user_id):
+    """The cursor just past everything the user has now"""
+    latest = await _notifications().aaggregate(id=Max('id'))
+    task = await _tasks().filter(user_id=user_id).order_by('-updated_at', '-id').values_list(
+        'updated_at', 'id'
+    ).afirst()
+    task_time, task_id = task or (EPOCH, 0)
+    return Cursor(latest['id'] or 0, task_time, task_id)
+
+
+async def read_events(user_id, cursor, limit=None):
+    """
+    Up to ``limit`` each of new notifications and changed tasks after
+    ``cursor``, oldest first, every event carrying the cursor just past it.
+    """
+    limit = limit or push_setting('BATCH_SIZE')
+    notification_serializer = get_values_serializer(NotificationSerializer)
+    notifications = _notifications().filter(user_id=user_id, id__gt=cursor.notification).annotate(
+        task_title=F('task__title')
+    ).order_by('id').values(*notification_serializer.columns)[:limit]
+    task_serializer = get_values_serializer(TaskSerializer)
+    # A range on the (user, updated_at) index, rather than an OR SQLite would scan for
+    tasks = _tasks().filter(user_id=user_id, updated_at__gte=cursor.task_time).exclude(
+        Q(updated_at=cursor.task_time, id__lte=cursor.task)
+    ).order_by('updated_at', 'id').values(*task_serializer.columns, 'updated_at')[:limit]
+
+    events = []
+    for row in notification_serializer.many([row async for row in notifications]):
+        cursor = cursor._replace(notification=row['id'])
+        events.append(Event('notification', row, cursor))
+    rows = [row async for row in tasks]
+    for row, data in zip(rows, task_serializer.many(rows)):
+        cursor = cursor._replace(task_time=row['updated_at'], task=row['id'])
+        events.append(Event('task', data, cursor))
+    return events, cursor
+
+
+def format_event(event_type, data, event_id=None):
+    """One Server-Sent Events message"""
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {event_type}')
+    # JSON escapes newlines, so the payload always fits on one data line
+    lines.append('data: ' + _renderer.render(data).decode())
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+async def stream(user_id, cursor):
+    """The SSE byte stream for ``user_id`` from ``cursor`` on, until the client goes away"""
+    heartbeat = push_setting('HEARTBEAT_SECONDS')
+    resync = push_setting('RESYNC_SECONDS')
+    limit = push_setting('BATCH_SIZE')
+    loop = asyncio.get_running_loop()
+    # Subscribing before the first read means no commit can fall in between
+    subscription = broker.subscribe(user_id)
+    try:
+        yield f"retry: {push_setting('RETRY_MILLISECONDS')}\n\n".encode()
+        while True:
+            events, cursor = await read_events(user_id, cursor, limit)
+            for event in events:
+                yield format_event(event.type, event.data, encode_cursor(event.cursor))
+            if len(events) >= limit:
+                continue
+            for task_id in subscription.take_deleted():
+                yield format_event('task_deleted', {'id': task_id})
+
+            checked = loop.time()
+            while not await subscription.wait(heartbeat):
+                yield b': heartbeat\n\n'
+                if resync is not None and loop.time() - checked >= resync:
+                    break
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def poll(user_id, cursor, timeout):
+    """
+    Wait up to ``timeout`` seconds for events after ``cursor``; returns them
+    (with deletions seen while waiting) and the cursor to poll from next.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    subscription = broker.subscribe(user_id)
+    try:
+        while True:
+            events, cursor = await read_events(user_id, cursor)
+            deleted = subscription.take_deleted()
+            remaining = deadline - loop.time()
+            if events or deleted or remaining <= 0:
+                break
+            await subscription.wait(min(remaining, push_setting('RESYNC_SECONDS') or remaining))
+    finally:
+        broker.unsubscribe(subscription)
+    payload = [{'id': encode_cursor(event.cursor), 'type': event.type, 'data': event.data} for event in events]
+    payload.extend({'id': None, 'type': 'task_deleted', 'data': {'id': task_id}} for task_id in deleted)
+    return payload, cursor
+
+
+def _saved(sender, instance, **kwargs):
+    broker.publish_on_commit([instance.user_id], using=kwargs.get('using', DEFAULT_DB_ALIAS))
+
+
+def _task_deleted(sender, instance, **kwargs):
+    broker.publish_on_commit([instance.user_id], deleted_tasks=[instance.pk],
+                             using=kwargs.get('using', DEFAULT_DB_ALIAS))
+
+
+post_save.connect(_saved, sender=Notification, dispatch_uid='push_notification_save')
+post_save.connect(_saved, sender=Task, dispatch_uid='push_task_save')
+post_delete.connect(_task_deleted, sender=Task, dispatch_uid='push_task_delete')
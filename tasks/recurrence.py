@@ -0,0 +1,167 @@
+"""
+Recurrence arithmetic and the batch roll-over engine.
+
+A recurring task whose ``next_due_date`` is set is the live head of its
+series. Once it is completed or its due date has passed, ``roll_over`` spawns
+the next instance (which becomes the new head) and clears ``next_due_date``
+on the old one, so running the engine twice never spawns twice.
+
+Monthly series keep the day of month they started on: every step clamps
+from that day, not from the previous (possibly clamped) date, so a series
+started on Jan 31 goes Feb 28, Mar 31, Apr 30. Spawned instances carry the
+day in ``recurrence_day``; the first instance of a series has it as its
+due date's day.
+"""
+import calendar
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import stats
+from .models import Task, TaskHistory
+from .pubsub import broker
+from .response_cache import bump_generation_on_commit
+
+
+def add_months(value, months, day=None):
+    """
+    Shift a date by whole calendar months, landing on ``day`` (default: the
+    date's own day) clamped to the last day of the month
+    """
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(day or value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(value, recurrence, count=1, day=None):
+    """
+    Return the date ``count`` recurrences after ``value``, or None for one-off
+    tasks; monthly steps land on ``day`` of the month when given
+    """
+    recurrence = (recurrence or 'none').lower()
+    if recurrence == 'daily':
+        return value + timedelta(days=count)
+    if recurrence == 'weekly':
+        return value + timedelta(weeks=count)
+    if recurrence == 'monthly':
+        return add_months(value, count, day)
+    return None
+
+
+def occurrences(first, recurrence, since, until, day=None):
+    """
+    Dates of the series that ``roll_over`` will spawn from ``first`` on (each
+    one ``next_occurrence`` of the one before, on ``day`` of the month, by
+    default ``first``'s), lazily, for those in [since, until)
+    """
+    recurrence = (recurrence or 'none').lower()
+    if recurrence not in ('daily', 'weekly', 'monthly'):
+        return
+    day = day or first.day
+    due = first
+    try:
+        # Daily and weekly series can jump straight to ``since``; months differ in length
+        if due < since and recurrence == 'daily':
+            due = since
+        elif due < since and recurrence == 'weekly':
+            due += timedelta(weeks=-((due - since).days // 7))
+        while due < since:
+            due = next_occurrence(due, recurrence, day=day)
+        while due < until:
+            yield due
+            due = next_occurrence(due, recurrence, day=day)
+    except (OverflowError, ValueError):
+        # The next date would fall past date.max, so the series ends here
+        return
+
+
+def due_for_roll_over(today, using=DEFAULT_DB_ALIAS):
+    """Live series heads that are completed or past their due date"""
+    return Task.objects.using(using).filter(
+        next_due_date__isnull=False,
+        recurrence__in=['daily', 'weekly', 'monthly'],
+    ).filter(Q(status='completed') | Q(due_date__lt=today))
+
+
+RollOverResult = namedtuple('RollOverResult', ['users', 'spawned'])
+
+
+def roll_over(today=None, chunk_size=500, using=DEFAULT_DB_ALIAS, dry_run=False):
+    """
+    Spawn the next instance of every due recurring task.
+
+    Users are walked in id order, ``chunk_size`` at a time, and each chunk is
+    handled in its own transaction, so memory stays bounded however many
+    tasks are due and an interrupted run can simply be started again.
+    """
+    today = today or timezone.localdate()
+    fields = ('id', 'title', 'description', 'priority', 'user_id', 'recurrence',
+              'due_date', 'next_due_date', 'recurrence_day', 'category_id')
+    users = spawned = 0
+    last_user_id = 0
+
+    while True:
+        user_ids = list(
+            due_for_roll_over(today, using)
+            .filter(user_id__gt=last_user_id)
+            .order_by('user_id')
+            .values_list('user_id', flat=True)
+            .distinct()[:chunk_size]
+        )
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+        users += len(user_ids)
+
+        with transaction.atomic(using=using):
+            due = list(
+                due_for_roll_over(today, using)
+                .filter(user_id__in=user_ids)
+                .select_for_update()
+                .only(*fields)
+            )
+            instances = []
+            for task in due:
+                # Skip occurrences that were missed entirely rather than back-filling them
+                day = (task.recurrence_day or task.due_date.day) if task.recurrence == 'monthly' else None
+                due_date = task.next_due_date
+                while due_date < today:
+                    due_date = next_occurrence(due_date, task.recurrence, day=day)
+                instances.append(Task(
+                    title=task.title,
+                    description=task.description,
+                    priority=task.priority,
+                    user_id=task.user_id,
+                    category_id=task.category_id,
+                    recurrence=task.recurrence,
+                    recurrence_day=day,
+                    due_date=due_date,
+                    next_due_date=next_occurrence(due_date, task.recurrence, day=day),
+                ))
+            spawned += len(instances)
+            if dry_run:
+                transaction.set_rollback(True, using=using)
+                continue
+
+            Task.objects.using(using).filter(id__in=[task.id for task in due]).update(
+                next_due_date=None, updated_at=timezone.now()
+            )
+            created = Task.objects.using(using).bulk_create(instances, batch_size=chunk_size)
+            stats.record(after=[stats.snapshot(task) for task in created], using=using)
+            TaskHistory.objects.using(using).bulk_create([
+                TaskHistory(
+                    task_id=task.id,
+                    action='created',
+                    details=f'Recurring task "{task.title}" scheduled for {task.due_date}.'
+                )
+                for task in created
+            ], batch_size=chunk_size)
+            bump_generation_on_commit(*{task.user_id for task in due}, using=using)
+            broker.publish_on_commit({task.user_id for task in due}, using=using)
+
+    return RollOverResult(users=users, spawned=spawned)
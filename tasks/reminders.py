@@ -0,0 +1,157 @@
+"""
+Due-date reminders: "due soon" and "overdue" notifications for open tasks.
+
+``scan`` runs on a schedule (the ``scan_due_tasks`` command) and finds, in
+one query across all users, the open tasks that need a reminder since
+the previous run:
+
+* due dates that entered the due-soon window (up to ``DUE_SOON_DAYS`` ahead);
+* due dates that became overdue (at most ``OVERDUE_DAYS`` ago);
+* tasks edited since the last run whose due date lies anywhere in between.
+
+Each of the three is a range scan on a partial index over open tasks, and
+the ReminderScan row remembers where the last run got to. Notifications
+carry their (task, kind, due date), which is unique, so overlapping or
+repeated runs and the reminders sent at creation time never notify twice.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from task_manager.sqlite import retry_on_lock
+
+from .models import Notification, ReminderScan, Task
+from .notifications import invalidate_unread_count_on_commit
+from .pubsub import broker
+from .stats import OPEN_STATUSES
+
+DEFAULTS = {
+    'DUE_SOON_DAYS': 2,
+    'OVERDUE_DAYS': 7,
+    'CHUNK_SIZE': 1000,
+}
+
+MESSAGES = {
+    Notification.DUE_SOON: "Task '{title}' is due soon!",
+    Notification.OVERDUE: "Task '{title}' is overdue!",
+}
+
+SCAN_NAME = 'due_dates'
+
+# A write that commits after a scan started can carry an updated_at from
+# just before it, so edits are looked at again this far back
+EDIT_OVERLAP = timedelta(minutes=5)
+
+ScanResult = namedtuple('ScanResult', ['candidates', 'created'])
+
+
+def reminder_setting(name):
+    return getattr(settings, 'TASK_REMINDERS', {}).get(name, DEFAULTS[name])
+
+
+def reminder_kind(due_date, today, due_soon_days, overdue_days):
+    """The reminder a task due on ``due_date`` calls for today, if any"""
+    if due_date < today - timedelta(days=overdue_days):
+        return None
+    if due_date < today:
+        return Notification.OVERDUE
+    if due_date <= today + timedelta(days=due_soon_days):
+        return Notification.DUE_SOON
+    return None
+
+
+@retry_on_lock
+def _write_chunk(notifications, using):
+    with transaction.atomic(using=using):
+        Notification.objects.using(using).bulk_create(notifications, ignore_conflicts=True)
+
+
+def notify(tasks, today, due_soon_days=None, overdue_days=None, chunk_size=None, using=DEFAULT_DB_ALIAS,
+           dry_run=False):
+    """
+    Create the reminders ``tasks`` (``(id, user_id, title, due_date)`` tuples)
+    call for, skipping any that were already sent. Returns how many were new.
+    """
+    if due_soon_days is None:
+        due_soon_days = reminder_setting('DUE_SOON_DAYS')
+    if overdue_days is None:
+        overdue_days = reminder_setting('OVERDUE_DAYS')
+    if chunk_size is None:
+        chunk_size = reminder_setting('CHUNK_SIZE')
+
+    created = 0
+    for start in range(0, len(tasks), chunk_size):
+        chunk = []
+        for task_id, user_id, title, due_date in tasks[start:start + chunk_size]:
+            kind = reminder_kind(due_date, today, due_soon_days, overdue_days)
+            if kind is not None:
+                chunk.append(Notification(user_id=user_id, task_id=task_id, kind=kind, due_date=due_date,
+                                          message=MESSAGES[kind].format(title=title)))
+        if not chunk:
+            continue
+        # The unique constraint alone would keep duplicates out; filtering
+        # first is what makes the count exact and spares the ignored inserts
+        sent = set(
+            Notification.objects.using(using)
+            .filter(task_id__in={notification.task_id for notification in chunk}, due_date__isnull=False)
+            .values_list('task_id', 'kind', 'due_date')
+        )
+        chunk = [
+            notification for notification in chunk
+            if (notification.task_id, notification.kind, notification.due_date) not in sent
+        ]
+        if chunk and not dry_run:
+            _write_chunk(chunk, using)
+            invalidate_unread_count_on_commit(*{notification.user_id for notification in chunk}, using=using)
+            broker.publish_on_commit({notification.user_id for notification in chunk}, using=using)
+        created += len(chunk)
+    return created
+
+
+CANDIDATE_FIELDS = ('id', 'user_id', 'title', 'due_date')
+
+
+def candidates(today, horizon, earliest, mark=None, using=DEFAULT_DB_ALIAS):
+    """
+    ``CANDIDATE_FIELDS`` of the open tasks due in [earliest, horizon] that are
+    new since ``mark``, or of all of them when there is no mark yet.
+    """
+    open_tasks = Task.objects.using(using).filter(status__in=OPEN_STATUSES)
+    if mark is None:
+        return open_tasks.filter(due_date__gte=earliest, due_date__lte=horizon).values_list(*CANDIDATE_FIELDS)
+    ranges = [
+        Q(due_date__gt=max(mark.horizon, earliest - timedelta(days=1)), due_date__lte=horizon),
+        Q(due_date__gte=max(mark.today, earliest), due_date__lt=today),
+        Q(updated_at__gt=mark.scanned_at - EDIT_OVERLAP, due_date__gte=earliest, due_date__lte=horizon),
+    ]
+    # UNION ALL rather than one OR: SQLite would rather scan a whole index
+    # than split an OR across two, while every branch here is a range search.
+    # A task can match more than one branch; callers drop the repeats
+    first, *rest = [open_tasks.filter(condition).values_list(*CANDIDATE_FIELDS) for condition in ranges]
+    return first.union(*rest, all=True)
+
+
+def scan(now=None, due_soon_days=None, overdue_days=None, chunk_size=None, using=DEFAULT_DB_ALIAS, dry_run=False):
+    """Send the reminders that became due since the last scan and move the high-water mark"""
+    now = now or timezone.now()
+    if due_soon_days is None:
+        due_soon_days = reminder_setting('DUE_SOON_DAYS')
+    if overdue_days is None:
+        overdue_days = reminder_setting('OVERDUE_DAYS')
+
+    today = timezone.localdate(now)
+    horizon = today + timedelta(days=due_soon_days)
+    earliest = today - timedelta(days=overdue_days)
+    mark = ReminderScan.objects.using(using).filter(name=SCAN_NAME).first()
+
+    tasks = list({row[0]: row for row in candidates(today, horizon, earliest, mark, using)}.values())
+    created = notify(tasks, today, due_soon_days, overdue_days, chunk_size, using, dry_run)
+    if not dry_run:
+        ReminderScan.objects.using(using).update_or_create(
+            name=SCAN_NAME, defaults={'today': today, 'horizon': horizon, 'scanned_at': now}
+        )
+    return ScanResult(candidates=len(tasks), created=created)
@@ -0,0 +1,129 @@
+"""
+Per-user cache for task, category and recurring-task GET responses.
+
+Entries are keyed on the user, a per-user generation number, the endpoint and
+the normalized query string. Any write by the user bumps the generation, so
+their old entries can never be served again and simply age out of the cache
+(size is bounded by the cache backend's MAX_ENTRIES culling plus the
+MAX_ENTRY_BYTES cap here). The bump waits for the write to commit: a read
+landing before the commit would otherwise cache the old rows under the new
+generation. Saves and deletes are caught by model signals; bulk writers that
+bypass signals must call ``bump_generation_on_commit`` themselves.
+
+Only reads from the primary are stored. A lagging replica's rows would be
+filed under the current generation and served long after the replica caught
+up, so replica reads still use the cache but never fill it.
+"""
+import hashlib
+import pickle
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+from .models import Task, TaskCategory
+from .routers import reading_replica
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'MAX_ENTRY_BYTES': 512 * 1024,
+}
+
+
+def _config(name):
+    return getattr(settings, 'TASK_RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def _cache():
+    return caches[_config('ALIAS')]
+
+
+def _generation_key(user_id):
+    return f'tasks:gen:{user_id}'
+
+
+def get_generation(user_id):
+    key = _generation_key(user_id)
+    generation = _cache().get(key)
+    if generation is None:
+        # Seeding from the clock means a culled counter restarts above any
+        # generation that may still have entries in the cache
+        generation = time.time_ns()
+        if not _cache().add(key, generation, None):
+            generation = _cache().get(key, generation)
+    return generation
+
+
+def bump_generation(*user_ids):
+    cache = _cache()
+    for user_id in set(user_ids):
+        try:
+            cache.incr(_generation_key(user_id))
+        except ValueError:
+            cache.set(_generation_key(user_id), time.time_ns(), None)
+
+
+def bump_generation_on_commit(*user_ids, using=DEFAULT_DB_ALIAS):
+    """``bump_generation`` once the current transaction on ``using`` commits (at once outside one)"""
+    transaction.on_commit(lambda: bump_generation(*user_ids), using=using)
+
+
+def response_cache_key(request, scope, kwargs):
+    params = sorted(
+        (name, tuple(sorted(values))) for name, values in request.query_params.lists()
+    )
+    raw = repr((request.get_host(), request.path, scope, sorted(kwargs.items()), params))
+    digest = hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+    return f'tasks:resp:{request.user.id}:{get_generation(request.user.id)}:{digest}'
+
+
+def memoize_for_user(request, scope, kwargs, compute):
+    """Cache ``compute()`` until the user's next write, like a cached response"""
+    if not _config('ENABLED'):
+        return compute()
+    key = response_cache_key(request, scope, kwargs)
+    value = _cache().get(key)
+    if value is None:
+        value = compute()
+        if not reading_replica():
+            _cache().set(key, value)
+    return value
+
+
+class UserResponseCacheMixin:
+    """Serve list/retrieve from the per-user response cache"""
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
+
+    def _cached_response(self, render, request, *args, **kwargs):
+        if not _config('ENABLED'):
+            return render(request, *args, **kwargs)
+
+        key = response_cache_key(request, f'{self.basename}:{self.action}', kwargs)
+        blob = _cache().get(key)
+        if blob is not None:
+            return Response(pickle.loads(blob))
+
+        response = render(request, *args, **kwargs)
+        if response.status_code == 200 and not reading_replica():
+            blob = pickle.dumps(response.data, pickle.HIGHEST_PROTOCOL)
+            if len(blob) <= _config('MAX_ENTRY_BYTES'):
+                _cache().set(key, blob)
+        return response
+
+
+def _owner_changed(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    bump_generation_on_commit(instance.user_id, using=using)
+
+
+for model in (Task, TaskCategory):
+    post_save.connect(_owner_changed, sender=model, dispatch_uid=f'response_cache_{model.__name__}_save')
+    post_delete.connect(_owner_changed, sender=model, dispatch_uid=f'response_cache_{model.__name__}_delete')
@@ -0,0 +1,147 @@
+"""
+Retention for TaskHistory.
+
+A history row expires once it is older than ``MAX_AGE_DAYS`` or is not among
+the newest ``MAX_ENTRIES_PER_TASK`` rows of its task. ``prune_history``
+walks the tasks that have history in id order, ``chunk_size`` at a time, and
+either deletes expired rows or, with ``compact``, squashes them into one
+summary row per task (action ``compacted``) that records how many entries of
+each action it replaced and the time range they covered. Summary rows are
+merged into the next summary instead of expiring themselves.
+"""
+import json
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import TaskHistory
+
+COMPACTED = 'compacted'
+
+DEFAULTS = {
+    'MAX_AGE_DAYS': 365,
+    'MAX_ENTRIES_PER_TASK': 200,
+    'COMPACT': False,
+}
+
+
+def retention_setting(name):
+    return getattr(settings, 'TASK_HISTORY_RETENTION', {}).get(name, DEFAULTS[name])
+
+
+PruneResult = namedtuple('PruneResult', ['tasks', 'deleted', 'compacted'])
+
+
+def _expired(task_ids, cutoff, max_entries, compact, using):
+    history = TaskHistory.objects.using(using).filter(task_id__in=task_ids)
+    if compact:
+        history = history.exclude(action=COMPACTED)
+    expired = Q()
+    if cutoff is not None:
+        expired |= Q(change_time__lt=cutoff)
+    if max_entries is not None:
+        ranked = history.annotate(position=Window(
+            RowNumber(),
+            partition_by=[F('task_id')],
+            order_by=[F('change_time').desc(), F('id').desc()],
+        )).filter(position__gt=max_entries)
+        expired |= Q(id__in=ranked.values('id'))
+    if not expired:
+        return history.none()
+    return history.filter(expired)
+
+
+def _summary(rows):
+    """Fold history rows (and earlier summaries) into one summary payload"""
+    actions = Counter()
+    entries = 0
+    times = []
+    for row in rows:
+        if row.action == COMPACTED:
+            previous = json.loads(row.details)
+            actions.update(previous['actions'])
+            entries += previous['entries']
+            times += [datetime.fromisoformat(previous['from']), datetime.fromisoformat(previous['to'])]
+        else:
+            actions[row.action] += 1
+            entries += 1
+            times.append(row.change_time)
+    return {
+        'entries': entries,
+        'from': min(times).isoformat(),
+        'to': max(times).isoformat(),
+        'actions': dict(sorted(actions.items())),
+    }
+
+
+def _compact(expired, using):
+    expired = list(expired.only('id', 'task_id', 'action', 'details', 'change_time'))
+    if not expired:
+        return 0
+    by_task = {}
+    for row in expired:
+        by_task.setdefault(row.task_id, []).append(row)
+    for row in TaskHistory.objects.using(using).filter(task_id__in=by_task, action=COMPACTED):
+        by_task[row.task_id].append(row)
+
+    summaries = []
+    for task_id, rows in by_task.items():
+        payload = _summary(rows)
+        summaries.append((TaskHistory(task_id=task_id, action=COMPACTED, details=json.dumps(payload)),
+                          max(row.change_time for row in rows)))
+
+    TaskHistory.objects.using(using).filter(
+        id__in=[row.id for rows in by_task.values() for row in rows]
+    ).delete()
+    created = TaskHistory.objects.using(using).bulk_create([summary for summary, _ in summaries])
+    # change_time is auto_now_add, so the original time is put back afterwards
+    for summary, (_, change_time) in zip(created, summaries):
+        summary.change_time = change_time
+    TaskHistory.objects.using(using).bulk_update(created, ['change_time'])
+    return len(expired)
+
+
+def prune_history(now=None, max_age_days=None, max_entries=None, compact=None,
+                  chunk_size=500, using=DEFAULT_DB_ALIAS, dry_run=False):
+    """
+    Apply the retention policy to every task's history; ``None`` arguments
+    fall back to ``settings.TASK_HISTORY_RETENTION``. Each chunk of tasks is
+    handled in its own transaction, so the run can be interrupted and resumed.
+    """
+    now = now or timezone.now()
+    max_age_days = retention_setting('MAX_AGE_DAYS') if max_age_days is None else max_age_days
+    max_entries = retention_setting('MAX_ENTRIES_PER_TASK') if max_entries is None else max_entries
+    compact = retention_setting('COMPACT') if compact is None else compact
+    cutoff = now - timedelta(days=max_age_days) if max_age_days else None
+    max_entries = max_entries or None
+
+    tasks = deleted = compacted = 0
+    last_task_id = 0
+    with_history = TaskHistory.objects.using(using).order_by('task_id').values_list('task_id', flat=True).distinct()
+
+    while True:
+        task_ids = list(with_history.filter(task_id__gt=last_task_id)[:chunk_size])
+        if not task_ids:
+            break
+        last_task_id = task_ids[-1]
+        tasks += len(task_ids)
+
+        with transaction.atomic(using=using):
+            expired = _expired(task_ids, cutoff, max_entries, compact, using)
+            if dry_run:
+                count = expired.count()
+                if compact:
+                    compacted += count
+                else:
+                    deleted += count
+            elif compact:
+                compacted += _compact(expired, using)
+            else:
+                deleted += expired.delete()[0]
+
+    return PruneResult(tasks=tasks, deleted=deleted, compacted=compacted)
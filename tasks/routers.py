@@ -0,0 +1,131 @@
+"""
+Read/write routing with a read replica and read-your-writes stickiness.
+
+Only code running under ``replica_reads()`` (the ``ReplicaReadMixin`` views
+on safe requests) or ``areplica_reads()`` (the async views) reads from the
+replica; everything else, including every write, uses the primary. After a user writes through one of those views
+they are pinned to the primary for ``STICKY_SECONDS``, so their next reads
+cannot miss their own changes on a lagging replica. Pins live in the
+default cache, which must be shared between processes for pins to follow a
+user across workers.
+
+Locally a second SQLite file can act as the replica: set DATABASE_REPLICA
+and refresh it from the primary with ``manage.py sync_replica``.
+"""
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+DEFAULTS = {
+    'REPLICA': 'replica',
+    'STICKY_SECONDS': 10,
+}
+
+_read_alias = ContextVar('tasks_read_alias', default=None)
+
+
+def _config(name):
+    return getattr(settings, 'TASK_DATABASE_ROUTING', {}).get(name, DEFAULTS[name])
+
+
+def replica_alias():
+    """The replica's alias, or None when no replica is configured"""
+    alias = _config('REPLICA')
+    if alias not in settings.DATABASES:
+        return None
+    # A test mirror is the primary under another name; reading it through a
+    # second connection would only contend with the test's transaction
+    if connections[alias].settings_dict['NAME'] == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return None
+    return alias
+
+
+def reading_replica():
+    """Whether reads in this context go to the replica"""
+    return _read_alias.get() is not None
+
+
+@contextmanager
+def replica_reads(user_id):
+    """Read from the replica for the block unless the user is pinned"""
+    alias = replica_alias()
+    if alias is not None and is_pinned(user_id):
+        alias = None
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(user_id):
+    """Async views: read from the replica for the block unless the user is pinned"""
+    alias = replica_alias()
+    if alias is not None and await cache.aget(_pin_key(user_id), False):
+        alias = None
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def _pin_key(user_id):
+    return f'tasks:primary-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    cache.set(_pin_key(user_id), True, _config('STICKY_SECONDS'))
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id), False)
+
+
+class ReplicaRouter:
+    """Reads go to the replica inside ``replica_reads()``; all writes go to the primary"""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related lookups follow the object they start from
+            return instance._state.db
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests from the replica unless the user wrote recently;
+    successful unsafe requests pin the user to the primary.
+    """
+    _replica_reads = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Authentication has run by now, so the user's pin can be checked
+        if request.method in SAFE_METHODS:
+            self._replica_reads = ExitStack()
+            self._replica_reads.enter_context(replica_reads(request.user.id))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_reads is not None:
+            self._replica_reads.close()
+            self._replica_reads = None
+        if request.method not in SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            pin_to_primary(request.user.id)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,239 @@
+"""
+Full-text search over task titles and descriptions.
+
+The search backend is chosen per database: SQLite uses an FTS5 shadow table
+kept in sync by triggers, PostgreSQL uses its built-in text search, and any
+other database falls back to the icontains lookups of DRF's SearchFilter.
+A backend can also be forced with the TASK_SEARCH_BACKEND setting.
+"""
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters as drf_filters
+from rest_framework.settings import api_settings
+
+FTS_TABLE = 'tasks_task_fts'
+
+# Title matches weigh more than description matches in the bm25 score
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Aliases already known to have the FTS table, so searches skip the lookup
+_fts_available = set()
+
+
+class BaseSearchBackend:
+    """Interface shared by the task search backends"""
+
+    def __init__(self, alias=DEFAULT_DB_ALIAS):
+        self.alias = alias
+
+    def search(self, queryset, terms):
+        """Restrict the queryset to tasks matching every term and annotate ``rank``"""
+        raise NotImplementedError
+
+    def install(self):
+        """Create whatever the backend needs in the database; must be idempotent"""
+
+    def uninstall(self):
+        """Remove what ``install`` created"""
+
+    def rebuild(self):
+        """Rebuild the index from the task table and return the number of rows indexed"""
+        return 0
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Unindexed fallback using the same icontains lookups as DRF's SearchFilter"""
+    search_fields = ('title', 'description')
+
+    def search(self, queryset, terms):
+        for term in terms:
+            condition = Q()
+            for field in self.search_fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    FTS5 external-content table over tasks_task.
+
+    Triggers on tasks_task keep the index in sync for every write path,
+    including bulk_create, queryset update() and delete().
+    """
+    TRIGGERS = {
+        f'{FTS_TABLE}_ai': f'''
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON tasks_task BEGIN
+                INSERT INTO {FTS_TABLE}(rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END''',
+        f'{FTS_TABLE}_ad': f'''
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON tasks_task BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+            END''',
+        f'{FTS_TABLE}_au': f'''
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON tasks_task BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+                INSERT INTO {FTS_TABLE}(rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END''',
+    }
+
+    def _table_exists(self):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def match_expression(terms):
+        """Quote each word and make it a prefix query: 'repo rev' -> '"repo"* "rev"*'"""
+        words = [word for term in terms for word in _TERM_RE.findall(term)]
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def search(self, queryset, terms):
+        expression = self.match_expression(terms)
+        if not expression:
+            return queryset.none()
+
+        table = queryset.model._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+        ).annotate(rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, %s, %s) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "{table}"."id"',
+            [TITLE_WEIGHT, DESCRIPTION_WEIGHT, expression],
+            output_field=FloatField()
+        ))
+
+    def install(self):
+        created = not self._table_exists()
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+                f"title, description, content='tasks_task', content_rowid='id', prefix='2 3')"
+            )
+            for sql in self.TRIGGERS.values():
+                cursor.execute(sql)
+        if created:
+            self.rebuild()
+
+    def uninstall(self):
+        with connections[self.alias].cursor() as cursor:
+            for name in self.TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+    def rebuild(self):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            cursor.execute('SELECT COUNT(*) FROM tasks_task')
+            return cursor.fetchone()[0]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL text search computed from the task columns.
+
+    Pair it with a GIN index on the same to_tsvector expression for large tables.
+    """
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        words = [word for term in terms for word in _TERM_RE.findall(term)]
+        if not words:
+            return queryset.none()
+
+        vector = SearchVector('title', weight='A') + SearchVector('description', weight='B')
+        query = SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw')
+        # SearchRank grows with relevance; negate it so ascending order is best first like bm25
+        return queryset.annotate(search_vector=vector).filter(search_vector=query).annotate(
+            rank=-SearchRank(vector, query)
+        )
+
+
+def get_search_backend(alias=DEFAULT_DB_ALIAS):
+    """Return the configured backend, or the best one the database supports"""
+    path = getattr(settings, 'TASK_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)(alias)
+
+    vendor = connections[alias].vendor
+    if vendor == 'sqlite':
+        backend = SQLiteFTSBackend(alias)
+        if alias in _fts_available:
+            return backend
+        try:
+            if backend._table_exists():
+                _fts_available.add(alias)
+                return backend
+        except OperationalError:
+            pass
+    elif vendor == 'postgresql':
+        return PostgresSearchBackend(alias)
+    return LikeSearchBackend(alias)
+
+
+def install_search_backend(using=DEFAULT_DB_ALIAS):
+    """Create the FTS table and its triggers on SQLite"""
+    if connections[using].vendor != 'sqlite':
+        return
+    try:
+        SQLiteFTSBackend(using).install()
+    except OperationalError:
+        # SQLite built without FTS5; searches use LikeSearchBackend instead
+        pass
+
+
+def restore_search_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate receiver: SQLite rebuilds tasks_task for most schema changes,
+    which drops the triggers that keep the FTS table in sync.
+    """
+    if connections[using].vendor != 'sqlite':
+        return
+    backend = SQLiteFTSBackend(using)
+    if backend._table_exists():
+        backend.install()
+
+
+class FullTextSearchFilter(drf_filters.BaseFilterBackend):
+    """
+    Drop-in replacement for SearchFilter that delegates to the search backend.
+
+    Matching tasks are annotated with ``rank`` (lower is more relevant), so
+    clients can ask for ``?search=...&ordering=rank``.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def get_search_terms(self, request):
+        params = request.query_params.get(self.search_param, '')
+        params = params.replace('\x00', '')  # strip null characters
+        params = params.replace(',', ' ')
+        return params.split()
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, terms)
+
+
+class RankOrderingFilter(drf_filters.OrderingFilter):
+    """OrderingFilter that only accepts ``rank`` when a search annotated it"""
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        valid = super().remove_invalid_fields(queryset, fields, view, request)
+        if 'rank' in queryset.query.annotations:
+            return valid
+        return [term for term in valid if term.lstrip('-') != 'rank']
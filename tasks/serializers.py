@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from .models import Task, TaskHistory, TaskCategory
+from .models import Task, TaskHistory, TaskCategory, Notification
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .recurrence import add_months, next_occurrence
 
 class TaskCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,26 +35,75 @@ class TaskSerializer(serializers.ModelSerializer):
         # Assign the user to the validated_data
         validated_data['user'] = user
 
+        # Work out the next occurrence up front so the task is written once
+        validated_data['next_due_date'] = next_occurrence(
+            validated_data['due_date'], validated_data.get('recurrence')
+        )
+
         # Create the task with the user field
         task = Task.objects.create(**validated_data)
 
-        # Handle recurrence logic
-        if task.recurrence and task.recurrence != 'none':
-            if task.recurrence == 'daily':
-                task.next_due_date = task.due_date + timezone.timedelta(days=1)
-            elif task.recurrence == 'weekly':
-                task.next_due_date = task.due_date + timezone.timedelta(weeks=1)
-            elif task.recurrence == 'monthly':
-                task.next_due_date = task.due_date + timezone.timedelta(days=30)
-            task.save()
-
         return task
 
+    def update(self, instance, validated_data):
+        # A new due date starts the series over on its own day of month
+        if 'due_date' in validated_data:
+            validated_data['recurrence_day'] = None
+        return super().update(instance, validated_data)
+
+class TaskBulkActionSerializer(serializers.Serializer):
+    """Input for bulk status transitions and deletes"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    delete = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if attrs['delete'] == ('status' in attrs):
+            raise serializers.ValidationError("Provide either a target status or delete=true.")
+        # Drop duplicate ids but keep the order the client sent them in
+        attrs['ids'] = list(dict.fromkeys(attrs['ids']))
+        return attrs
+
+class AgendaQuerySerializer(serializers.Serializer):
+    """Query parameters of the agenda: a [start, end) date range and a page"""
+    start = serializers.DateField()
+    end = serializers.DateField()
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+    # Series are expanded from their head on every page, so the range is kept near
+    MAX_SPAN_DAYS = 366
+    MAX_YEARS_AHEAD = 10
+
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({'end': ["Must be after start."]})
+        if (attrs['end'] - attrs['start']).days > self.MAX_SPAN_DAYS:
+            raise serializers.ValidationError({'end': [f"Must be at most {self.MAX_SPAN_DAYS} days after start."]})
+        if attrs['start'] > add_months(timezone.localdate(), 12 * self.MAX_YEARS_AHEAD):
+            raise serializers.ValidationError(
+                {'start': [f"Must be at most {self.MAX_YEARS_AHEAD} years from today."]}
+            )
+        return attrs
+
 class TaskHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = TaskHistory
         fields = '__all__'  # Consider specifying fields for better control
 
+class NotificationSerializer(serializers.ModelSerializer):
+    # Projected from the joined task row by NotificationView's queryset
+    task_title = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'task', 'task_title', 'message', 'created_at', 'is_read']
+        read_only_fields = fields
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
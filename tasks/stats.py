@@ -0,0 +1,220 @@
+"""
+Per-user task counters behind the dashboard endpoint.
+
+``TaskStat`` holds one row per (user, dimension, key): tasks per status,
+priority and category, plus open tasks per due date, from which overdue and
+due-this-week are summed. Write paths pass a snapshot of each task before
+and/or after the change to ``record`` inside their own transaction, so the
+counters commit together with the tasks. Counters that drop to zero are
+deleted, so due-date rows only exist for dates with open tasks. ``rebuild``
+recomputes them with a GROUP BY over Task and corrects any drift (run by
+``rebuild_task_stats``).
+"""
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete
+
+from .models import Task, TaskCategory, TaskStat
+
+OPEN_STATUSES = ('pending', 'in_progress')
+UPSERT_BATCH = 200
+SNAPSHOT_FIELDS = ('user_id', 'status', 'priority', 'category_id', 'due_date')
+
+Snapshot = namedtuple('Snapshot', SNAPSHOT_FIELDS)
+
+
+def snapshot(task):
+    """The fields the counters depend on, from a Task or a values() dict"""
+    if isinstance(task, dict):
+        return Snapshot(*(task[field] for field in SNAPSHOT_FIELDS))
+    return Snapshot(*(getattr(task, field) for field in SNAPSHOT_FIELDS))
+
+
+def _keys(snap):
+    yield TaskStat.STATUS, snap.status
+    yield TaskStat.PRIORITY, snap.priority
+    yield TaskStat.CATEGORY, str(snap.category_id or '')
+    if snap.status in OPEN_STATUSES:
+        yield TaskStat.DUE, snap.due_date.isoformat()
+
+
+def record(before=(), after=(), using=DEFAULT_DB_ALIAS):
+    """Move counters from the ``before`` snapshots to the ``after`` ones"""
+    deltas = Counter()
+    for snap in before:
+        for key in _keys(snap):
+            deltas[(snap.user_id,) + key] -= 1
+    for snap in after:
+        for key in _keys(snap):
+            deltas[(snap.user_id,) + key] += 1
+    rows = [ident + (delta,) for ident, delta in sorted(deltas.items()) if delta]
+    for start in range(0, len(rows), UPSERT_BATCH):
+        batch = rows[start:start + UPSERT_BATCH]
+        _upsert(batch, using)
+        _delete_emptied([row[:3] for row in batch if row[3] < 0], using)
+
+
+def _upsert(rows, using):
+    # One INSERT ... ON CONFLICT DO UPDATE per batch adds the deltas in place
+    # (SQLite 3.24+ and PostgreSQL), so a write costs one statement, not one
+    # read and one write per counter
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(TaskStat._meta.db_table)
+    columns = ', '.join(quote(column) for column in ('user_id', 'dimension', 'key', 'count'))
+    unique = ', '.join(quote(column) for column in ('user_id', 'dimension', 'key'))
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+    count = quote('count')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) VALUES {values} '
+            f'ON CONFLICT ({unique}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}',
+            [value for row in rows for value in row]
+        )
+
+
+def _delete_emptied(idents, using):
+    """Drop the counters among ``idents`` that reached zero; otherwise past due dates pile up"""
+    if not idents:
+        return
+    emptied = Q()
+    for user_id, dimension, key in idents:
+        emptied |= Q(user_id=user_id, dimension=dimension, key=key)
+    TaskStat.objects.using(using).filter(emptied, count=0).delete()
+
+
+def _expected(user_ids):
+    """Recompute the counters for ``user_ids`` from Task"""
+    tasks = Task.objects.filter(user_id__in=user_ids).order_by()
+    expected = Counter()
+    for field, dimension in (('status', TaskStat.STATUS),
+                             ('priority', TaskStat.PRIORITY),
+                             ('category_id', TaskStat.CATEGORY)):
+        for user_id, value, count in tasks.values_list('user_id', field).annotate(count=Count('id')):
+            expected[(user_id, dimension, str(value or ''))] = count
+    open_tasks = tasks.filter(status__in=OPEN_STATUSES)
+    for user_id, due_date, count in open_tasks.values_list('user_id', 'due_date').annotate(count=Count('id')):
+        expected[(user_id, TaskStat.DUE, due_date.isoformat())] = count
+    return expected
+
+
+def rebuild(user_ids, dry_run=False):
+    """
+    Reconcile the stored counters of ``user_ids`` with Task. Stale and zero
+    rows are dropped. Returns the number of counters that were wrong.
+    """
+    with transaction.atomic():
+        expected = _expected(user_ids)
+        stored = {
+            (user_id, dimension, key): (pk, count)
+            for pk, user_id, dimension, key, count in TaskStat.objects.select_for_update()
+            .filter(user_id__in=user_ids)
+            .values_list('id', 'user_id', 'dimension', 'key', 'count')
+        }
+        wrong = [ident for ident, count in expected.items() if stored.get(ident, (None, 0))[1] != count]
+        stale = {pk: count for ident, (pk, count) in stored.items() if ident not in expected}
+        drift = len(wrong) + sum(1 for count in stale.values() if count)
+        if dry_run:
+            return drift
+
+        TaskStat.objects.filter(id__in=stale).delete()
+        for ident in wrong:
+            if ident in stored:
+                TaskStat.objects.filter(id=stored[ident][0]).update(count=expected[ident])
+        TaskStat.objects.bulk_create([
+            TaskStat(user_id=user_id, dimension=dimension, key=key, count=expected[(user_id, dimension, key)])
+            for user_id, dimension, key in wrong if (user_id, dimension, key) not in stored
+        ])
+    return drift
+
+
+def rebuild_all(chunk_size=500, dry_run=False):
+    """Reconcile every user's counters, ``chunk_size`` users per transaction"""
+    drift = 0
+    user_ids = User.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while True:
+        chunk = list(user_ids.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return drift
+        drift += rebuild(chunk, dry_run=dry_run)
+        last_id = chunk[-1]
+
+
+def dashboard(user_id, today):
+    """Counts for the stats endpoint; cost depends on the number of counters, not tasks"""
+    counters = Counter()
+    for dimension, key, count in TaskStat.objects.filter(user_id=user_id, count__gt=0) \
+            .values_list('dimension', 'key', 'count'):
+        counters[(dimension, key)] = count
+
+    by_category = {key: count for (dimension, key), count in counters.items() if dimension == TaskStat.CATEGORY}
+    names = dict(
+        TaskCategory.objects.filter(user_id=user_id, id__in=[key for key in by_category if key])
+        .values_list('id', 'name')
+    )
+    week_end = today + timedelta(days=6)
+    due = [(key, count) for (dimension, key), count in counters.items() if dimension == TaskStat.DUE]
+
+    return {
+        'total': sum(count for (dimension, _), count in counters.items() if dimension == TaskStat.STATUS),
+        'by_status': {
+            value: counters[(TaskStat.STATUS, value)] for value, _ in Task.STATUS_CHOICES
+        },
+        'by_priority': {
+            value: counters[(TaskStat.PRIORITY, value)] for value, _ in Task.PRIORITY_CHOICES
+        },
+        'by_category': sorted(
+            (
+                {'id': int(key) if key else None, 'name': names.get(int(key)) if key else None, 'count': count}
+                for key, count in by_category.items()
+            ),
+            key=lambda row: (row['id'] is None, row['name'] or '')
+        ),
+        'overdue': sum(count for key, count in due if key < today.isoformat()),
+        'due_this_week': sum(
+            count for key, count in due if today.isoformat() <= key <= week_end.isoformat()
+        ),
+    }
+
+
+class TaskStatsMixin:
+    """Keep the counters in step with the viewset's create, update and destroy"""
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            record(after=[snapshot(serializer.instance)])
+
+    def perform_update(self, serializer):
+        before = snapshot(serializer.instance)
+        with transaction.atomic():
+            super().perform_update(serializer)
+            record(before=[before], after=[snapshot(serializer.instance)])
+
+    def perform_destroy(self, instance):
+        before = snapshot(instance)
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            record(before=[before])
+
+
+def _category_deleted(sender, instance, **kwargs):
+    # Its tasks were moved to "no category" by SET_NULL, which sends no signals.
+    # Only existing rows are touched, so a cascading user delete never races
+    # with a freshly inserted counter.
+    counters = TaskStat.objects.filter(user_id=instance.user_id, dimension=TaskStat.CATEGORY)
+    moved = counters.filter(key=str(instance.pk)).values_list('count', flat=True).first()
+    if moved is None:
+        return
+    if counters.filter(key='').update(count=F('count') + moved):
+        counters.filter(key=str(instance.pk)).delete()
+    else:
+        counters.filter(key=str(instance.pk)).update(key='')
+
+
+post_delete.connect(_category_deleted, sender=TaskCategory, dispatch_uid='task_stats_category_delete')
@@ -1,3 +1,1562 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import importlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from task_manager.sqlite import retry_on_lock
+
+from . import (agenda, benchmark, compression, jobs, profiling, push, reminders, renderers, response_cache, routers,
+               stats)
+from .authentication import token_cache
+from .management.commands import stress_sqlite
+from .pubsub import broker
+from .models import BackgroundJob, Notification, ReminderScan, Task, TaskCategory, TaskHistory, TaskStat
+from .fast_list import ValuesSerializer
+from .importer import import_tasks, iter_records
+from .recurrence import add_months, next_occurrence, occurrences, roll_over
+from .retention import prune_history
+from .serializers import TaskSerializer
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class APITestCase(TestCase):
+    """Authenticated client for ``self.user`` with empty caches"""
+
+    def setUp(self):
+        # Cached responses and counters would outlive the rolled-back rows
+        for cache in caches.all():
+            cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class QueryPlanTests(APITestCase):
+    """
+    Run EXPLAIN QUERY PLAN over the SQL the task endpoints actually issue and
+    fail when a query falls back to a full table scan or a temp B-tree sort.
+    """
+    FILTERS = [
+        {},
+        {'status': 'pending'},
+        {'priority': 'high'},
+        {'status': 'pending', 'priority': 'high'},
+        {'due_date': '2030-06-01'},
+        {'category': 'work'},
+    ]
+    ORDERINGS = [None, 'due_date', '-due_date', 'priority', '-priority', 'created_at', '-created_at']
+    # A due_date range ordered by another column is answered from the
+    # (user, due_date) range plus a LIMITed top-N sort; no index can serve both
+    TEMP_SORT_ALLOWED = {
+        ('due_date', ordering) for ordering in ['priority', '-priority', 'created_at', '-created_at']
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', 'planner@example.com', 'pass')
+        category = TaskCategory.objects.create(name='work', user=cls.user)
+        Task.objects.bulk_create([
+            Task(
+                title=f'Task {i}',
+                due_date=date(2030, 1, 1) + timedelta(days=i % 200),
+                priority=['low', 'medium', 'high'][i % 3],
+                status=['pending', 'in_progress', 'completed'][i % 3],
+                category=category if i % 2 else None,
+                user=cls.user,
+            )
+            for i in range(60)
+        ])
+
+    def assertIndexedPlan(self, queries, table, allow_temp_sort=False):
+        checked = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or f'FROM "{table}"' not in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+                checked += 1
+                for step in plan:
+                    self.assertFalse(
+                        step.startswith(f'SCAN {table}'),
+                        f'Full scan in plan {plan} for {sql}'
+                    )
+                    if not allow_temp_sort:
+                        self.assertNotIn('TEMP B-TREE', step, f'Temp sort in plan {plan} for {sql}')
+        self.assertTrue(checked, f'No query against {table} was captured')
+
+    def test_task_list_filters_and_orderings_use_indexes(self):
+        for filters, ordering in itertools.product(self.FILTERS, self.ORDERINGS):
+            params = dict(filters, page_size=5)
+            if ordering:
+                params['ordering'] = ordering
+            allow_temp_sort = any((name, ordering) in self.TEMP_SORT_ALLOWED for name in filters)
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as first:
+                    response = self.client.get('/api/tasks/', params)
+                self.assertEqual(response.status_code, 200)
+                self.assertIndexedPlan(first.captured_queries, 'tasks_task', allow_temp_sort)
+
+                # The keyset seek for the following page must stay indexed too
+                if response.data['next']:
+                    with CaptureQueriesContext(connection) as second:
+                        self.client.get(response.data['next'])
+                    self.assertIndexedPlan(second.captured_queries, 'tasks_task', allow_temp_sort)
+
+    def test_recurring_task_list_uses_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recurring-tasks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexedPlan(queries.captured_queries, 'tasks_task')
+
+    def test_task_history_uses_index(self):
+        task = Task.objects.filter(user=self.user).first()
+        TaskHistory.objects.bulk_create([
+            TaskHistory(task=task, action='updated', details=str(i)) for i in range(10)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/tasks/{task.id}/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexedPlan(queries.captured_queries, 'tasks_taskhistory')
+
+    def test_notification_list_uses_index(self):
+        task = Task.objects.filter(user=self.user).first()
+        Notification.objects.bulk_create([
+            Notification(user=self.user, task=task, message=str(i), is_read=bool(i % 2)) for i in range(10)
+        ])
+        for params in [{}, {'is_read': 'false'}]:
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get('/api/notifications/', dict(params, page_size=3))
+                self.assertEqual(response.status_code, 200)
+                self.assertIndexedPlan(queries.captured_queries, 'tasks_notification')
+
+    def test_reminder_scan_uses_indexes(self):
+        now = timezone.make_aware(datetime(2030, 1, 2))
+        # The first scan has no high-water mark yet and finds tasks to remind about
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(reminders.scan(now=now).created)
+        self.assertIndexedPlan(queries.captured_queries, 'tasks_task')
+        self.assertIndexedPlan(queries.captured_queries, 'tasks_notification')
+
+        # The next one reads the three ranges after the mark
+        with CaptureQueriesContext(connection) as queries:
+            reminders.scan(now=now + timedelta(days=1))
+        self.assertIndexedPlan(queries.captured_queries, 'tasks_task')
+
+    def test_push_reads_use_indexes(self):
+        Notification.objects.create(user=self.user, task=Task.objects.first(), message='Due soon')
+        since = push.Cursor(0, timezone.now() - timedelta(days=1), 0)
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(push.read_events)(self.user.id, since)
+            async_to_sync(push.current_cursor)(self.user.id)
+        self.assertIndexedPlan(queries.captured_queries, 'tasks_task')
+        self.assertIndexedPlan(queries.captured_queries, 'tasks_notification')
+
+    def test_agenda_uses_indexes(self):
+        Task.objects.filter(pk=Task.objects.first().pk).update(recurrence='weekly', next_due_date=date(2030, 1, 8))
+        with CaptureQueriesContext(connection) as queries:
+            entries, _ = agenda.page(self.user.id, date(2030, 1, 1), date(2030, 3, 1), limit=20)
+            agenda.page(self.user.id, date(2030, 1, 1), date(2030, 3, 1), after=entries[-1][0], limit=20)
+        self.assertTrue(any(virtual for _, _, virtual in entries))
+        self.assertIndexedPlan(queries.captured_queries, 'tasks_task')
+
+
+class BulkActionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bulk', 'bulk@example.com', 'pass')
+        other = User.objects.create_user('bystander', 'bystander@example.com', 'pass')
+        cls.first, cls.second, cls.done = Task.objects.bulk_create([
+            Task(title='First', due_date=date(2030, 1, 1), user=cls.user),
+            Task(title='Second', due_date=date(2030, 1, 2), user=cls.user),
+            Task(title='Done', due_date=date(2030, 1, 3), status='completed', user=cls.user),
+        ])
+        cls.foreign = Task.objects.create(title='Not mine', due_date=date(2030, 1, 1), user=other)
+
+    def bulk(self, **data):
+        response = self.client.post('/api/tasks/bulk/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_status_change_reports_each_id(self):
+        missing = self.foreign.id + 100
+        ids = [self.first.id, self.done.id, self.foreign.id, missing, self.second.id]
+        with CaptureQueriesContext(connection) as queries:
+            data = self.bulk(ids=ids, status='completed')
+        self.assertEqual(data['processed'], 2)
+        self.assertEqual([(row['id'], row['result']) for row in data['results']], [
+            (self.first.id, 'updated'), (self.done.id, 'unchanged'), (self.foreign.id, 'not_found'),
+            (missing, 'not_found'), (self.second.id, 'updated'),
+        ])
+
+        self.assertEqual(Task.objects.get(id=self.foreign.id).status, 'pending')
+        self.assertEqual(set(Task.objects.filter(status='completed').values_list('id', flat=True)),
+                         {self.first.id, self.second.id, self.done.id})
+        # Both history rows come from one bulk_create
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "tasks_taskhistory"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(sorted(TaskHistory.objects.values_list('task_id', 'action')),
+                         [(self.first.id, 'status_changed'), (self.second.id, 'status_changed')])
+
+    def test_delete_only_touches_owned_tasks(self):
+        data = self.bulk(ids=[self.first.id, self.foreign.id], delete=True)
+        self.assertEqual([row['result'] for row in data['results']], ['deleted', 'not_found'])
+        self.assertFalse(Task.objects.filter(id=self.first.id).exists())
+        self.assertTrue(Task.objects.filter(id=self.foreign.id).exists())
+
+    def test_history_action_fits_the_column(self):
+        self.bulk(ids=[self.first.id], status='cancelled')
+        # SQLite does not enforce max_length; PostgreSQL and MySQL would
+        action = TaskHistory.objects.get().action
+        self.assertLessEqual(len(action), TaskHistory._meta.get_field('action').max_length)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pager', 'pager@example.com', 'pass')
+        # Due dates repeat so pages split inside a run of equal values
+        Task.objects.bulk_create([
+            Task(title=f'Task {i}', due_date=date(2030, 1, 1 + i % 3), user=cls.user) for i in range(8)
+        ])
+        cls.ordered = list(Task.objects.filter(user=cls.user).order_by('due_date', 'id').values_list('id', flat=True))
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [task['id'] for task in response.data['results']]
+
+    def cursor(self, position, reverse=False):
+        data = json.dumps({'r': int(reverse), 'p': position}).encode()
+        return base64.b64encode(data).decode()
+
+    def test_pages_forward_and_back(self):
+        pages = []
+        response = self.client.get('/api/tasks/', {'page_size': 3})
+        self.assertIsNone(response.data['previous'])
+        while True:
+            pages.append(self.ids(response))
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual(list(itertools.chain(*pages)), self.ordered)
+
+        back = []
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            back.append(self.ids(response))
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_tampered_cursor_is_not_found(self):
+        for cursor in ['garbage', self.cursor(['notadate', 1]), self.cursor([{'x': 1}, 1]),
+                       self.cursor(['2030-01-01', 'x']), self.cursor(['2030-01-01', None]),
+                       self.cursor(['2030-01-01']), self.cursor([[2030], 1], reverse=True)]:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/tasks/', {'cursor': cursor}).status_code, 404)
+        response = self.client.get('/api/tasks/', {'cursor': self.cursor(['2030-01-02', 0]), 'page_size': 50})
+        self.assertEqual(self.ids(response), [pk for pk in self.ordered
+                                              if Task.objects.get(pk=pk).due_date >= date(2030, 1, 2)])
+
+
+class FullTextSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('searcher', 'searcher@example.com', 'pass')
+        other = User.objects.create_user('other', 'other@example.com', 'pass')
+        cls.review = Task.objects.create(
+            title='Review pull request', description='Check the migration', due_date=date(2030, 1, 2), user=cls.user
+        )
+        cls.migrate = Task.objects.create(
+            title='Plan release', description='Write the review checklist', due_date=date(2030, 1, 1), user=cls.user
+        )
+        Task.objects.create(title='Review budget', due_date=date(2030, 1, 1), user=other)
+
+    def search(self, **params):
+        response = self.client.get('/api/tasks/', params)
+        self.assertEqual(response.status_code, 200)
+        return [task['id'] for task in response.data['results']]
+
+    def test_prefix_match_is_scoped_to_user(self):
+        self.assertEqual(self.search(search='rev'), [self.migrate.id, self.review.id])
+
+    def test_ranked_results_prefer_title_matches(self):
+        self.assertEqual(self.search(search='review', ordering='rank'), [self.review.id, self.migrate.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        Task.objects.filter(id=self.review.id).update(title='Merge pull request')
+        self.assertEqual(self.search(search='merge'), [self.review.id])
+        self.migrate.delete()
+        self.assertEqual(self.search(search='review'), [])
+
+    def test_rank_ordering_is_ignored_without_search(self):
+        self.assertEqual(self.search(ordering='rank'), [self.migrate.id, self.review.id])
+
+
+class NotificationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        tasks = Task.objects.bulk_create([
+            Task(title=f'Task {i}', due_date=date(2030, 1, 1), user=cls.user) for i in range(5)
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=cls.user, task=task, message=f'{task.title} is due soon') for task in tasks
+        ])
+
+    def test_list_fetches_task_titles_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/notifications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['results'][0]['task_title'], 'Task 4')
+
+    def test_unread_count_tracks_mark_read(self):
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread'], 5)
+        with self.assertNumQueries(0):
+            self.client.get('/api/notifications/unread-count/')
+
+        notification = Notification.objects.filter(user=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.client.post(f'/api/notifications/{notification.id}/read/')
+                # The old count stays until the write commits; dropping it any
+                # earlier would let a read in between cache it again
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread'], 5)
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/read/')
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread'], 0)
+        self.assertEqual(len(self.client.get('/api/notifications/', {'is_read': 'false'}).data['results']), 0)
+
+
+class RecurrenceTests(TestCase):
+
+    def test_monthly_uses_calendar_months(self):
+        self.assertEqual(add_months(date(2030, 1, 31), 1), date(2030, 2, 28))
+        self.assertEqual(add_months(date(2032, 1, 31), 1), date(2032, 2, 29))
+        self.assertEqual(add_months(date(2030, 12, 15), 1), date(2031, 1, 15))
+        self.assertEqual(next_occurrence(date(2030, 3, 31), 'monthly', 3), date(2030, 6, 30))
+        self.assertIsNone(next_occurrence(date(2030, 3, 31), 'none'))
+
+    def test_roll_over_spawns_once(self):
+        user = User.objects.create_user('roller', 'roller@example.com', 'pass')
+        today = date(2030, 5, 10)
+        done = Task.objects.create(
+            title='Pay rent', due_date=date(2030, 5, 1), next_due_date=date(2030, 6, 1),
+            recurrence='monthly', status='completed', user=user
+        )
+        Task.objects.create(
+            title='Stand-up', due_date=date(2030, 5, 9), next_due_date=date(2030, 5, 10),
+            recurrence='daily', user=user
+        )
+        Task.objects.create(
+            title='Later', due_date=date(2030, 5, 12), next_due_date=date(2030, 5, 19),
+            recurrence='weekly', user=user
+        )
+
+        self.assertEqual(roll_over(today=today, chunk_size=1).spawned, 2)
+        self.assertEqual(roll_over(today=today).spawned, 0)
+
+        done.refresh_from_db()
+        self.assertIsNone(done.next_due_date)
+        rent = Task.objects.get(title='Pay rent', next_due_date__isnull=False)
+        self.assertEqual((rent.due_date, rent.next_due_date, rent.status), (date(2030, 6, 1), date(2030, 7, 1), 'pending'))
+        standup = Task.objects.get(title='Stand-up', next_due_date__isnull=False)
+        self.assertEqual((standup.due_date, standup.next_due_date), (date(2030, 5, 10), date(2030, 5, 11)))
+        self.assertEqual(TaskHistory.objects.filter(action='created').count(), 2)
+
+    def test_monthly_series_keep_their_day_of_month(self):
+        user = User.objects.create_user('month-end', 'month-end@example.com', 'pass')
+        Task.objects.create(
+            title='Close books', due_date=date(2030, 1, 31), next_due_date=date(2030, 2, 28),
+            recurrence='monthly', user=user
+        )
+        for today in (date(2030, 2, 1), date(2030, 3, 1), date(2030, 4, 1)):
+            self.assertEqual(roll_over(today=today).spawned, 1)
+        self.assertEqual(
+            list(Task.objects.filter(user=user).order_by('due_date').values_list('due_date', flat=True)),
+            [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)]
+        )
+        self.assertEqual(list(occurrences(date(2030, 2, 28), 'monthly', date(2030, 1, 1), date(2030, 5, 1), 31)),
+                         [date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)])
+
+
+class AgendaTests(APITestCase):
+    """The agenda merges task rows with lazily expanded recurring series, in date order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('calendar', 'calendar@example.com', 'pass')
+        Task.objects.create(title='Old standup', due_date=date(2029, 12, 25), recurrence='weekly', user=cls.user)
+        Task.objects.create(title='Standup', due_date=date(2030, 1, 1), recurrence='weekly',
+                            next_due_date=date(2030, 1, 8), user=cls.user)
+        Task.objects.create(title='Rent', due_date=date(2030, 1, 31), recurrence='monthly',
+                            next_due_date=date(2030, 2, 28), user=cls.user)
+        Task.objects.create(title='Dentist', due_date=date(2030, 1, 3), user=cls.user)
+        Task.objects.create(title='Later', due_date=date(2030, 6, 1), user=cls.user)
+
+    def entries(self, **params):
+        response = self.client.get('/api/agenda/', {'start': '2030-01-01', 'end': '2030-04-01', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_series_expand_between_rows(self):
+        body = self.entries(page_size=500)
+        self.assertIsNone(body['next'])
+        results = [(entry['date'], entry['task']['title'], entry['virtual']) for entry in body['results']]
+        self.assertEqual(results[:4], [
+            ('2030-01-01', 'Standup', False),
+            ('2030-01-03', 'Dentist', False),
+            ('2030-01-08', 'Standup', True),
+            ('2030-01-15', 'Standup', True),
+        ])
+        # Months are stepped like roll_over steps them, back to the series' own day
+        self.assertEqual([day for day, title, _ in results if title == 'Rent'],
+                         ['2030-01-31', '2030-02-28', '2030-03-31'])
+        self.assertEqual(len([title for _, title, _ in results if title == 'Standup']), 13)
+        self.assertEqual([day for day, _, _ in results], sorted(day for day, _, _ in results))
+        self.assertNotIn('Later', {title for _, title, _ in results})
+        self.assertEqual(Task.objects.count(), 5)
+
+    def test_cursor_pages_cover_the_range(self):
+        everything = self.entries(page_size=500)['results']
+        pages, body = [], self.entries(page_size=4)
+        with CaptureQueriesContext(connection) as queries:
+            while True:
+                pages += body['results']
+                self.assertLessEqual(len(body['results']), 4)
+                if not body['next']:
+                    break
+                body = self.client.get(body['next']).json()
+        self.assertEqual(pages, everything)
+        # Rows, series heads and the heads' details: the same few queries on every page
+        self.assertLessEqual(len(queries.captured_queries), 3 * (len(everything) // 4))
+
+    def test_past_occurrences_are_not_invented(self):
+        with mock.patch('tasks.agenda.timezone.localdate', return_value=date(2030, 3, 1)):
+            results = self.entries(page_size=500)['results']
+        virtual = [entry['date'] for entry in results if entry['virtual']]
+        self.assertTrue(virtual)
+        self.assertTrue(all(day >= '2030-03-01' for day in virtual))
+        self.assertIn(('2030-01-01', False), [(entry['date'], entry['virtual']) for entry in results])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get('/api/agenda/', {'start': '2030-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/agenda/', {'start': '2030-02-01', 'end': '2030-01-01'}).status_code,
+                         400)
+        self.assertEqual(self.client.get('/api/agenda/', {'start': '2030-01-01', 'end': '2030-02-01',
+                                                          'cursor': 'nope'}).status_code, 404)
+
+    def test_range_is_bounded(self):
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2030, 1, 1)):
+            self.assertEqual(self.client.get('/api/agenda/', {'start': '2030-01-01', 'end': '2031-01-02'}).status_code,
+                             200)
+            self.assertEqual(self.client.get('/api/agenda/', {'start': '2030-01-01', 'end': '2031-01-03'}).status_code,
+                             400)
+            self.assertEqual(self.client.get('/api/agenda/', {'start': '2040-01-01', 'end': '2040-02-01'}).status_code,
+                             200)
+            response = self.client.get('/api/agenda/', {'start': '9999-12-01', 'end': '9999-12-31'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('start', response.data)
+
+    def test_series_end_at_the_last_date(self):
+        self.assertEqual(list(occurrences(date(9999, 12, 17), 'weekly', date(9999, 12, 1), date.max)),
+                         [date(9999, 12, 17), date(9999, 12, 24)])
+        # Dec 31 is date.max itself, outside [since, until)
+        self.assertEqual(list(occurrences(date(9999, 10, 31), 'monthly', date(9999, 12, 1), date.max)), [])
+        self.assertEqual(list(occurrences(date(9999, 11, 30), 'monthly', date(9999, 12, 1), date.max)),
+                         [date(9999, 12, 30)])
+        self.assertEqual(list(occurrences(date(2030, 1, 1), 'weekly', date(9999, 12, 31), date.max)), [])
+        self.assertEqual(list(occurrences(date(9999, 12, 30), 'daily', date(9999, 12, 1), date.max)),
+                         [date(9999, 12, 30)])
+
+
+@override_settings(TASK_JOBS_EAGER=False)
+class BackgroundJobTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('queuer', 'queuer@example.com', 'pass')
+
+    def test_create_defers_side_effects_to_the_queue(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/tasks/', {
+                'title': 'Ship it', 'due_date': date.today().isoformat(), 'recurrence': 'weekly'
+            })
+        self.assertEqual(response.status_code, 201)
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)  # the task, its stats counters and its job row, one transaction
+        self.assertFalse(TaskHistory.objects.exists())
+
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertFalse(BackgroundJob.objects.exists())
+        self.assertEqual(TaskHistory.objects.get().action, 'created')
+        self.assertEqual(Notification.objects.get().user, self.user)
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        calls = []
+
+        @jobs.handler('flaky')
+        def flaky(payloads):
+            calls.append(payloads)
+            if any(payload.get('bad') for payload in payloads):
+                raise RuntimeError('boom')
+        self.addCleanup(jobs._handlers.pop, 'flaky')
+
+        jobs.enqueue('flaky', {'bad': False})
+        jobs.enqueue('flaky', {'bad': True})
+        with self.assertLogs('tasks.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 2)
+
+        # The batch failed as a whole, then the good payload succeeded on its own
+        self.assertEqual(calls, [[{'bad': False}, {'bad': True}], [{'bad': False}], [{'bad': True}]])
+        job = BackgroundJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.PENDING, 1))
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(jobs.run_pending(), 0)  # not due again until the backoff passes
+
+    def test_queue_health_and_failed_job_retention(self):
+        now = timezone.now()
+        self.assertEqual(jobs.queue_health(now)['oldest_due_seconds'], 0)
+        BackgroundJob.objects.bulk_create([
+            BackgroundJob(kind='task_created', run_after=now - timedelta(minutes=10)),
+            BackgroundJob(kind='task_created', run_after=now + timedelta(minutes=1)),
+            BackgroundJob(kind='task_created', status=BackgroundJob.FAILED, run_after=now - timedelta(days=31)),
+            BackgroundJob(kind='task_created', status=BackgroundJob.FAILED, run_after=now - timedelta(days=1)),
+        ])
+        # Nobody has claimed the first job for ten minutes: no worker is running
+        self.assertEqual(jobs.queue_health(now), {
+            BackgroundJob.PENDING: 2, BackgroundJob.RUNNING: 0, BackgroundJob.FAILED: 2, 'oldest_due_seconds': 600,
+        })
+
+        self.assertEqual(jobs.purge_failed(now), 1)
+        self.assertEqual(BackgroundJob.objects.filter(status=BackgroundJob.FAILED).count(), 1)
+        with override_settings(TASK_JOBS_FAILED_RETENTION_DAYS=None):
+            self.assertEqual(jobs.purge_failed(now + timedelta(days=365)), 0)
+
+
+class ReminderTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reminded', 'reminded@example.com', 'pass')
+
+    def make_task(self, title, days, status='pending'):
+        return Task.objects.create(title=title, due_date=timezone.localdate() + timedelta(days=days),
+                                   status=status, user=self.user)
+
+    def reminders_sent(self):
+        return sorted(Notification.objects.values_list('task__title', 'kind'))
+
+    def test_scan_notifies_each_task_once_per_kind(self):
+        self.make_task('Tomorrow', 1)
+        self.make_task('Yesterday', -1)
+        self.make_task('Next month', 30)
+        self.make_task('Long overdue', -30)
+        self.make_task('Done', 0, status='completed')
+
+        now = timezone.now()
+        self.assertEqual(reminders.scan(now=now), (2, 2))
+        self.assertEqual(self.reminders_sent(), [('Tomorrow', 'due_soon'), ('Yesterday', 'overdue')])
+        # Edits just before the mark are looked at again (EDIT_OVERLAP), but never resent
+        self.assertEqual(reminders.scan(now=now).created, 0)
+        later = now + reminders.EDIT_OVERLAP * 2
+        reminders.scan(now=later)
+        self.assertEqual(reminders.scan(now=later), (0, 0))
+
+        # Two days on, "Tomorrow" is overdue and an edited task entered the window
+        Task.objects.filter(title='Next month').update(
+            due_date=timezone.localdate() + timedelta(days=3), updated_at=timezone.now()
+        )
+        result = reminders.scan(now=now + timedelta(days=2))
+        self.assertEqual(result.created, 2)
+        self.assertEqual(self.reminders_sent(), [
+            ('Next month', 'due_soon'), ('Tomorrow', 'due_soon'), ('Tomorrow', 'overdue'), ('Yesterday', 'overdue'),
+        ])
+        self.assertEqual(ReminderScan.objects.get().today, timezone.localdate(now + timedelta(days=2)))
+
+    def test_reminders_sent_at_creation_are_not_repeated(self):
+        response = self.client.post('/api/tasks/', {'title': 'Soon', 'due_date': timezone.localdate().isoformat()})
+        self.assertEqual(response.status_code, 201)
+        jobs.run_pending()
+        self.assertEqual(self.reminders_sent(), [('Soon', 'due_soon')])
+        self.assertEqual(reminders.scan().created, 0)
+
+    def test_command_dry_run_writes_nothing(self):
+        self.make_task('Tomorrow', 1)
+        out = io.StringIO()
+        call_command('scan_due_tasks', '--dry-run', '--due-soon-days', '1', stdout=out)
+        self.assertIn('Would send 1 reminder(s) for 1 candidate task(s).', out.getvalue())
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(ReminderScan.objects.exists())
+
+
+class ResponseCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cached', 'cached@example.com', 'pass')
+        cls.task = Task.objects.create(title='Cached', due_date=date(2030, 1, 1), user=cls.user)
+
+    def test_repeat_fetch_skips_the_database(self):
+        self.client.get('/api/tasks/', {'status': 'pending', 'page_size': 10})
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tasks/', {'page_size': 10, 'status': 'pending'})
+        self.assertEqual(response.data['results'][0]['title'], 'Cached')
+
+    def test_writes_invalidate_the_users_entries(self):
+        self.client.get('/api/tasks/')
+        self.client.get(f'/api/tasks/{self.task.id}/')
+
+        # Generations move on commit, which TestCase only simulates
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/tasks/{self.task.id}/', {'title': 'Renamed'})
+        self.assertEqual(self.client.get(f'/api/tasks/{self.task.id}/').data['title'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/tasks/{self.task.id}/toggle_complete/')
+        self.assertEqual(self.client.get('/api/tasks/').data['results'][0]['status'], 'completed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/tasks/bulk/', {'ids': [self.task.id], 'status': 'cancelled'}, format='json')
+        self.assertEqual(self.client.get('/api/tasks/').data['results'][0]['status'], 'cancelled')
+
+    def test_read_inside_an_open_transaction_is_not_served_after_commit(self):
+        generation = response_cache.get_generation(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.task.title = 'Renamed'
+                self.task.save()
+                # A concurrent reader still sees the old rows here, under the old generation
+                self.assertEqual(response_cache.get_generation(self.user.id), generation)
+                self.client.get('/api/tasks/')
+        self.assertNotEqual(response_cache.get_generation(self.user.id), generation)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tasks/')
+        self.assertTrue(queries.captured_queries)
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed')
+
+    def test_entries_are_not_shared_between_users(self):
+        self.client.get('/api/tasks/')
+        other = User.objects.create_user('other', 'other@example.com', 'pass')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/tasks/').data['results'], [])
+
+
+class ConditionalRequestTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('etag', 'etag@example.com', 'pass')
+        cls.task = Task.objects.create(title='Tagged', due_date=date(2030, 1, 1), user=cls.user)
+
+    def test_list_revalidates_with_etag(self):
+        etag = self.client.get('/api/tasks/')['ETag']
+        response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(title='Another', due_date=date(2030, 1, 2), user=self.user)
+        response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_etag_depends_on_query(self):
+        etag = self.client.get('/api/tasks/')['ETag']
+        self.assertEqual(self.client.get('/api/tasks/', {'status': 'pending'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_supports_if_modified_since(self):
+        response = self.client.get(f'/api/tasks/{self.task.id}/')
+        response = self.client.get(f'/api/tasks/{self.task.id}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_match_guards_updates(self):
+        etag = self.client.get(f'/api/tasks/{self.task.id}/')['ETag']
+        response = self.client.patch(f'/api/tasks/{self.task.id}/', {'title': 'First'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # A second writer still holding the old tag loses
+        response = self.client.patch(f'/api/tasks/{self.task.id}/', {'title': 'Second'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.title, 'First')
+
+
+class ExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('exporter', 'exporter@example.com', 'pass')
+        cls.tasks = Task.objects.bulk_create([
+            Task(title=f'Task, {i}', due_date=date(2030, 1, 1 + i), priority=['low', 'high'][i % 2], user=cls.user)
+            for i in range(5)
+        ])
+        TaskHistory.objects.bulk_create([
+            TaskHistory(task=task, action='created', details='Created.') for task in cls.tasks
+        ])
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_honours_task_filters(self):
+        response = self.client.get('/api/tasks/export/csv/', {'priority': 'high'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        self.assertEqual([row['title'] for row in rows], ['Task, 1', 'Task, 3'])
+        self.assertEqual(rows[0]['due_date'], '2030-01-02')
+
+    def test_ndjson_export_matches_serializer_fields(self):
+        response = self.client.get('/api/tasks/export/ndjson/')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        listed = self.client.get('/api/tasks/').data['results']
+        self.assertEqual(rows, json.loads(json.dumps(listed)))
+
+    def test_gzip_history_export(self):
+        response = self.client.get('/api/history/export/ndjson/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['task'], self.tasks[0].id)
+
+
+class ImportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('importer', 'importer@example.com', 'pass')
+        cls.category = TaskCategory.objects.create(name='Work', user=cls.user)
+
+    def upload(self, import_format, content):
+        upload = io.BytesIO(content.encode())
+        upload.name = f'tasks.{import_format}'
+        return self.client.post(f'/api/tasks/import/{import_format}/', {'file': upload}, format='multipart')
+
+    def test_csv_import_reports_invalid_rows(self):
+        response = self.upload('csv', (
+            'title,due_date,priority,category,recurrence\n'
+            'Write report,2030-01-01,high,Work,\n'
+            'Bad priority,2030-01-01,urgent,,\n'
+            'Water plants,2030-01-02,,,weekly\n'
+            'Unknown category,2030-01-03,low,Home,\n'
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([(e['line'], list(e['errors'])) for e in response.data['errors']],
+                         [(3, ['priority']), (5, ['category'])])
+
+        report, plants = Task.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(report.category, self.category)
+        self.assertEqual(plants.priority, 'medium')
+        self.assertEqual(plants.next_due_date, date(2030, 1, 9))
+        self.assertEqual(TaskHistory.objects.filter(task__user=self.user, action='imported').count(), 2)
+
+    def test_ndjson_import_writes_history_in_one_query_per_batch(self):
+        lines = [json.dumps({'title': f'Task {i}', 'due_date': '2030-01-01'}) for i in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            result = import_tasks(self.user, iter_records(io.BytesIO('\n'.join(lines + ['not json']).encode()), 'ndjson'),
+                                  batch_size=2)
+        self.assertEqual((result.created, result.failed), (5, 1))
+        self.assertEqual(result.errors[0]['line'], 6)
+        self.assertEqual(TaskHistory.objects.filter(task__user=self.user, action='imported').count(), 5)
+        # One category lookup, then per batch: savepoint, tasks, counters, history rows, release
+        self.assertLessEqual(len(queries), 1 + 3 * 5)
+
+    def test_import_history_survives_deleting_a_task(self):
+        lines = [json.dumps({'title': f'Task {i}', 'due_date': '2030-01-01'}) for i in range(3)]
+        import_tasks(self.user, iter_records(io.BytesIO('\n'.join(lines).encode()), 'ndjson'))
+        first, *rest = Task.objects.filter(user=self.user).order_by('id')
+        first.delete()
+        self.assertEqual(
+            list(TaskHistory.objects.filter(action='imported').order_by('task_id').values_list('task_id', 'details')),
+            [(rest[0].id, 'Imported from line 2 of an upload.'), (rest[1].id, 'Imported from line 3 of an upload.')]
+        )
+
+    def test_unreadable_upload_reports_rows_already_imported(self):
+        lines = [json.dumps({'title': f'Task {i}', 'due_date': '2030-01-01'}) for i in range(300)]
+        upload = io.BytesIO('\n'.join(lines).encode() + b'\n\xff\xfe\n')
+        upload.name = 'tasks.ndjson'
+        response = self.client.post('/api/tasks/import/ndjson/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Could not read the upload', response.data['detail'])
+        self.assertGreater(response.data['created'], 0)
+        self.assertEqual(response.data['created'], Task.objects.filter(user=self.user).count())
+
+    def test_export_round_trip(self):
+        Task.objects.create(title='Exported', due_date=date(2030, 2, 1), user=self.user, category=self.category)
+        exported = b''.join(self.client.get('/api/tasks/export/csv/').streaming_content).decode()
+        response = self.upload('csv', exported)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 0))
+        self.assertEqual(Task.objects.filter(title='Exported', category=self.category).count(), 2)
+
+    def test_past_due_dates_round_trip(self):
+        Task.objects.create(title='Overdue', due_date=date(2020, 2, 1), user=self.user)
+        exported = b''.join(self.client.get('/api/tasks/export/ndjson/').streaming_content).decode()
+        response = self.upload('ndjson', exported)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 0))
+        self.assertEqual(Task.objects.filter(title='Overdue', due_date=date(2020, 2, 1)).count(), 2)
+
+
+class TaskStatsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('counter', 'counter@example.com', 'pass')
+        cls.category = TaskCategory.objects.create(name='Work', user=cls.user)
+
+    def dashboard(self):
+        response = self.client.get('/api/tasks/stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assertMatchesRebuild(self):
+        self.assertEqual(stats.rebuild([self.user.id], dry_run=True), 0)
+
+    def test_write_paths_keep_counters_exact(self):
+        today = date.today()
+        for offset, priority in ((1, 'high'), (3, 'low'), (10, 'high')):
+            response = self.client.post('/api/tasks/', {
+                'title': f'Task {offset}', 'due_date': (today + timedelta(days=offset)).isoformat(),
+                'priority': priority, 'category': self.category.id,
+            })
+            self.assertEqual(response.status_code, 201)
+        first, second, third = Task.objects.filter(user=self.user).order_by('due_date')
+        # An overdue task can only come from outside the API, which is what rebuild is for
+        Task.objects.create(title='Late', due_date=today - timedelta(days=1), user=self.user)
+        self.assertEqual(stats.rebuild([self.user.id]), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/tasks/{third.id}/', {'priority': 'medium', 'category': ''})
+            self.client.post(f'/api/tasks/{first.id}/toggle_complete/')
+            self.client.post('/api/tasks/bulk/', {'ids': [second.id], 'status': 'in_progress'}, format='json')
+        self.assertMatchesRebuild()
+
+        data = self.dashboard()
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['by_status'], {'pending': 2, 'in_progress': 1, 'completed': 1, 'cancelled': 0})
+        self.assertEqual(data['by_priority'], {'low': 1, 'medium': 2, 'high': 1})
+        self.assertEqual(data['by_category'], [
+            {'id': self.category.id, 'name': 'Work', 'count': 2},
+            {'id': None, 'name': None, 'count': 2},
+        ])
+        self.assertEqual((data['overdue'], data['due_this_week']), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/tasks/bulk/', {'ids': [first.id, second.id], 'delete': True}, format='json')
+            self.client.delete(f'/api/categories/{self.category.id}/')
+        self.assertMatchesRebuild()
+        self.assertEqual(self.dashboard()['by_category'], [{'id': None, 'name': None, 'count': 2}])
+
+    def test_dashboard_reads_counters_not_tasks(self):
+        Task.objects.bulk_create([
+            Task(title=str(i), due_date=date(2030, 1, 1), user=self.user) for i in range(50)
+        ])
+        stats.rebuild([self.user.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.dashboard()['total'], 50)
+        self.assertFalse(any('"tasks_task"' in query['sql'] for query in queries))
+
+    def test_counters_at_zero_are_deleted(self):
+        due = (date.today() + timedelta(days=2)).isoformat()
+        task_id = self.client.post('/api/tasks/', {'title': 'Once', 'due_date': due}).data['id']
+        self.assertTrue(TaskStat.objects.filter(user=self.user, dimension=TaskStat.DUE, key=due).exists())
+        self.client.post(f'/api/tasks/{task_id}/toggle_complete/')
+        self.assertFalse(TaskStat.objects.filter(user=self.user, dimension=TaskStat.DUE).exists())
+        self.client.delete(f'/api/tasks/{task_id}/')
+        self.assertFalse(TaskStat.objects.filter(user=self.user).exists())
+        self.assertMatchesRebuild()
+
+    def test_migration_backfill_uses_the_migrating_database(self):
+        Task.objects.bulk_create([
+            Task(title=str(i), due_date=date(2030, 1, 1 + i % 3), priority=('low', 'high')[i % 2],
+                 status=('pending', 'completed')[i % 2], category=self.category if i % 3 else None, user=self.user)
+            for i in range(9)
+        ])
+        migration = importlib.import_module('tasks.migrations.0012_task_stats')
+        migration.backfill(django_apps, mock.Mock(connection=connection))
+        self.assertMatchesRebuild()
+
+
+class HistoryRetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('historian', 'historian@example.com', 'pass')
+        cls.task = Task.objects.create(title='Long lived', due_date=date(2030, 1, 1), user=cls.user)
+
+    def setUp(self):
+        now = timezone.now()
+        rows = TaskHistory.objects.bulk_create([
+            TaskHistory(task=self.task, action='updated' if i % 3 else 'created', details=str(i))
+            for i in range(10)
+        ])
+        # Entry i is i days old
+        for i, row in enumerate(rows):
+            row.change_time = now - timedelta(days=i)
+        TaskHistory.objects.bulk_update(rows, ['change_time'])
+        self.now = now
+
+    def test_prune_by_age_and_count(self):
+        result = prune_history(now=self.now, max_age_days=7, max_entries=5, chunk_size=1)
+        self.assertEqual((result.tasks, result.deleted), (1, 5))
+        self.assertEqual(sorted(TaskHistory.objects.values_list('details', flat=True)), ['0', '1', '2', '3', '4'])
+
+    def test_compaction_folds_expired_entries_into_one_summary(self):
+        prune_history(now=self.now, max_age_days=0, max_entries=6, compact=True)
+        prune_history(now=self.now, max_age_days=0, max_entries=4, compact=True)
+
+        self.assertEqual(TaskHistory.objects.count(), 5)
+        summary = TaskHistory.objects.get(action='compacted')
+        payload = json.loads(summary.details)
+        self.assertEqual(payload['entries'], 6)
+        self.assertEqual(payload['actions'], {'created': 2, 'updated': 4})
+        self.assertEqual(summary.change_time, self.now - timedelta(days=4))
+        self.assertEqual(payload['from'], (self.now - timedelta(days=9)).isoformat())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TokenCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tokened', 'tokened@example.com', 'pass')
+
+    def setUp(self):
+        token_cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self):
+        return self.client.get('/api/notifications/unread-count/').status_code
+
+    def test_repeat_requests_skip_the_token_lookup(self):
+        self.assertEqual(self.get(), 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(), 200)
+        self.assertFalse(any('authtoken_token' in query['sql'] for query in queries))
+        self.assertEqual(token_cache.stats(), {'entries': 1, 'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_logout_invalidates_the_token(self):
+        self.get()
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.get(), 401)
+
+    def test_user_changes_invalidate_the_token(self):
+        for change in ('set_password', 'deactivate'):
+            with self.subTest(change=change):
+                self.assertEqual(self.get(), 200)
+                user = User.objects.get(pk=self.user.pk)
+                if change == 'set_password':
+                    user.set_password('new-pass')
+                else:
+                    user.is_active = False
+                user.save()
+                self.assertEqual(token_cache.stats()['entries'], 0)
+        self.assertEqual(self.get(), 401)
+
+    @override_settings(TASK_TOKEN_CACHE={'TTL': 60, 'MAX_ENTRIES': 1})
+    def test_cache_is_bounded(self):
+        other = Token.objects.create(user=User.objects.create_user('other', 'other@example.com', 'pass'))
+        self.get()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other.key}')
+        self.get()
+        self.assertEqual(token_cache.stats()['entries'], 1)
+        self.assertEqual(token_cache.stats()['evictions'], 1)
+
+
+class ValuesSerializerTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lister', 'lister@example.com', 'pass')
+        category = TaskCategory.objects.create(name='Home', user=cls.user)
+        Task.objects.create(title='Plain', due_date=date(2030, 1, 1), user=cls.user)
+        Task.objects.create(
+            title='Everything “set”', description='Notes', due_date=date(2030, 1, 2), priority='high',
+            status='completed', completed_at=timezone.now(), category=category, user=cls.user,
+            recurrence='monthly', next_due_date=date(2030, 2, 2),
+        )
+
+    def test_output_is_byte_identical_to_task_serializer(self):
+        queryset = Task.objects.filter(user=self.user).order_by('id')
+        fast = ValuesSerializer(TaskSerializer)
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(fast.many(queryset.values(*fast.columns))),
+            renderer.render(TaskSerializer(queryset, many=True).data)
+        )
+
+    def test_list_endpoints_use_values_rows(self):
+        for url in ('/api/tasks/', '/api/recurring-tasks/'):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'page_size': 1})
+                expected = TaskSerializer(Task.objects.filter(id=response.data['results'][0]['id']), many=True).data
+                self.assertEqual(response.data['results'], json.loads(JSONRenderer().render(expected)))
+                # The keyset cursor is still read from the values() rows
+                self.assertEqual(self.client.get(response.data['next'] or url).status_code, 200)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_seed_and_summary(self):
+        users = benchmark.seed(users=2, categories=2, tasks=10, history=2, notifications=3)
+        self.assertEqual(Task.objects.filter(user__in=users).count(), 20)
+        self.assertEqual(TaskHistory.objects.count(), 40)
+        self.assertEqual(stats.rebuild([user.id for user in users], dry_run=True), 0)
+
+        samples = {'tasks.list': [benchmark.Sample(seconds / 1000, 2, 200) for seconds in range(1, 101)]}
+        row = benchmark.summarize(samples)['tasks.list']
+        self.assertEqual((row['p50_ms'], row['p95_ms'], row['p99_ms']), (50, 95, 99))
+        self.assertEqual(row['statuses'], {'200': 100})
+
+
+class RendererTests(APITestCase):
+    """orjson output matches DRF's byte for byte; large responses are compressed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('encoder', 'encoder@example.com', 'pass')
+        cls.token = Token.objects.create(user=cls.user)
+        Task.objects.bulk_create([
+            Task(title=f'Tâche {i} \u2028', description='Long enough to compress ' * 4,
+                 due_date=date(2030, 1, 1) + timedelta(days=i), user=cls.user)
+            for i in range(20)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_fast_json_matches_drf(self):
+        data = self.client.get('/api/tasks/').data
+        data['extra'] = {1: timezone.make_aware(datetime(2030, 1, 1, 12, 30, 15, 123456)), 'lazy': _('Invalid token.')}
+        self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(renderers.FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_fast_json_parser(self):
+        response = self.client.post('/api/tasks/', '{"title": "Parsed", "due_date": "2030-01-01"}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/tasks/', '{"title": NaN}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
+
+    @skipIf(renderers.msgpack is None, 'msgpack is not installed')
+    def test_message_pack_is_negotiated(self):
+        response = self.client.get('/api/tasks/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(renderers.msgpack.unpackb(response.content), self.client.get('/api/tasks/').json())
+
+    def test_large_responses_are_compressed(self):
+        plain = self.client.get('/api/tasks/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        response = self.client.get('/api/tasks/', HTTP_ACCEPT_ENCODING='br;q=0.5, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+        self.assertLess(int(response['Content-Length']), len(plain.content))
+
+        # Each coding has its own strong tag, and revalidates with it
+        self.assertEqual(response['ETag'], plain['ETag'][:-1] + '-gzip"')
+        not_modified = self.client.get('/api/tasks/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304)
+
+        # Small bodies and refused codings go out as they are
+        small = self.client.get('/api/notifications/unread-count/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+        refused = self.client.get('/api/tasks/', HTTP_ACCEPT_ENCODING='gzip;q=0, *')
+        self.assertNotEqual(refused.get('Content-Encoding'), 'gzip')
+        html = self.client.get('/api/tasks/', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(html.has_header('Content-Encoding'))
+
+    def test_if_match_accepts_the_coded_tag(self):
+        task = Task.objects.filter(user=self.user).first()
+        detail = self.client.get(f'/api/tasks/{task.id}/')
+        coded = compression.coded_etag(detail['ETag'], 'gzip')
+        response = self.client.patch(f'/api/tasks/{task.id}/', {'title': 'Renamed'}, format='json', HTTP_IF_MATCH=coded)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(f'/api/tasks/{task.id}/', {'title': 'Again'}, format='json', HTTP_IF_MATCH=coded)
+        self.assertEqual(response.status_code, 412)
+
+    def test_choose_encoding(self):
+        self.assertEqual(compression.choose_encoding('gzip, deflate'), 'gzip')
+        self.assertIsNone(compression.choose_encoding('identity'))
+        self.assertIsNone(compression.choose_encoding('*;q=0'))
+        expected = 'br' if compression.brotli is not None else 'gzip'
+        self.assertEqual(compression.choose_encoding('gzip, br'), expected)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_renderers', rows=30, repeat=1, stdout=out, stderr=io.StringIO())
+        self.assertIn('JSONRenderer', out.getvalue())
+        self.assertFalse(Task.objects.filter(user__username='benchmark-renderers').exists())
+
+
+class ServerComparisonTests(TransactionTestCase):
+    """The concurrent load test needs committed rows, its threads use their own connections"""
+
+    def test_wsgi_and_asgi_serve_every_scenario(self):
+        users = benchmark.seed(users=1, categories=1, tasks=5, history=1, notifications=2)
+        for server, native_async in (('wsgi', False), ('asgi', False), ('asgi', True)):
+            with self.subTest(server=server, native_async=native_async):
+                targets = benchmark.read_targets(users, native_async)
+                samples, seconds, threads = benchmark.load_test(server, targets, concurrency=2, requests=10)
+                self.assertEqual([sample.status for sample in samples], [200] * 10)
+                self.assertGreater(threads, 1)
+
+
+@override_settings(TASK_PROFILING={'ENABLED': True, 'SERVER_TIMING': True, 'SLOW_REQUEST_MS': 0,
+                                   'METRICS_TOKEN': 'scrape'})
+class ProfilingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('profiled', 'profiled@example.com', 'pass')
+
+    def setUp(self):
+        super().setUp()
+        profiling.registry.clear()
+
+    def test_requests_are_recorded_per_url_name(self):
+        with self.assertLogs('tasks.profiling', 'WARNING') as logs:
+            response = self.client.get('/api/tasks/')
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+        self.assertIn('SELECT', logs.output[0])
+
+        metrics = self.metrics()
+        self.assertIn('tasks_http_requests_total{route="tasks:task-list",method="GET",status="200"} 1', metrics)
+        self.assertIn('tasks_http_db_queries_count{route="tasks:task-list",method="GET"} 1', metrics)
+        self.assertIn('tasks_http_request_duration_seconds_bucket{route="tasks:task-list",method="GET",le="+Inf"} 1',
+                      metrics)
+        self.assertIn('tasks_jobs{status="pending"} 0', metrics)
+        self.assertIn('tasks_jobs_oldest_due_seconds 0', metrics)
+
+    def metrics(self, **headers):
+        # SLOW_REQUEST_MS=0 logs every request as slow; capturing the warnings
+        # keeps them out of slow_requests.log
+        with self.assertLogs('tasks.profiling', 'WARNING'):
+            return self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape', **headers).content.decode()
+
+    def test_streaming_responses_are_counted_not_timed(self):
+        response = self.client.get('/api/history/export/ndjson/')
+        b''.join(response.streaming_content)
+        metrics = self.metrics()
+        self.assertIn('tasks_http_requests_total{route="tasks:task-history-export",method="GET",status="200"} 1',
+                      metrics)
+        self.assertNotIn('route="tasks:task-history-export",method="GET",le=', metrics)
+
+    def test_metrics_require_staff_or_token(self):
+        with self.assertLogs('tasks.profiling', 'WARNING'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrapé').status_code, 403)
+
+
+class SQLiteModeTests(TestCase):
+
+    def test_retry_on_lock_retries_outside_transactions_only(self):
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(retry_on_lock(flaky, delay=0)(), 'done')
+        self.assertEqual(len(calls), 3)
+
+        # Inside a transaction (as in every TestCase) the error cannot be retried
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            retry_on_lock(flaky, delay=0)()
+        self.assertEqual(len(calls), 1)
+
+    def test_tuned_mode_removes_lock_errors(self):
+        # The command's scratch databases are its own connections, not the test database
+        self.enterContext(mock.patch.object(type(self), 'databases', {'default', *stress_sqlite.ALIASES.values()}))
+        out = io.StringIO()
+        call_command('stress_sqlite', '--workers', '6', '--seconds', '0.5', '--json', stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual(results['tuned']['lock_errors'], 0)
+        self.assertGreater(results['tuned']['committed'], 0)
+        self.assertGreater(results['stock']['committed'], 0)
+        self.assertNotIn('stress_tuned', connections)
+
+
+class ReplicaRoutingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('replicated', 'replicated@example.com', 'pass')
+
+    def test_router_sends_reads_to_replica_only_when_asked(self):
+        router = routers.ReplicaRouter()
+        with mock.patch.object(routers, 'replica_alias', return_value='replica'):
+            with routers.replica_reads(self.user.id):
+                self.assertEqual(router.db_for_read(Task), 'replica')
+                self.assertEqual(router.db_for_write(Task), 'default')
+                # Related objects are fetched from wherever their instance came from
+                self.assertEqual(router.db_for_read(Task, instance=self.user), 'default')
+            self.assertEqual(router.db_for_read(Task), 'default')
+            # A user pinned after a write keeps reading the primary
+            routers.pin_to_primary(self.user.id)
+            with routers.replica_reads(self.user.id):
+                self.assertEqual(router.db_for_read(Task), 'default')
+
+    def test_writes_pin_user_to_primary(self):
+        self.add_replica()
+        self.assertEqual(self.client.get('/api/tasks/', secure=True).data['results'], [])
+        self.assertIsNone(routers._read_alias.get())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/tasks/', {'title': 'Fresh', 'due_date': '2030-01-01'},
+                                        format='json', secure=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(routers.is_pinned(self.user.id))
+
+        # The replica has not seen the new task, the primary has
+        response = self.client.get('/api/tasks/', secure=True)
+        self.assertEqual(response.data['results'][0]['title'], 'Fresh')
+        self.assertFalse(Task.objects.using('replica').exists())
+
+    def add_replica(self):
+        """A second SQLite file, migrated, registered as the replica for this test"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings.DATABASES['replica'] = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict, 'NAME': os.path.join(directory.name, 'replica.sqlite3'),
+        }
+
+        def remove():
+            connections['replica'].close()
+            del connections['replica']
+            del settings.DATABASES['replica']
+
+        self.addCleanup(remove)
+        # The alias did not exist when the class was set up, so allow it here
+        self.enterContext(mock.patch.object(type(self), 'databases', {DEFAULT_DB_ALIAS, 'replica'}))
+        call_command('migrate', database='replica', verbosity=0)
+        self.assertEqual(routers.replica_alias(), 'replica')
+        User.objects.using('replica').create(id=self.user.id, username=self.user.username)
+
+    def test_lagging_replica_reads_are_not_cached(self):
+        self.add_replica()
+        task = Task.objects.create(title='Renamed', due_date=date(2030, 1, 1), user=self.user)
+        # The replica has not caught up with the rename yet
+        Task.objects.using('replica').create(id=task.id, title='Original', due_date=task.due_date, user_id=self.user.id)
+        Task.objects.using('replica').filter(id=task.id).update(updated_at=task.updated_at - timedelta(minutes=1))
+
+        response = self.client.get('/api/tasks/', secure=True)
+        self.assertEqual(response.data['results'][0]['title'], 'Original')
+        etag = response['ETag']
+
+        Task.objects.using('replica').filter(id=task.id).update(title='Renamed', updated_at=task.updated_at)
+        response = self.client.get('/api/tasks/', secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed')
+
+        # Reads from the primary, here while pinned after a write, still fill the cache
+        routers.pin_to_primary(self.user.id)
+        self.client.get('/api/tasks/', secure=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/tasks/', secure=True).data['results'][0]['title'], 'Renamed')
+
+
+class SparseFieldsetTests(APITestCase):
+    """?fields= and ?exclude= trim both the response and the columns read"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('widget', 'widget@example.com', 'pass')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.task = Task.objects.create(title='Write report', description='x' * 5000,
+                                       due_date=date(2030, 1, 1), user=cls.user)
+        Task.objects.create(title='Review report', due_date=date(2030, 1, 2), user=cls.user)
+        Task.objects.create(title='Plan', due_date=date(2030, 1, 2), user=cls.user, recurrence='weekly')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def assertNotSelected(self, queries, column):
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT "tasks_task"."id"')]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertNotIn(f'"tasks_task"."{column}"', sql)
+
+    def test_list_returns_only_requested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tasks/', {'fields': 'id,title,due_date,status'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([sorted(task) for task in response.json()['results']],
+                         [['due_date', 'id', 'status', 'title']] * 3)
+        self.assertNotSelected(queries.captured_queries, 'description')
+
+        recurring = self.client.get('/api/recurring-tasks/', {'exclude': 'description,recurrence'}).json()
+        self.assertEqual(len(recurring['results']), 1)
+        self.assertNotIn('description', recurring['results'][0])
+        self.assertIn('next_due_date', recurring['results'][0])
+
+    def test_pages_follow_on_without_the_ordering_columns(self):
+        titles = []
+        response = self.client.get('/api/tasks/', {'fields': 'title', 'page_size': 1}).json()
+        while True:
+            titles += [task['title'] for task in response['results']]
+            self.assertEqual([list(task) for task in response['results']], [['title']])
+            if not response['next']:
+                break
+            response = self.client.get(response['next']).json()
+        self.assertEqual(titles, ['Write report', 'Review report', 'Plan'])
+
+    def test_detail_defers_unrequested_columns(self):
+        path = f'/api/tasks/{self.task.id}/'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, {'exclude': 'description'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('description', response.json())
+        self.assertEqual(response.json()['title'], 'Write report')
+        self.assertNotSelected(queries.captured_queries, 'description')
+        # Each fieldset is its own representation
+        self.assertNotEqual(response['ETag'], self.client.get(path)['ETag'])
+        self.assertEqual(self.client.get(f'/api/async/tasks/{self.task.id}/', {'exclude': 'description'}).json(),
+                         response.json())
+
+    def test_writes_and_bad_fields(self):
+        response = self.client.get('/api/tasks/', {'fields': 'title,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['fields'][0])
+        self.assertEqual(self.client.get('/api/tasks/', {'fields': 'title', 'exclude': 'title'}).status_code, 400)
+        # Writes ignore the parameter and answer with the whole task
+        response = self.client.patch(f'/api/tasks/{self.task.id}/?fields=title', {'priority': 'high'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['priority'], 'high')
+        self.assertIn('description', response.json())
+
+    def test_write_etags_validate_the_next_write(self):
+        path = f'/api/tasks/{self.task.id}/?fields=title'
+        etag = self.client.get(f'/api/tasks/{self.task.id}/')['ETag']
+        for priority in ('high', 'low'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(path, {'priority': priority}, format='json', HTTP_IF_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+        self.assertEqual(etag, self.client.get(f'/api/tasks/{self.task.id}/')['ETag'])
+
+
+class AsyncViewTests(APITestCase):
+    """The native async endpoints answer exactly like their sync counterparts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('awaiter', 'awaiter@example.com', 'pass')
+        cls.token = Token.objects.create(user=cls.user)
+        category = TaskCategory.objects.create(name='Work', user=cls.user)
+        cls.task = Task.objects.create(title='Write report', due_date=date(2030, 1, 1), user=cls.user)
+        Task.objects.create(title='Review report', due_date=date(2030, 1, 2), priority='high',
+                            category=category, user=cls.user)
+        Task.objects.create(title='Plan', due_date=date(2030, 1, 3), status='completed', user=cls.user)
+        TaskHistory.objects.create(task=cls.task, action='created', details='Created')
+        TaskHistory.objects.create(task=cls.task, action='updated', details='Renamed')
+        Notification.objects.create(user=cls.user, task=cls.task, message='Due soon')
+        Notification.objects.create(user=cls.user, task=cls.task, message='Seen', is_read=True)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_responses_match_sync_views(self):
+        cases = [
+            ('/api/tasks/', {}),
+            ('/api/tasks/', {'status': 'pending', 'ordering': '-priority'}),
+            ('/api/tasks/', {'category': 'work'}),
+            ('/api/tasks/', {'search': 'report', 'ordering': 'rank'}),
+            (f'/api/tasks/{self.task.id}/', {}),
+            (f'/api/tasks/{self.task.id}/history/', {}),
+            ('/api/notifications/', {'is_read': 'false'}),
+            ('/api/notifications/unread-count/', {}),
+        ]
+        for path, params in cases:
+            with self.subTest(path=path, params=params):
+                expected = self.client.get(path, params)
+                response = self.client.get(path.replace('/api/', '/api/async/'), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_keyset_pages_follow_on(self):
+        first = self.client.get('/api/async/tasks/', {'page_size': 2}).json()
+        self.assertIn('/api/async/tasks/', first['next'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([task['title'] for task in first['results'] + second['results']],
+                         ['Write report', 'Review report', 'Plan'])
+        self.assertIsNone(second['next'])
+
+    def test_errors_match_drf(self):
+        self.assertEqual(self.client.get('/api/async/tasks/999999/').json(),
+                         {'detail': 'No Task matches the given query.'})
+        self.assertEqual(self.client.get('/api/async/tasks/', {'due_date': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/async/tasks/').status_code, 405)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token wrong')
+        response = self.client.get('/api/async/tasks/')
+        self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Token'))
+        self.assertEqual(response.json(), {'detail': 'Invalid token.'})
+
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/async/notifications/').status_code, 401)
+        # Session users are picked up through request.auser()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/async/notifications/').status_code, 200)
+
+    @override_settings(TASK_PROFILING={'ENABLED': True})
+    async def test_async_stack_is_profiled(self):
+        profiling.registry.clear()
+        token_cache.clear()
+        response = await AsyncClient().get('/api/async/notifications/unread-count/',
+                                           headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.json(), {'unread': 1})
+        metrics = profiling.registry.render()
+        self.assertIn('tasks_http_requests_total{route="tasks:async-notification-unread-count",'
+                      'method="GET",status="200"} 1', metrics)
+        # Queries run in the ORM's worker thread are counted too: the token and the count
+        self.assertIn('tasks_http_db_queries_sum{route="tasks:async-notification-unread-count",method="GET"} 2',
+                      metrics)
+
+
+class PushTests(APITestCase):
+    """The SSE stream and long-poll deliver what changed after a cursor, woken by commits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('listener', 'listener@example.com', 'pass')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.task = Task.objects.create(title='Write report', due_date=date(2030, 1, 1), user=cls.user)
+        cls.other = Task.objects.create(title='Plan', due_date=date(2030, 1, 2), user=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.headers = {'Authorization': f'Token {self.token.key}'}
+
+    def test_long_poll_resumes_from_cursor(self):
+        cursor = self.client.get('/api/events/').json()['cursor']
+        Notification.objects.create(user=self.user, task=self.task, message='Due soon')
+        self.task.title = 'Write final report'
+        self.task.save()
+
+        body = self.client.get('/api/events/', {'since': cursor, 'timeout': 0}).json()
+        self.assertEqual([(event['type'], event['data'].get('message') or event['data']['title'])
+                          for event in body['events']],
+                         [('notification', 'Due soon'), ('task', 'Write final report')])
+        self.assertEqual(body['events'][0]['data']['task_title'], 'Write final report')
+        self.assertEqual(body['cursor'], body['events'][-1]['id'])
+        # Resuming from the middle replays only what came after
+        resumed = self.client.get('/api/events/', {'since': body['events'][0]['id'], 'timeout': 0}).json()
+        self.assertEqual([event['type'] for event in resumed['events']], ['task'])
+        self.assertEqual(self.client.get('/api/events/', {'since': body['cursor'], 'timeout': 0}).json(),
+                         {'events': [], 'cursor': body['cursor']})
+
+        self.assertEqual(self.client.get('/api/events/', {'since': 'nonsense'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/events/', {'since': cursor, 'timeout': 'soon'}).status_code, 400)
+
+    async def test_long_poll_wakes_on_commit(self):
+        cursor = push.encode_cursor(await push.current_cursor(self.user.id))
+        started = time.monotonic()
+        pending = asyncio.create_task(
+            AsyncClient().get('/api/events/', {'since': cursor, 'timeout': 10}, headers=self.headers)
+        )
+
+        async def subscribed():
+            # A request that fails before subscribing must not hang the suite
+            while not len(broker) and not pending.done():
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(subscribed(), 5)
+        deleted = self.other.id
+
+        def notify():
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(user=self.user, task=self.task, message='Assigned')
+                self.other.delete()
+
+        await sync_to_async(notify)()
+        body = (await pending).json()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual([(event['type'], event['data'].get('message')) for event in body['events']],
+                         [('notification', 'Assigned'), ('task_deleted', None)])
+        self.assertEqual(body['events'][1]['data'], {'id': deleted})
+        self.assertEqual(len(broker), 0)
+
+    @override_settings(TASK_PUSH={'HEARTBEAT_SECONDS': 0.01})
+    async def test_stream_resumes_from_last_event_id(self):
+        cursor = push.encode_cursor(await push.current_cursor(self.user.id))
+        await Notification.objects.acreate(user=self.user, task=self.task, message='Due soon')
+        response = await AsyncClient().get('/api/events/stream/', headers={**self.headers, 'Last-Event-ID': cursor})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry: '))
+
+        event = (await anext(chunks)).decode()
+        lines = dict(line.split(': ', 1) for line in event.strip().split('\n'))
+        self.assertEqual(lines['event'], 'notification')
+        self.assertEqual(json.loads(lines['data'])['message'], 'Due soon')
+        self.assertEqual(push.decode_cursor(lines['id']).notification, json.loads(lines['data'])['id'])
+        self.assertEqual(await anext(chunks), b': heartbeat\n\n')
+
+        # A client going away cancels the response, as the ASGI handler does
+        reading = asyncio.create_task(anext(chunks))
+        await asyncio.sleep(0)
+        reading.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reading
+        self.assertEqual(len(broker), 0)
+
+    def test_stream_needs_asgi(self):
+        response = self.client.get('/api/events/stream/')
+        self.assertEqual(response.status_code, 501)
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/events/stream/').status_code, 401)
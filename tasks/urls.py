@@ -2,15 +2,20 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.schemas import get_schema_view
+from . import async_views
 from .views import (
     TaskViewSet,
     UserViewSet,
     TaskHistoryView,
+    TaskHistoryExportView,
     UserLoginView,
     UserLogoutView,
     NotificationView,
+    NotificationReadView,
+    NotificationUnreadCountView,
     TaskCategoryViewSet,
     RecurringTaskViewSet,
+    AgendaView,
 )
 
 app_name = 'tasks'
@@ -38,6 +43,16 @@ urlpatterns = [
         version="1.0.0"
     ), name='api-root'),
 
+    # Native async versions of the read-heavy endpoints, for ASGI deployments
+    path('async/tasks/', async_views.task_list, name='async-task-list'),
+    path('async/tasks/<int:pk>/', async_views.task_detail, name='async-task-detail'),
+    path('async/tasks/<int:task_id>/history/', async_views.task_history, name='async-task-history'),
+    path('async/notifications/', async_views.notification_list, name='async-notifications'),
+    path('async/notifications/unread-count/', async_views.notification_unread_count,
+         name='async-notification-unread-count'),
+    path('events/stream/', async_views.event_stream, name='event-stream'),
+    path('events/', async_views.event_poll, name='event-poll'),
+
     # Include all router URLs
     path('', include(router.urls)),
 
@@ -45,6 +60,9 @@ urlpatterns = [
     path('tasks/<int:task_id>/history/',
          TaskHistoryView.as_view(),
          name='task-history'),
+    path('history/export/<str:export_format>/',
+         TaskHistoryExportView.as_view(),
+         name='task-history-export'),
     path('tasks/<int:task_id>/toggle-complete/',
          TaskViewSet.as_view({'post': 'toggle_complete'}),
          name='task-toggle-complete'),
@@ -52,9 +70,23 @@ urlpatterns = [
          TaskViewSet.as_view({'post': 'share_task'}),
          name='share-task'),
 
+    # Calendar over a date range, recurring series expanded
+    path('agenda/',
+         AgendaView.as_view(),
+         name='agenda'),
+
     # Notifications endpoint
     path('notifications/',
          NotificationView.as_view(),
          name='notifications'),
+    path('notifications/unread-count/',
+         NotificationUnreadCountView.as_view(),
+         name='notification-unread-count'),
+    path('notifications/read/',
+         NotificationReadView.as_view(),
+         name='notification-read-all'),
+    path('notifications/<int:pk>/read/',
+         NotificationReadView.as_view(),
+         name='notification-read'),
 ]
 
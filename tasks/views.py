@@ -1,39 +1,75 @@
-from rest_framework import viewsets, generics, permissions, status, filters as drf_filters
+from rest_framework import viewsets, generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import F
 from django_filters import rest_framework as filters
-from datetime import timedelta
+from task_manager.sqlite import RetryOnLockMixin, retry_on_lock
 from .models import Task, TaskHistory, Notification, TaskCategory
-from .serializers import TaskSerializer, TaskHistorySerializer, UserSerializer, TaskCategorySerializer
-
-class TaskHistoryView(generics.ListAPIView):
+from .serializers import (
+    TaskSerializer,
+    TaskHistorySerializer,
+    UserSerializer,
+    TaskCategorySerializer,
+    TaskBulkActionSerializer,
+    NotificationSerializer,
+    AgendaQuerySerializer,
+)
+from .notifications import unread_count, invalidate_unread_count_on_commit
+from .pubsub import broker
+from . import agenda, jobs
+from .response_cache import UserResponseCacheMixin, bump_generation_on_commit, memoize_for_user
+from . import stats
+from .stats import TaskStatsMixin
+from .conditional import ConditionalRequestMixin
+from .routers import ReplicaReadMixin
+from .fast_list import ValuesListMixin
+from .fieldsets import SparseFieldsetMixin
+from .export import (
+    EXPORT_FORMATS,
+    HISTORY_COLUMNS,
+    TASK_COLUMNS,
+    PassthroughRenderer,
+    streaming_export_response,
+)
+from .importer import ImportFileError, import_tasks, iter_records
+from .pagination import TaskCursorPagination, NotificationCursorPagination, TaskHistoryCursorPagination
+from .search import FullTextSearchFilter, RankOrderingFilter
+
+class TaskHistoryView(ReplicaReadMixin, generics.ListAPIView):
     """
     View for retrieving task history.
     """
     serializer_class = TaskHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TaskHistoryCursorPagination
 
     def get_queryset(self):
         task_id = self.kwargs.get('task_id')
         return TaskHistory.objects.filter(
             task_id=task_id,
             task__user=self.request.user
-        ).order_by('-created_at')
+        ).order_by('-change_time')
 
-class RecurringTaskViewSet(viewsets.ModelViewSet):
+class RecurringTaskViewSet(RetryOnLockMixin, ReplicaReadMixin, SparseFieldsetMixin, ConditionalRequestMixin,
+                           UserResponseCacheMixin, TaskStatsMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing recurring tasks.
     """
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TaskCursorPagination
 
     def get_queryset(self):
         return Task.objects.filter(
@@ -41,7 +77,8 @@ class RecurringTaskViewSet(viewsets.ModelViewSet):
             recurrence__isnull=False
         ).exclude(recurrence='none')
 
-class TaskCategoryViewSet(viewsets.ModelViewSet):
+class TaskCategoryViewSet(RetryOnLockMixin, ReplicaReadMixin, ConditionalRequestMixin, UserResponseCacheMixin,
+                          viewsets.ModelViewSet):
     """
     ViewSet for managing task categories.
     """
@@ -65,15 +102,18 @@ class TaskFilter(filters.FilterSet):
         model = Task
         fields = ['status', 'priority', 'due_date', 'category']
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(RetryOnLockMixin, ReplicaReadMixin, SparseFieldsetMixin, ConditionalRequestMixin,
+                  UserResponseCacheMixin, TaskStatsMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing tasks.
     """
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = (filters.DjangoFilterBackend, drf_filters.OrderingFilter, drf_filters.SearchFilter)
+    # Search runs before ordering so ?ordering=rank can see the search rank
+    filter_backends = (filters.DjangoFilterBackend, FullTextSearchFilter, RankOrderingFilter)
     filterset_class = TaskFilter
-    ordering_fields = ['due_date', 'priority', 'created_at']
+    pagination_class = TaskCursorPagination
+    ordering_fields = ['due_date', 'priority', 'created_at', 'rank']
     ordering = ['due_date']
     search_fields = ['title', 'description']
 
@@ -81,58 +121,158 @@ class TaskViewSet(viewsets.ModelViewSet):
         return Task.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        try:
-            task = serializer.save(user=self.request.user)
-
-            # Create task history entry
-            TaskHistory.objects.create(
-                task=task,
-                action='created',
-                details=f'Task "{task.title}" created.'
-            )
-
-            # Create notification if task is due soon
-            if task.due_date and task.due_date <= timezone.now() + timedelta(days=2):
-                Notification.objects.create(
-                    user=self.request.user,
-                    task=task,
-                    message=f"Task '{task.title}' is due soon!"
-                )
-
-            # Handle recurring tasks
-            if task.recurrence and task.recurrence != 'none':
-                self._handle_recurrence(task)
-
-        except Exception as e:
-            raise ValidationError(f"Failed to create task: {str(e)}")
-
-    def _handle_recurrence(self, task):
-        """Handle recurring task logic"""
-        recurrence_map = {
-            'daily': timedelta(days=1),
-            'weekly': timedelta(weeks=1),
-            'monthly': timedelta(days=30),
-        }
-
-        if task.recurrence.lower() in recurrence_map:
-            task.next_due_date = task.due_date + recurrence_map[task.recurrence.lower()]
-            task.save()
+        # History and due-soon notifications are written by the job worker;
+        # the job row commits together with the task. The request still makes
+        # three inserts in one transaction (the task, its counters and the
+        # job), so it writes no fewer rows than when the history row and
+        # notification were inserted inline; what moves off the request path
+        # is the reminder logic and any failure in it.
+        with transaction.atomic():
+            super().perform_create(serializer)
+            jobs.enqueue('task_created', {'task_id': serializer.instance.id})
 
     @action(detail=True, methods=['post'])
+    @retry_on_lock
     def toggle_complete(self, request, pk=None):
         task = self.get_object()
-        task.status = 'PENDING' if task.status == 'COMPLETED' else 'COMPLETED'
-        task.completed_at = timezone.now() if task.status == 'COMPLETED' else None
-        task.save()
-
-        TaskHistory.objects.create(
-            task=task,
-            action='status_changed',
-            details=f'Task status changed to {task.status}'
-        )
+        before = stats.snapshot(task)
+        task.status = 'pending' if task.status == 'completed' else 'completed'
+        task.completed_at = timezone.now() if task.status == 'completed' else None
+
+        with transaction.atomic():
+            task.save()
+            stats.record(before=[before], after=[stats.snapshot(task)])
+            TaskHistory.objects.create(
+                task=task,
+                action='status_changed',
+                details=f'Task status changed to {task.status}'
+            )
 
         return Response({'status': task.status})
 
+    @action(detail=False, methods=['post'])
+    @retry_on_lock
+    def bulk(self, request):
+        """
+        Apply a status transition or a delete to many tasks at once.
+
+        Runs as one set-based UPDATE/DELETE scoped to the current user and
+        writes the matching history rows with a single bulk_create.
+        """
+        serializer = TaskBulkActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        target = serializer.validated_data.get('status')
+
+        with transaction.atomic():
+            current = {
+                row['id']: stats.snapshot(row)
+                for row in self.get_queryset()
+                .filter(id__in=ids)
+                .values('id', *stats.SNAPSHOT_FIELDS)
+            }
+
+            if serializer.validated_data['delete']:
+                # History rows cascade with their task, so none are written here
+                Task.objects.filter(id__in=current.keys()).delete()
+                changed = set(current)
+                stats.record(before=current.values())
+                done = 'deleted'
+            else:
+                changed = {pk for pk, old in current.items() if old.status != target}
+                stats.record(
+                    before=[current[pk] for pk in changed],
+                    after=[current[pk]._replace(status=target) for pk in changed]
+                )
+                Task.objects.filter(id__in=changed).update(
+                    status=target,
+                    completed_at=timezone.now() if target == 'completed' else None,
+                    updated_at=timezone.now()
+                )
+                TaskHistory.objects.bulk_create([
+                    TaskHistory(
+                        task_id=pk,
+                        action='status_changed',
+                        details=f'Task status changed to {target}'
+                    )
+                    for pk in changed
+                ])
+                done = 'updated'
+
+            # update() and fast deletes bypass the signals that expire cached lists
+            if changed:
+                bump_generation_on_commit(request.user.id)
+                broker.publish_on_commit([request.user.id])
+
+        results = []
+        for pk in ids:
+            if pk not in current:
+                result = 'not_found'
+            elif pk in changed:
+                result = done
+            else:
+                result = 'unchanged'
+            results.append({'id': pk, 'result': result})
+
+        return Response({
+            'processed': len(changed),
+            'results': results,
+        })
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Dashboard counts, read from the per-user counters instead of the task rows"""
+        today = timezone.localdate()
+        return Response(memoize_for_user(
+            request, 'task:stats', {'today': today.isoformat()},
+            lambda: stats.dashboard(request.user.id, today)
+        ))
+
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<export_format>csv|ndjson)',
+            renderer_classes=[JSONRenderer, PassthroughRenderer])
+    def export(self, request, export_format=None):
+        """Stream every task matching the usual filters as CSV or NDJSON"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return streaming_export_response(request, queryset, TASK_COLUMNS, export_format, 'tasks')
+
+    @action(detail=False, methods=['post'], url_path=r'import/(?P<import_format>csv|ndjson)',
+            parser_classes=[MultiPartParser])
+    def bulk_import(self, request, import_format=None):
+        """
+        Import tasks from an uploaded CSV or NDJSON ``file``.
+
+        Valid rows are inserted in batches; invalid ones are skipped and
+        listed in the response with their line number and field errors. A
+        file that turns unreadable partway gets a 400 that still reports
+        what was imported before that point.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'Upload a CSV or NDJSON file in the "file" field.'})
+        try:
+            result = import_tasks(request.user, iter_records(upload, import_format))
+        except ImportFileError as exc:
+            if exc.result is None:
+                raise ParseError(str(exc))
+            return Response({'detail': str(exc), **exc.result._asdict()}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result._asdict())
+
+class TaskHistoryExportView(ReplicaReadMixin, APIView):
+    """Stream the user's task history as CSV or NDJSON; ?task=<id> limits it to one task"""
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [JSONRenderer, PassthroughRenderer]
+
+    def get(self, request, export_format):
+        if export_format not in EXPORT_FORMATS:
+            raise NotFound(f'Unknown export format {export_format!r}.')
+        queryset = TaskHistory.objects.filter(task__user=request.user).order_by('id')
+        task_id = request.query_params.get('task')
+        if task_id:
+            if not task_id.isdigit():
+                raise ValidationError({'task': 'A valid task id is required.'})
+            queryset = queryset.filter(task_id=task_id)
+        return streaming_export_response(request, queryset, HISTORY_COLUMNS, export_format, 'task-history')
+
 class UserViewSet(viewsets.ModelViewSet):
     """ViewSet for user management"""
     queryset = User.objects.all()
@@ -164,27 +304,72 @@ class UserLogoutView(APIView):
             return Response({'error': str(e)},
                           status=status.HTTP_400_BAD_REQUEST)
 
-class NotificationView(generics.ListAPIView):
-    """View for user notifications"""
+class NotificationView(ReplicaReadMixin, generics.ListAPIView):
+    """View for user notifications, newest first; ?is_read=false lists unread only"""
+    serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
 
-    def get(self, request, *args, **kwargs):
-        notifications = Notification.objects.filter(user=request.user)
-        data = [{
-            'message': notification.message,
-            'task': notification.task.title,
-            'created': notification.created,
-            'is_read': notification.is_read
-        } for notification in notifications]
-        return Response(data)
+    def get_queryset(self):
+        queryset = Notification.objects.filter(user=self.request.user)
+        is_read = self.request.query_params.get('is_read')
+        if is_read is not None:
+            queryset = queryset.filter(is_read=is_read.lower() in ('true', '1'))
+        # Fetch the task title in the same statement instead of once per row
+        return queryset.annotate(task_title=F('task__title')).only(
+            'id', 'task_id', 'message', 'created_at', 'is_read'
+        )
 
-    @action(detail=True, methods=['post'])
-    def mark_as_read(self, request, pk=None):
-        notification = get_object_or_404(Notification, pk=pk, user=request.user)
-        notification.is_read = True
-        notification.save()
-        return Response({'status': 'notification marked as read'})
+class NotificationReadView(ReplicaReadMixin, APIView):
+    """Mark one notification, or all of them when no id is given, as read"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk=None):
+        notifications = Notification.objects.filter(user=request.user, is_read=False)
+        if pk is not None:
+            get_object_or_404(Notification, pk=pk, user=request.user)
+            notifications = notifications.filter(pk=pk)
+        updated = notifications.update(is_read=True)
+        invalidate_unread_count_on_commit(request.user.id)
+        return Response({'marked_read': updated})
+
+class NotificationUnreadCountView(ReplicaReadMixin, APIView):
+    """Cheap unread counter for clients that poll"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': unread_count(request.user.id)})
+
+class AgendaView(ReplicaReadMixin, APIView):
+    """
+    Calendar for ?start=&end= (end excluded): tasks due in the range and the
+    future occurrences of recurring series, in date order, a page at a time
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request):
+        query = AgendaQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        after = None
+        if 'cursor' in params:
+            try:
+                after = agenda.decode_position(params['cursor'])
+            except ValueError:
+                raise NotFound('Invalid cursor')
+
+        entries, has_next = agenda.page(request.user.id, params['start'], params['end'], after, params['page_size'])
+        next_link = None
+        if has_next:
+            position = agenda.encode_position(entries[-1][0])
+            next_link = replace_query_param(request.build_absolute_uri(), 'cursor', position)
+        return Response({
+            'next': next_link,
+            'results': [
+                {'date': key[0].isoformat(), 'virtual': virtual, 'task': task}
+                for key, task, virtual in entries
+            ],
+        })
 
 def get_serializer_context(self):
     context = super().get_serializer_context()